@@ -5,7 +5,10 @@ Proxy User and Role models.
 import base64
 import hashlib
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
+from django.db.models.signals import m2m_changed, pre_delete
 
 from django.contrib.auth.backends import ModelBackend as DjangoModelBackend
 # Permission is imported solely so other places can import it from here
@@ -86,6 +89,113 @@ class ModelBackend(DjangoModelBackend):
             return None
 
 
+    def get_all_permissions(self, user_obj, obj=None):
+        """
+        Return set of permission strings the user has, directly or via roles.
+
+        If ``PERMISSION_CACHE_TIMEOUT`` is set, the set is cached per user in
+        the configured cache backend (and dropped when the user's roles or
+        permissions change), so it isn't queried on every request.
+
+        """
+        timeout = settings.PERMISSION_CACHE_TIMEOUT
+        if (not timeout or obj is not None or user_obj.is_anonymous() or
+                hasattr(user_obj, "_perm_cache")):
+            return super(ModelBackend, self).get_all_permissions(
+                user_obj, obj)
+        key = permission_cache_key(user_obj.pk)
+        perms = cache.get(key)
+        if perms is None:
+            perms = super(ModelBackend, self).get_all_permissions(user_obj)
+            cache.set(key, perms, timeout)
+        user_obj._perm_cache = perms
+        return perms
+
+
+
+def permission_cache_key(user_id):
+    """Return cache key for the cached permissions of given user id."""
+    return "moztrap:permissions:{0}".format(user_id)
+
+
+
+def forget_permissions(user_ids):
+    """Drop cached permissions of users with given ids."""
+    cache.delete_many([permission_cache_key(uid) for uid in user_ids])
+
+
+
+def user_permissions_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Drop cached permissions of users whose roles or permissions change."""
+    if not reverse:
+        if action.startswith("post_"):
+            forget_permissions([instance.pk])
+            instance.__dict__.pop("_perm_cache", None)
+            instance.__dict__.pop("_group_perm_cache", None)
+        return
+    # a role or permission gained or lost users
+    if action == "pre_clear":
+        instance._cleared_user_ids = list(
+            _users_of(sender, instance).values_list("id", flat=True))
+    elif action in ["post_add", "post_remove"]:
+        forget_permissions(pk_set)
+    elif action == "post_clear":
+        forget_permissions(instance.__dict__.pop("_cleared_user_ids", []))
+
+
+
+def role_permissions_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Drop cached permissions of users whose roles' permissions change."""
+    if reverse and action == "pre_clear":
+        # a permission is about to be removed from all its roles
+        instance._cleared_role_ids = list(
+            instance.group_set.values_list("id", flat=True))
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        role_ids = [instance.pk]
+    elif action == "post_clear":
+        role_ids = instance.__dict__.pop("_cleared_role_ids", [])
+    else:
+        role_ids = pk_set
+    forget_permissions(
+        BaseUser.objects.filter(groups__in=role_ids).values_list(
+            "id", flat=True)
+        )
+
+
+
+def role_or_permission_deleted(sender, instance, **kwargs):
+    """Drop cached permissions of users of a deleted role or permission."""
+    user_ids = set(
+        BaseUser.objects.filter(groups=instance).values_list("id", flat=True)
+        if sender is Group else
+        BaseUser.objects.filter(
+            Q(user_permissions=instance) | Q(groups__permissions=instance)
+            ).values_list("id", flat=True)
+        )
+    forget_permissions(user_ids)
+
+
+
+def _users_of(sender, instance):
+    """Return users related to role or permission ``instance`` via ``sender``."""
+    if sender is BaseUser.groups.through:
+        return BaseUser.objects.filter(groups=instance)
+    return BaseUser.objects.filter(user_permissions=instance)
+
+
+
+for through in [BaseUser.groups.through, BaseUser.user_permissions.through]:
+    m2m_changed.connect(user_permissions_changed, sender=through)
+m2m_changed.connect(role_permissions_changed, sender=Group.permissions.through)
+pre_delete.connect(role_or_permission_deleted, sender=Group)
+pre_delete.connect(role_or_permission_deleted, sender=Permission)
+
+
+
 class BrowserIDBackend(BaseBrowserIDBackend):
     """BrowserID backend that returns our proxy user."""
     def filter_users_by_email(self, email):
@@ -28,6 +28,17 @@ The data must be in JSON format and structured like this::
         ]
     }
 
+With ``--stream``, each file is parsed incrementally and its cases imported
+a batch at a time, so files too large to load into memory can be imported.
+Progress is written to standard error after each batch.
+
+With ``--jobs``, the files of a directory are imported that many at a time in
+parallel processes, each file streamed in its own transaction.
+
+With ``--format=csv`` or ``--format=text``, files are read (and streamed) as
+CSV with a header row and a row per case, or as bulk test case text ("Test
+that ... / When ... / Then ..."); see ``moztrap.model.library.readers``.
+
 """
 
 from django.core.management.base import BaseCommand, CommandError
@@ -37,7 +48,9 @@ import json
 import os.path
 
 from moztrap.model.core.models import Product, ProductVersion
-from moztrap.model.library.importer import Importer
+from moztrap.model.library.importer import (
+    Importer, import_files, STREAM_BATCH_SIZE)
+from moztrap.model.library.readers import READERS
 
 
 
@@ -56,6 +69,41 @@ class Command(BaseCommand):
             default=False,
             help="Force importing cases, even if the case name is a"
             " duplicate"),
+        make_option(
+            "--bulk",
+            action="store_true",
+            dest="bulk",
+            default=False,
+            help="Import cases with batched inserts; much faster for large"
+            " files"),
+        make_option(
+            "--stream",
+            action="store_true",
+            dest="stream",
+            default=False,
+            help="Parse files incrementally, importing a batch of cases at"
+            " a time; for files too large to load into memory"),
+        make_option(
+            "--batch-size",
+            type="int",
+            dest="batch_size",
+            default=STREAM_BATCH_SIZE,
+            help="Number of cases to import at a time with --stream."),
+        make_option(
+            "-j",
+            "--jobs",
+            type="int",
+            dest="jobs",
+            default=1,
+            help="Number of files to import in parallel; implies --stream."),
+        make_option(
+            "--format",
+            type="choice",
+            choices=sorted(READERS),
+            dest="format",
+            default="json",
+            help="Format of the files: json (default), csv or text. Files"
+            " in csv or text format are always streamed."),
 
         )
 
@@ -64,6 +112,16 @@ class Command(BaseCommand):
             raise CommandError("Usage: {0}".format(self.args))
 
         force_dupes = options.get("force_dupes")
+        bulk = options.get("bulk")
+        stream = options.get("stream")
+        batch_size = options.get("batch_size")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        jobs = options.get("jobs")
+        format = options.get("format")
+        stream = stream or format != "json"
+        if jobs < 1:
+            raise CommandError("--jobs must be at least 1.")
 
         try:
             product = Product.objects.get(name=args[0])
@@ -90,30 +148,59 @@ class Command(BaseCommand):
                 files.append(args[2])
 
             results_for_files = None
-            for file in files:
-                with open(file) as fh:
-
-                    # try to import this as JSON
-                    try:
-                        case_data = json.load(fh)   # pragma: no branch
-                    except ValueError as e:
-                        raise CommandError(
-                            "Could not parse JSON: {0}: {1}".format(
-                                str(e),
-                                fh,
-                                ))
-
-                    # @@@: support importing as CSV.  Rather than returning an
-                    # error above, just try CSV import instead.
-
-                    result = Importer().import_data(
-                        product_version, case_data, force_dupes=force_dupes)
-
-                    # append this result to those for any of the other files.
-                    if not results_for_files:
-                        results_for_files = result
-                    else:
-                        results_for_files.append(result)  # pragma: no branch
+            if jobs > 1 and files:
+                try:
+                    results_for_files = import_files(
+                        product_version,
+                        files,
+                        jobs=jobs,
+                        force_dupes=force_dupes,
+                        batch_size=batch_size,
+                        format=format,
+                        )
+                except ValueError as e:
+                    raise CommandError(
+                        "Could not parse {0}: {1}".format(
+                            format.upper(), str(e)))
+            else:
+                for file in files:
+                    with open(file) as fh:
+
+                        # try to import this as JSON
+                        try:
+                            if stream:
+                                result = Importer().import_stream(
+                                    product_version,
+                                    fh,
+                                    force_dupes=force_dupes,
+                                    batch_size=batch_size,
+                                    progress=self.progress,
+                                    format=format,
+                                    )
+                            else:
+                                case_data = json.load(fh)   # pragma: no branch
+                        except ValueError as e:
+                            raise CommandError(
+                                "Could not parse {0}: {1}: {2}".format(
+                                    format.upper(),
+                                    str(e),
+                                    fh,
+                                    ))
+
+                        if not stream:
+                            result = Importer().import_data(
+                                product_version,
+                                case_data,
+                                force_dupes=force_dupes,
+                                bulk=bulk,
+                                )
+
+                        # append this result to those for any of the other
+                        # files.
+                        if not results_for_files:
+                            results_for_files = result
+                        else:  # pragma: no branch
+                            results_for_files.append(result)
 
             if results_for_files:
                 result_list = results_for_files.get_as_list()
@@ -128,3 +215,8 @@ class Command(BaseCommand):
                 'Could not open "{0}", I/O error {1}: {2}'.format(
                     args[2], errno, strerror)
                 )
+
+
+    def progress(self, num_cases):
+        """Report the number of cases read so far by a streaming import."""
+        self.stderr.write("Read {0} cases\n".format(num_cases))
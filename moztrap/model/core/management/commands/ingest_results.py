@@ -0,0 +1,71 @@
+"""
+Record results from a file of newline-delimited JSON.
+
+Each line is one result object, as accepted by the ``bulkresult`` API::
+
+    {"case": 1, "environment": 23, "run_id": 1, "status": "passed"}
+    {"case": 14, "environment": 23, "run_id": 1, "status": "failed", "stepnumber": 1, "bug": "http://example.com/1"}
+
+The file is read and recorded a chunk of lines at a time, so it is never held
+in memory as a whole. Use "-" as the filename to read from standard input.
+
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from optparse import make_option
+
+from moztrap.model.core.auth import User
+from moztrap.model.execution.bulk import (
+    submit_result_stream, STREAM_CHUNK_SIZE)
+
+
+
+class Command(BaseCommand):
+    args = "<username> <filename>"
+    help = (
+        "Records results from a newline-delimited JSON file as submitted by "
+        "the given user.")
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--chunk-size",
+            type="int",
+            dest="chunk_size",
+            default=STREAM_CHUNK_SIZE,
+            help="Number of results to record in each transaction."),
+        )
+
+    def handle(self, *args, **options):
+        if not len(args) == 2:
+            raise CommandError("Usage: {0}".format(self.args))
+
+        try:
+            user = User.objects.get(username=args[0])
+        except User.DoesNotExist:
+            raise CommandError('User "{0}" does not exist'.format(args[0]))
+
+        chunk_size = options.get("chunk_size")
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        try:
+            if args[1] == "-":
+                recorded, errors = submit_result_stream(
+                    sys.stdin, user, chunk_size)
+            else:
+                with open(args[1]) as fh:
+                    recorded, errors = submit_result_stream(
+                        fh, user, chunk_size)
+        except IOError as (errno, strerror):
+            raise CommandError(
+                'Could not open "{0}", I/O error {1}: {2}'.format(
+                    args[1], errno, strerror)
+                )
+
+        for lineno, error in errors:
+            self.stderr.write("Line {0}: {1}\n".format(lineno, error))
+        self.stdout.write(
+            "Recorded {0} results, {1} errors.\n".format(
+                recorded, len(errors)))
@@ -0,0 +1,58 @@
+"""
+Process queued run activation and refresh jobs.
+
+Runs as a long-lived worker, polling the database for queued ``RunJob``
+records; with ``--once`` it processes whatever is queued and exits.
+
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from optparse import make_option
+
+from moztrap.model.execution.models import RunJob
+
+
+
+class Command(BaseCommand):
+    help = "Processes queued run activation and refresh jobs."
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--once",
+            action="store_true",
+            dest="once",
+            default=False,
+            help="Process all currently queued jobs, then exit."),
+        make_option(
+            "--sleep",
+            type="float",
+            dest="sleep",
+            default=2.0,
+            help="Seconds to wait between polls when the queue is empty."),
+        )
+
+    def handle(self, *args, **options):
+        once = options.get("once")
+        sleep = options.get("sleep")
+        verbosity = int(options.get("verbosity", 1))
+
+        while True:
+            job = RunJob.claim_next()
+            if job is None:
+                if once:
+                    break
+                time.sleep(sleep)
+                continue
+
+            try:
+                job.process()
+            except Exception as e:
+                self.stderr.write(
+                    "Failed {0}: {1}\n".format(job, e))
+            else:
+                if verbosity:
+                    self.stdout.write(
+                        "Processed {0}: {1} of {2} cases locked.\n".format(
+                            job, job.locked, job.total))
@@ -0,0 +1,27 @@
+"""
+Rebuild the keyword search index of caseversions and their steps.
+
+The index is kept current as caseversions and steps are saved; rebuilding is
+only needed if they were changed without saving (e.g. by raw SQL).
+
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from moztrap.model.library.models import CaseVersion, SearchTerm
+
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the keyword search index of caseversions."
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        verbosity = int(options.get("verbosity", 1))
+
+        ids = list(CaseVersion.everything.values_list("id", flat=True))
+        SearchTerm.index(ids)
+
+        if verbosity:
+            self.stdout.write(
+                "Indexed {0} caseversions.\n".format(len(ids)))
@@ -5,13 +5,13 @@ Core MozTrap models (Product).
 import uuid
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models
 
 from pkg_resources import parse_version
 from preferences.models import Preferences
 
 from ..environments.models import HasEnvironmentsModel
-from ..mtmodel import MTModel, MTManager, TeamModel
+from ..mtmodel import MTModel, MTManager, TeamModel, commit_raw_sql
 from .auth import Role, User
 
 
@@ -38,7 +38,7 @@ class Product(MTModel, TeamModel):
         Clone Product, with team.
 
         """
-        kwargs.setdefault("cascade", ["team"])
+        kwargs.setdefault("cascade", ["own_team"])
         overrides = kwargs.setdefault("overrides", {})
         overrides.setdefault("name", "Cloned: {0}".format(self.name))
         return super(Product, self).clone(*args, **kwargs)
@@ -51,19 +51,102 @@ class Product(MTModel, TeamModel):
         If an ``update_instance`` is given, update it with new order and
         ``latest`` flag.
 
+        Only versions whose order or latest flag change are updated, in a
+        single statement; if any are, the latest flags of the product's
+        caseversions are then recomputed with one more.
+
+        """
+        ordered = sorted(
+            self.versions.values_list("id", "version", "order", "latest"),
+            key=lambda row: parse_version(row[1]),
+            )
+        changed = {}
+        for i, (pv_id, version, order, latest) in enumerate(ordered, 1):
+            new = (i, i == len(ordered))
+            if new != (order, latest):
+                changed[pv_id] = new
+            if update_instance is not None and update_instance.pk == pv_id:
+                update_instance.order, update_instance.latest = new
+                if pv_id in changed:
+                    update_instance.cc_version += 1
+        if changed:
+            self._update_versions(changed)
+            self._update_latest_caseversions()
+
+
+    def _update_versions(self, changed):
+        """Set (order, latest) of versions by id in ``changed`` dictionary."""
+        qn = connection.ops.quote_name
+        items = sorted(changed.items())
+        cases = " ".join(["WHEN %s THEN %s"] * len(items))
+        cursor = connection.cursor()
+        cursor.execute(
+            "UPDATE {0} SET {1} = CASE id {2} END, latest = CASE id {2} END, "
+            "cc_version = cc_version + 1 WHERE id IN ({3})".format(
+                qn(ProductVersion._meta.db_table),
+                qn("order"),
+                cases,
+                ",".join(["%s"] * len(items)),
+                ),
+            [p for pv_id, (order, latest) in items for p in (pv_id, order)]
+            + [p for pv_id, (order, latest) in items for p in (pv_id, latest)]
+            + [pv_id for pv_id, new in items],
+            )
+        commit_raw_sql()
+
+
+    def _update_latest_caseversions(self):
+        """
+        Mark latest caseversions of this product's cases, set-based.
+
+        A caseversion is latest if its product version has the highest order
+        among the versions of its case; only flags that change are updated,
+        in one statement. Each case's highest order is computed once: on
+        MySQL, which can't select from the updated table in a subquery, in a
+        derived table joined to the update; elsewhere in a subquery
+        correlated by case (an index lookup per caseversion).
+
         """
-        ordered = sorted(self.versions.all(), key=by_version)
-        for i, version in enumerate(ordered, 1):
-            version.order = i
-            version.latest = (i == len(ordered))
-            version.save(force_update=True, skip_reorder=True, notrack=True)
-            if version == update_instance:
-                update_instance.order = version.order
-                update_instance.latest = version.latest
-                update_instance.cc_version += 1
-        # now we have to update latest caseversions too, @@@ too slow?
-        for case in self.cases.all():
-            case.set_latest_version()
+        from ..library.models import CaseVersion
+        qn = connection.ops.quote_name
+        names = dict(
+            order=qn("order"),
+            pv=qn(ProductVersion._meta.db_table),
+            cv=qn(CaseVersion._meta.db_table),
+            )
+        cursor = connection.cursor()
+        if connection.vendor == "mysql":
+            cursor.execute(
+                "UPDATE {cv} cv "
+                "INNER JOIN {pv} p ON p.id = cv.productversion_id "
+                "INNER JOIN (SELECT c.case_id, MAX(cp.{order}) AS top "
+                "FROM {cv} c INNER JOIN {pv} cp ON cp.id = c.productversion_id "
+                "WHERE c.deleted_on IS NULL AND cp.product_id = %s "
+                "GROUP BY c.case_id) tops ON tops.case_id = cv.case_id "
+                "SET cv.latest = (p.{order} = tops.top), "
+                "cv.cc_version = cv.cc_version + 1 "
+                "WHERE cv.deleted_on IS NULL AND p.product_id = %s "
+                "AND p.deleted_on IS NULL "
+                "AND cv.latest <> (p.{order} = tops.top)".format(**names),
+                [self.pk] * 2,
+                )
+        else:
+            is_latest = (
+                "(SELECT p.{order} FROM {pv} p "
+                "WHERE p.id = {cv}.productversion_id) = "
+                "(SELECT MAX(p.{order}) FROM {cv} c "
+                "INNER JOIN {pv} p ON p.id = c.productversion_id "
+                "WHERE c.case_id = {cv}.case_id AND c.deleted_on IS NULL)"
+                ).format(**names)
+            cursor.execute(
+                "UPDATE {cv} SET latest = ({0}), cc_version = cc_version + 1 "
+                "WHERE deleted_on IS NULL AND productversion_id IN ("
+                "SELECT id FROM {pv} WHERE product_id = %s "
+                "AND deleted_on IS NULL) "
+                "AND latest <> ({0})".format(is_latest, **names),
+                [self.pk],
+                )
+        commit_raw_sql()
 
 
 
@@ -75,6 +158,8 @@ class ProductVersion(MTModel, TeamModel, HasEnvironmentsModel):
     # denormalized for querying
     latest = models.BooleanField(default=False, editable=False)
 
+    PARENT_FIELD = "product"
+
 
     @property
     def name(self):
@@ -164,7 +249,7 @@ class ProductVersion(MTModel, TeamModel, HasEnvironmentsModel):
         overrides = kwargs.setdefault("overrides", {})
         overrides["version"] = "%s.next" % self.version
         overrides["codename"] = "Cloned: %s" % self.codename
-        kwargs.setdefault("cascade", ["environments", "team"])
+        kwargs.setdefault("cascade", ["environments", "own_team"])
         return super(ProductVersion, self).clone(*args, **kwargs)
 
 
@@ -2,12 +2,17 @@
 Models for environments.
 
 """
+import hashlib
 import itertools
 from collections import defaultdict
 
-from django.db import models
+from django.db import connection, models
+from django.db.models.query import QuerySet
+from django.db.models.signals import m2m_changed
 
-from ..mtmodel import MTModel
+from .. import identity
+from ..mtmodel import (
+    MTModel, bulk_create_with_pks, bulk_insert, commit_raw_sql, utcnow)
 
 
 
@@ -42,13 +47,54 @@ class Profile(MTModel):
 
         new = cls.objects.create(name=name, **kwargs)
 
-        for element_list in itertools.product(*by_category.values()):
-            e = Environment.objects.create(profile=new)
-            e.elements.add(*element_list)
+        new.add_environments(
+            itertools.product(*by_category.values()), user=kwargs.get("user"))
 
         return new
 
 
+    def add_environments(self, element_lists, user=None):
+        """
+        Add an environment to this profile for each given list of elements.
+
+        Elements may be given as instances or ids. Environments and their
+        element relationships are each bulk-created in batches, so the number
+        of queries doesn't depend on the number of environments up to the
+        batch size. Return the number of environments added.
+
+        """
+        element_lists = [
+            [getattr(el, "pk", el) for el in element_list]
+            for element_list in element_lists
+            ]
+        if not element_lists:
+            return 0
+
+        now = utcnow()
+        envs = [
+            Environment(
+                profile=self,
+                fingerprint=Environment.fingerprint_of(element_list),
+                created_on=now,
+                created_by=user,
+                modified_on=now,
+                modified_by=user,
+                )
+            for element_list in element_lists
+            ]
+        bulk_create_with_pks(envs)
+
+        Through = Environment.elements.through
+        bulk_insert(
+            [
+                Through(environment_id=env.pk, element_id=element_id)
+                for env, element_list in zip(envs, element_lists)
+                for element_id in set(element_list)
+                ]
+            )
+        return len(element_lists)
+
+
     def clone(self, *args, **kwargs):
         """Clone profile, with environments."""
         kwargs.setdefault("cascade", ["environments"])
@@ -161,6 +207,12 @@ class Environment(MTModel):
 
     elements = models.ManyToManyField(Element, related_name="environments")
 
+    # canonical hash of the element set, maintained on element changes
+    fingerprint = models.CharField(
+        max_length=40, blank=True, db_index=True, editable=False)
+
+    BATCH_SIZE = 250
+
 
     def __unicode__(self):
         """Return unicode representation."""
@@ -178,13 +230,117 @@ class Environment(MTModel):
 
     def ordered_elements(self):
         """All elements in category name order."""
-        return iter(self.elements.order_by("category__name"))
+        return iter(
+            identity.memoize(
+                self,
+                "ordered_elements",
+                lambda: list(self.elements.order_by("category__name")),
+                )
+            )
 
 
     def clone(self, *args, **kwargs):
         """Clone environment, including element relationships."""
-        kwargs.setdefault("cascade", ["elements"])
-        return super(Environment, self).clone(*args, **kwargs)
+        cascade = kwargs.setdefault("cascade", ["elements"])
+        clone = super(Environment, self).clone(*args, **kwargs)
+        # the copied fingerprint holds only if all elements were copied
+        if isinstance(cascade, dict):
+            copied = "elements" in cascade and cascade["elements"] is None
+        else:
+            copied = "elements" in (cascade or [])
+        if not copied:
+            clone.fingerprint = self.update_fingerprints(
+                [clone.pk])[clone.pk]
+        return clone
+
+
+    @staticmethod
+    def fingerprint_of(elements):
+        """
+        Return the fingerprint of the set of given elements (or ids).
+
+        This is the SHA-1 hex digest of the sorted, comma-joined element ids;
+        the empty set has an empty fingerprint.
+
+        """
+        ids = sorted(set(int(getattr(el, "pk", el)) for el in elements))
+        if not ids:
+            return ""
+        return hashlib.sha1(",".join(str(i) for i in ids)).hexdigest()
+
+
+    @classmethod
+    def with_elements(cls, elements):
+        """Return queryset of environments with exactly the given elements."""
+        return cls.objects.filter(fingerprint=cls.fingerprint_of(elements))
+
+
+    @classmethod
+    def resolve(cls, element_sets, queryset=None):
+        """
+        Return dict mapping each given element set to matching environment ids.
+
+        Element sets (iterables of elements or ids) are keyed by frozenset of
+        element ids, and map to a list of ids of the environments (from
+        ``queryset``, by default all environments) with exactly those
+        elements. All sets are resolved in a single query.
+
+        """
+        by_fingerprint = {}
+        for elements in element_sets:
+            key = frozenset(int(getattr(el, "pk", el)) for el in elements)
+            by_fingerprint[cls.fingerprint_of(key)] = key
+        resolved = dict((key, []) for key in by_fingerprint.values())
+        if not by_fingerprint:
+            return resolved
+
+        if queryset is None:
+            queryset = cls.objects.all()
+        for env_id, fingerprint in queryset.filter(
+                fingerprint__in=by_fingerprint.keys()).order_by(
+                "id").values_list("id", "fingerprint"):
+            resolved[by_fingerprint[fingerprint]].append(env_id)
+        return resolved
+
+
+    @classmethod
+    def update_fingerprints(cls, env_ids):
+        """
+        Recompute stored fingerprints of environments with given ids.
+
+        Reads element relationships and writes fingerprints a batch at a time,
+        without bumping ``cc_version`` (the fingerprint is derived data).
+        Return dict mapping environment id to its new fingerprint.
+
+        """
+        env_ids = sorted(set(env_ids))
+        Through = cls.elements.through
+        qn = connection.ops.quote_name
+        fingerprints = {}
+        for start in range(0, len(env_ids), cls.BATCH_SIZE):
+            batch = env_ids[start:start + cls.BATCH_SIZE]
+            elements = defaultdict(list)
+            for env_id, element_id in Through.objects.filter(
+                    environment__in=batch).values_list(
+                    "environment_id", "element_id"):
+                elements[env_id].append(element_id)
+            items = [
+                (env_id, cls.fingerprint_of(elements[env_id]))
+                for env_id in batch
+                ]
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE {0} SET fingerprint = CASE id {1} END "
+                "WHERE id IN ({2})".format(
+                    qn(cls._meta.db_table),
+                    " ".join(["WHEN %s THEN %s"] * len(items)),
+                    _placeholders(batch),
+                    ),
+                [p for item in items for p in item] + batch,
+                )
+            commit_raw_sql()
+            fingerprints.update(items)
+        return fingerprints
 
 
     # @@@ there should be some way to annotate this onto a queryset efficiently
@@ -218,6 +374,33 @@ class Environment(MTModel):
 
 
 
+def update_fingerprints(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep environment fingerprints (and memoized elements) in sync."""
+    if reverse:
+        if action == "pre_clear":
+            # after the clear there's no telling which environments it hit
+            instance._cleared_env_ids = list(
+                sender.objects.filter(element=instance).values_list(
+                    "environment_id", flat=True)
+                )
+        elif action in ["post_add", "post_remove"]:
+            Environment.update_fingerprints(pk_set)
+            identity.forget(Environment, pk_set)
+        elif action == "post_clear":
+            env_ids = instance.__dict__.pop("_cleared_env_ids", [])
+            Environment.update_fingerprints(env_ids)
+            identity.forget(Environment, env_ids)
+    elif action in ["post_add", "post_remove", "post_clear"]:
+        instance.fingerprint = Environment.update_fingerprints(
+            [instance.pk])[instance.pk]
+        identity.forget(Environment, [instance.pk])
+
+
+
+m2m_changed.connect(update_fingerprints, sender=Environment.elements.through)
+
+
+
 class HasEnvironmentsModel(models.Model):
     """
     Base for models that inherit/cascade environments to/from parents/children.
@@ -274,16 +457,63 @@ class HasEnvironmentsModel(models.Model):
 
     @classmethod
     def _remove_envs(cls, objs, envs):
-        """Remove one or environments from one or more objects of this class."""
+        """
+        Remove one or more environments from one or more objects of this class.
+
+        ``objs`` may be a list or a queryset; through-table rows are deleted
+        with one statement per cascade level.
+
+        """
         for model, instances in cls.cascade_envs_to(objs, adding=False).items():
             model._remove_envs(instances, envs)
-        m2m_reverse_name = cls.environments.field.related_query_name()
-        cls.environments.through._base_manager.filter(
-            **{
-                "{0}__in".format(m2m_reverse_name): objs,
-                "environment__in": envs
-                }
-              ).delete()
+        env_ids = _env_ids(envs)
+        objs_sql, objs_params = _objs_sql(cls, objs)
+        if not env_ids or objs_sql is None:
+            return
+        through, source, target = _env_through(cls)
+        connection.cursor().execute(
+            "DELETE FROM {0} WHERE {1} IN ({2}) AND {3} IN ({4})".format(
+                through, source, objs_sql, target, _placeholders(env_ids)),
+            objs_params + env_ids,
+            )
+        commit_raw_sql()
+
+
+    @classmethod
+    def _add_envs(cls, objs, envs):
+        """
+        Add one or more environments to one or more objects of this class.
+
+        ``objs`` may be a list or a queryset; through-table rows that don't
+        exist yet are inserted with one statement per cascade level.
+
+        """
+        env_ids = _env_ids(envs)
+        objs_sql, objs_params = _objs_sql(cls, objs)
+        if not env_ids or objs_sql is None:
+            return
+        through, source, target = _env_through(cls)
+        qn = connection.ops.quote_name
+        # MySQL can't select from the table inserted into in a subquery, so
+        # existing rows are excluded with an outer join instead.
+        connection.cursor().execute(
+            "INSERT INTO {0} ({1}, {2}) SELECT o.id, e.id FROM {3} o "
+            "CROSS JOIN {4} e LEFT OUTER JOIN {0} t "
+            "ON t.{1} = o.id AND t.{2} = e.id "
+            "WHERE t.{1} IS NULL AND o.id IN ({5}) AND e.id IN ({6})".format(
+                through,
+                source,
+                target,
+                qn(cls._meta.db_table),
+                qn(Environment._meta.db_table),
+                objs_sql,
+                _placeholders(env_ids),
+                ),
+            objs_params + env_ids,
+            )
+        commit_raw_sql()
+        for model, instances in cls.cascade_envs_to(objs, adding=True).items():
+            model._add_envs(instances, envs)
 
 
     def remove_envs(self, *envs):
@@ -293,9 +523,47 @@ class HasEnvironmentsModel(models.Model):
 
     def add_envs(self, *envs):
         """Add one or more environments to this object's profile."""
-        # @@@ optimize this to reduce queries once we have bulk insert in 1.4
-        self.environments.add(*envs)
-        for model, instances in self.cascade_envs_to(
-                [self], adding=True).items():
-            for instance in instances:
-                instance.add_envs(*envs)
+        self._add_envs([self], envs)
+
+
+
+def _env_ids(envs):
+    """Return list of ids of ``envs``, given as environments or ids."""
+    return sorted(set(getattr(env, "pk", env) for env in envs))
+
+
+
+def _objs_sql(model, objs):
+    """
+    Return SQL and params selecting pks of ``objs`` of ``model``.
+
+    ``objs`` may be a queryset or a list of instances; returns (None, [])
+    for an empty list.
+
+    """
+    if isinstance(objs, QuerySet):
+        sql, params = objs.values("pk").query.get_compiler(
+            connection=connection).as_sql()
+        return sql, list(params)
+    pks = [obj.pk for obj in objs]
+    if not pks:
+        return None, []
+    return _placeholders(pks), pks
+
+
+
+def _env_through(model):
+    """Return quoted (table, source column, target column) of env m2m."""
+    qn = connection.ops.quote_name
+    field = model.environments.field
+    return (
+        qn(field.rel.through._meta.db_table),
+        qn(field.m2m_column_name()),
+        qn(field.m2m_reverse_name()),
+        )
+
+
+
+def _placeholders(values):
+    """Return comma-separated query placeholders for ``values``."""
+    return ", ".join(["%s"] * len(values))
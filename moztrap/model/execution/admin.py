@@ -72,3 +72,4 @@ admin.site.register(models.Run, RunAdmin)
 admin.site.register(
     models.RunCaseVersion, MTModelAdmin, inlines=[ResultInline])
 admin.site.register(models.Result, ResultAdmin)
+admin.site.register(models.RunJob, MTModelAdmin)
@@ -1,5 +1,5 @@
 from django.db.models import Count
-from tastypie.resources import ModelResource, ALL_WITH_RELATIONS
+from tastypie.resources import Resource, ModelResource, ALL_WITH_RELATIONS
 from tastypie import http, fields
 from tastypie.exceptions import ImmediateHttpResponse
 from tastypie.bundle import Bundle
@@ -9,8 +9,11 @@ import json
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.http import HttpResponse
 
+from .. import identity
+from .bulk import submit_results, submit_result_stream
 from .models import Run, RunCaseVersion, RunSuite, Result
-from ..mtapi import MTResource, MTApiKeyAuthentication, MTAuthorization
+from ..mtapi import (MTResource, MTApiKeyAuthentication, MTAuthorization,
+    KeysetPaginator)
 from ..core.api import (ProductVersionResource, ProductResource,
                         ReportResultsAuthorization, UserResource)
 from ..environments.api import EnvironmentResource
@@ -57,6 +60,7 @@ class RunCaseVersionResource(ModelResource):
             "caseversion": ALL_WITH_RELATIONS,
             }
         fields = ["id", "run"]
+        paginator_class = KeysetPaginator
 
 
 
@@ -98,14 +102,15 @@ class RunResource(ModelResource):
         authentication = MTApiKeyAuthentication()
         authorization = ReportResultsAuthorization()
         always_return_data = True
+        paginator_class = KeysetPaginator
 
 
     def dehydrate(self, bundle):
         """Add some convenience fields to the return JSON."""
 
-        pv = bundle.obj.productversion
+        pv = identity.related(bundle.obj, "productversion")
         bundle.data["productversion_name"] = pv.version
-        bundle.data["product_name"] = pv.product.name
+        bundle.data["product_name"] = identity.related(pv, "product").name
 
         return bundle
 
@@ -196,8 +201,8 @@ class RunResource(ModelResource):
 
 
                 data["user"] = bundle.request.user
-                data["environment"] = Environment.objects.get(
-                    pk=data["environment"])
+                data["environment"] = identity.get(
+                    Environment, data["environment"])
 
                 # create result via methods on runcaseversion
                 rcv.get_result_method(status)(**data)
@@ -273,7 +278,7 @@ class ResultResource(ModelResource):
         try:
             status = data.pop("status")
             case = data.pop("case")
-            env = Environment.objects.get(pk=data.get("environment"))
+            env = identity.get(Environment, data.get("environment"))
             run = data.pop("run_id")
 
         except KeyError as e:
@@ -306,6 +311,99 @@ class ResultResource(ModelResource):
 
 
 
+class BulkResultResource(Resource):
+    """
+    Endpoint for submitting a large batch of results in one request.
+
+    This endpoint is write only.  POST the same result objects accepted by
+    ``ResultResource``::
+
+        {
+            "objects": [
+                {
+                    "case": "1",
+                    "environment": "23",
+                    "run_id": "1",
+                    "status": "passed"
+                },
+                ...
+            ]
+        }
+
+    The whole batch is validated and recorded with a fixed number of queries.
+    Valid objects are recorded even if others are rejected; the response
+    gives the number recorded and an error for each rejected object, by its
+    index in ``objects``::
+
+        {
+            "recorded": 1,
+            "errors": [{"index": 1, "error": "..."}]
+        }
+
+    Large uploads can instead be POSTed with content type
+    ``application/x-ndjson``: one result object per line, without the
+    "objects" wrapper. The body is then read and recorded a chunk of lines
+    at a time rather than deserialized at once, and errors are given by
+    (1-based) ``line`` rather than ``index``.
+
+    """
+
+    class Meta:
+        resource_name = "bulkresult"
+        list_allowed_methods = ["post"]
+        detail_allowed_methods = []
+
+        authentication = MTApiKeyAuthentication()
+        authorization = ReportResultsAuthorization()
+
+
+    def post_list(self, request, **kwargs):
+        """Record all submitted results; 400 if none could be recorded."""
+        content_type = request.META.get("CONTENT_TYPE", "")
+        if content_type.startswith("application/x-ndjson"):
+            return self.post_stream(request)
+
+        deserialized = self.deserialize(
+            request,
+            request.raw_post_data,
+            format=request.META.get("CONTENT_TYPE", "application/json"),
+            )
+        try:
+            objects = list(deserialized["objects"])
+        except (KeyError, TypeError):
+            raise ImmediateHttpResponse(
+                response=http.HttpBadRequest(
+                    "Submitted data must have a list of 'objects'."))
+
+        errors = submit_results(objects, request.user)
+        data = {
+            "recorded": len(objects) - len(errors),
+            "errors": [{"index": i, "error": e} for i, e in errors],
+            }
+        if objects and len(errors) == len(objects):
+            response_class = http.HttpBadRequest
+        else:
+            response_class = http.HttpAccepted
+        return self.create_response(
+            request, data, response_class=response_class)
+
+
+    def post_stream(self, request):
+        """Record results streamed as newline-delimited JSON."""
+        recorded, errors = submit_result_stream(request, request.user)
+        data = {
+            "recorded": recorded,
+            "errors": [{"line": n, "error": e} for n, e in errors],
+            }
+        if errors and not recorded:
+            response_class = http.HttpBadRequest
+        else:
+            response_class = http.HttpAccepted
+        return self.create_response(
+            request, data, response_class=response_class)
+
+
+
 class RunSuiteResource(MTResource):
     """
     Create, Read, Update and Delete capabilities for RunSuite.
@@ -347,13 +445,14 @@ class RunSuiteResource(MTResource):
             suite = Suite.objects.get(id=suite_id)
             run_id = self._id_from_uri(bundle.data['run'])
             run = Run.objects.get(id=run_id)
-            if suite.product.id != run.productversion.product.id:
+            productversion = identity.related(run, "productversion")
+            if suite.product_id != productversion.product_id:
                 error_message = str(
                     "suite's product must match run's product."
                 )
                 logger.error(
                     "\n".join([error_message, "suite prod: %s, run prod: %s"]),
-                    suite.product.id, run.productversion.product.id)
+                    suite.product_id, productversion.product_id)
                 raise ImmediateHttpResponse(
                     response=http.HttpBadRequest(error_message))
 
@@ -0,0 +1,291 @@
+"""
+Set-based recording of large batches of results.
+
+"""
+import json
+
+from django.db import transaction
+from django.db.models import Q
+
+from ..library.models import CaseStep
+from ..mtmodel import bulk_create_with_pks, bulk_insert, utcnow
+from .models import (
+    BULK_UPDATE_BATCH_SIZE, RunCaseVersion, Result, StepResult,
+    RunEnvironmentSummary)
+
+
+
+# statuses that may be submitted, as for ``RunCaseVersion.get_result_method``
+SUBMITTABLE_STATES = Result.COMPLETED_STATES + [Result.STATUS.skipped]
+
+# number of streamed results recorded together, in one transaction
+STREAM_CHUNK_SIZE = 500
+
+
+
+def submit_results(items, user):
+    """
+    Record a batch of results submitted by ``user``; return per-item errors.
+
+    Each item is a dict with the same keys accepted by the ``result`` API:
+    "run_id", "case", "environment" and "status", and optionally "comment"
+    and (for failed results) "stepnumber" and "bug". Results are recorded
+    with the same semantics as the ``RunCaseVersion.result_*`` methods (a
+    skipped result is recorded for all environments of the runcaseversion),
+    but with a fixed number of queries per batch rather than per item.
+
+    Returns a list of (index, error message) tuples for items that were not
+    recorded; all other items are recorded in a single transaction.
+
+    """
+    errors = []
+    valid = []
+    for i, item in enumerate(items):
+        try:
+            valid.append((i, _clean(item)))
+        except ValueError as e:
+            errors.append((i, str(e)))
+
+    rcvs = _runcaseversions(set((d["run_id"], d["case"]) for i, d in valid))
+    rcv_envs = _environments(set(rcv_id for rcv_id, cv_id in rcvs.values()))
+
+    # list of result rows to create: (index, rcv_id, cv_id, env_id, data)
+    rows = []
+    for i, data in valid:
+        rcv_id, cv_id = rcvs.get((data["run_id"], data["case"]), (None, None))
+        envs = rcv_envs.get(rcv_id, set())
+        if data["environment"] not in envs:
+            errors.append(
+                (
+                    i,
+                    "RunCaseVersion not found for run: {0}, case: {1}, "
+                    "environment: {2}".format(
+                        data["run_id"], data["case"], data["environment"])
+                    )
+                )
+            continue
+        if data["status"] == Result.STATUS.skipped:
+            # skipping skips for all environments
+            for env_id in sorted(envs):
+                rows.append((i, rcv_id, cv_id, env_id, data))
+        else:
+            rows.append((i, rcv_id, cv_id, data["environment"], data))
+
+    if rows:
+        _record(rows, user)
+
+    errors.sort()
+    return errors
+
+
+
+def submit_result_stream(lines, user, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Record results from newline-delimited JSON ``lines``, a chunk at a time.
+
+    ``lines`` may be any iterable of lines (e.g. an open file or a request);
+    each non-blank line is one result object as accepted by
+    ``submit_results``. Only one chunk of ``chunk_size`` results is held in
+    memory at a time, and each chunk is recorded in its own transaction.
+
+    Returns a tuple of the number of results recorded and a list of
+    (line number, error message) tuples for lines that were not recorded.
+
+    """
+    recorded = 0
+    errors = []
+    chunk = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunk.append((lineno, json.loads(line)))
+        except ValueError as e:
+            errors.append((lineno, "Could not parse JSON: {0}".format(e)))
+            continue
+        if len(chunk) >= chunk_size:
+            recorded += _submit_chunk(chunk, user, errors)
+            chunk = []
+    if chunk:
+        recorded += _submit_chunk(chunk, user, errors)
+    return recorded, errors
+
+
+
+def _submit_chunk(chunk, user, errors):
+    """
+    Submit (line number, item) ``chunk``; return number of results recorded.
+
+    Errors are appended to ``errors`` by line number.
+
+    """
+    chunk_errors = submit_results([item for lineno, item in chunk], user)
+    errors.extend((chunk[i][0], e) for i, e in chunk_errors)
+    return len(chunk) - len(chunk_errors)
+
+
+
+def _clean(item):
+    """Return cleaned copy of result ``item``; raise ValueError if invalid."""
+    try:
+        data = {
+            "status": item["status"],
+            "case": item["case"],
+            "environment": item["environment"],
+            "run_id": item["run_id"],
+            }
+    except (KeyError, TypeError) as e:
+        raise ValueError("bad result object data missing key: {0}".format(e))
+    if data["status"] not in SUBMITTABLE_STATES:
+        raise ValueError(
+            "{0} is not a valid result status.".format(data["status"]))
+    for key in ["case", "environment", "run_id"]:
+        try:
+            data[key] = int(data[key])
+        except (TypeError, ValueError):
+            raise ValueError(
+                "{0} must be an integer id, not {1!r}.".format(key, data[key]))
+    data["comment"] = item.get("comment") or ""
+    data["bug"] = item.get("bug") or ""
+    stepnumber = item.get("stepnumber")
+    if stepnumber is not None:
+        try:
+            stepnumber = int(stepnumber)
+        except (TypeError, ValueError):
+            raise ValueError(
+                "stepnumber must be an integer, not {0!r}.".format(stepnumber))
+    data["stepnumber"] = stepnumber
+    return data
+
+
+
+def _runcaseversions(keys):
+    """Map (run id, case id) keys to (rcv id, caseversion id) in one query."""
+    if not keys:
+        return {}
+    found = {}
+    qs = RunCaseVersion.objects.filter(
+        run__in=set(run_id for run_id, case_id in keys),
+        caseversion__case__in=set(case_id for run_id, case_id in keys),
+        ).order_by("id").values_list(
+        "id", "run_id", "caseversion__case_id", "caseversion_id")
+    for rcv_id, run_id, case_id, cv_id in qs:
+        found.setdefault((run_id, case_id), (rcv_id, cv_id))
+    return found
+
+
+
+def _environments(rcv_ids):
+    """Map runcaseversion ids to sets of their environment ids."""
+    envs = {}
+    if rcv_ids:
+        through = RunCaseVersion.environments.through
+        for rcv_id, env_id in through.objects.filter(
+                runcaseversion__in=rcv_ids,
+                environment__deleted_on__isnull=True,
+                ).values_list("runcaseversion_id", "environment_id"):
+            envs.setdefault(rcv_id, set()).add(env_id)
+    return envs
+
+
+
+@transaction.commit_on_success
+def _record(rows, user):
+    """Create results (and failed step results) for the given rows."""
+    now = utcnow()
+
+    # the last submitted result for each runcaseversion/env becomes latest
+    latest = {}
+    for n, (i, rcv_id, cv_id, env_id, data) in enumerate(rows):
+        latest[(rcv_id, env_id)] = n
+
+    pairs = sorted(latest.keys())
+    for start in range(0, len(pairs), BULK_UPDATE_BATCH_SIZE):
+        by_env = {}
+        for rcv_id, env_id in pairs[start:start + BULK_UPDATE_BATCH_SIZE]:
+            by_env.setdefault(env_id, []).append(rcv_id)
+        q = Q()
+        for env_id, rcv_ids in by_env.items():
+            q |= Q(environment=env_id, runcaseversion__in=rcv_ids)
+        Result.objects.filter(q, tester=user, is_latest=True).update(
+            is_latest=False)
+
+    results = []
+    for n, (i, rcv_id, cv_id, env_id, data) in enumerate(rows):
+        results.append(
+            Result(
+                runcaseversion_id=rcv_id,
+                environment_id=env_id,
+                tester=user,
+                status=data["status"],
+                comment=data["comment"],
+                is_latest=(latest[(rcv_id, env_id)] == n),
+                created_on=now,
+                created_by=user,
+                modified_on=now,
+                modified_by=user,
+                )
+            )
+    bulk_create_with_pks(results)
+
+    failed = [
+        (result, cv_id, data)
+        for result, (i, rcv_id, cv_id, env_id, data) in zip(results, rows)
+        if data["status"] == Result.STATUS.failed
+        ]
+    if failed:
+        _record_failed_steps(failed, user, now)
+        RunCaseVersion.objects.filter(
+            pk__in=set(r.runcaseversion_id for r, cv_id, data in failed)
+            ).update(user=user)
+
+    RunEnvironmentSummary.rebuild(
+        set(
+            RunCaseVersion.objects.filter(
+                pk__in=set(row[1] for row in rows)).values_list(
+                "run_id", flat=True)
+            )
+        )
+
+
+
+def _record_failed_steps(failed, user, now):
+    """
+    Create failed step results for failed results that name a step.
+
+    ``failed`` lists (result, caseversion id, data) of the failed results just
+    created at ``now``.
+
+    """
+    wanted = [
+        (result, cv_id, data) for (result, cv_id, data) in failed
+        if data["stepnumber"] is not None
+        ]
+    if not wanted:
+        return
+    steps = dict(
+        ((cv_id, number), step_id)
+        for step_id, cv_id, number in CaseStep.objects.filter(
+            caseversion__in=set(cv_id for r, cv_id, data in wanted),
+            number__in=set(data["stepnumber"] for r, c, data in wanted),
+            ).values_list("id", "caseversion_id", "number")
+        )
+
+    stepresults = []
+    for result, cv_id, data in wanted:
+        step_id = steps.get((cv_id, data["stepnumber"]))
+        if step_id is not None:
+            stepresults.append(
+                StepResult(
+                    result=result,
+                    step_id=step_id,
+                    status=StepResult.STATUS.failed,
+                    bug_url=data["bug"],
+                    created_on=now,
+                    created_by=user,
+                    modified_on=now,
+                    modified_by=user,
+                    )
+                )
+    bulk_insert(stepresults)
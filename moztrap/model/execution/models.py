@@ -4,13 +4,16 @@ Models for test execution (runs, results).
 """
 import datetime
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.db import connection, transaction, models
-from django.db.models import Q, Count, Max
 
 from model_utils import Choices
 
-from ..mtmodel import MTModel, TeamModel, DraftStatusModel
+from ..mtmodel import (
+    MTModel, TeamModel, BaseDraftStatusModel, utcnow, commit_raw_sql,
+    bulk_batches, post_soft_delete, post_undelete)
 from ..core.auth import User
 from ..core.models import ProductVersion
 from ..environments.models import Environment, HasEnvironmentsModel
@@ -18,8 +21,80 @@ from ..library.models import CaseVersion, Suite, CaseStep
 
 
 
-class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
+# maximum number of rows touched by one CASE-based bulk UPDATE statement
+BULK_UPDATE_BATCH_SIZE = 1000
+
+
+
+def qn(name):
+    """Quote a column or table name for raw SQL."""
+    return connection.ops.quote_name(name)
+
+
+
+def _execute(sql, params=None):
+    """
+    Execute a raw modifying statement, committing it unless managed.
+
+    See ``commit_raw_sql``.
+
+    """
+    cursor = connection.cursor()
+    cursor.execute(sql, params or [])
+    commit_raw_sql()
+    return cursor.rowcount
+
+
+
+def _delete_runcaseversions_where(rcv_id_sql, params):
+    """
+    Permanently delete runcaseversions selected by ``rcv_id_sql``, with results.
+
+    ``rcv_id_sql`` must be a SELECT of runcaseversion ids; it is used as a
+    subquery so the ids are never loaded into Python. Step results, results
+    and environment rows are removed before the runcaseversions themselves.
+    Returns the number of results deleted.
+
+    """
+    _execute(
+        """DELETE FROM execution_stepresult WHERE result_id IN (
+            SELECT id FROM execution_result
+            WHERE runcaseversion_id IN ({0}))
+        """.format(rcv_id_sql),
+        params,
+        )
+    results_deleted = _execute(
+        """DELETE FROM execution_result
+        WHERE runcaseversion_id IN ({0})
+        """.format(rcv_id_sql),
+        params,
+        )
+    _execute(
+        """DELETE FROM execution_runcaseversion_environments
+        WHERE runcaseversion_id IN ({0})
+        """.format(rcv_id_sql),
+        params,
+        )
+    # MySQL refuses a subquery on the table being deleted from, so the
+    # runcaseversion ids are wrapped in a derived table.
+    _execute(
+        """DELETE FROM execution_runcaseversion
+        WHERE id IN (SELECT stale.id FROM ({0}) stale)
+        """.format(rcv_id_sql),
+        params,
+        )
+    return results_deleted
+
+
+
+class Run(MTModel, TeamModel, BaseDraftStatusModel, HasEnvironmentsModel):
     """A test run."""
+    # runs are "activating" while their caseversions are locked out of band
+    STATUS = Choices("draft", "active", "disabled", "activating")
+
+    status = models.CharField(
+        max_length=30, db_index=True, choices=STATUS, default=STATUS.draft)
+
     productversion = models.ForeignKey(ProductVersion, related_name="runs")
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -34,6 +109,8 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
     suites = models.ManyToManyField(
         Suite, through="RunSuite", related_name="runs")
 
+    PARENT_FIELD = "productversion"
+
 
     def __unicode__(self):
         """Return unicode representation."""
@@ -65,7 +142,7 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
     def clone(self, *args, **kwargs):
         """Clone this Run with default cascade behavior."""
         kwargs.setdefault(
-            "cascade", ["runsuites", "environments", "team"])
+            "cascade", ["runsuites", "environments", "own_team"])
         overrides = kwargs.setdefault("overrides", {})
         overrides["status"] = self.STATUS.draft
         overrides.setdefault("name", "Cloned: {0}".format(self.name))
@@ -76,7 +153,7 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
         """Clone this Run to create a new series item."""
         build = kwargs.pop("build", None)
         kwargs.setdefault(
-            "cascade", ["runsuites", "environments", "team"])
+            "cascade", ["runsuites", "environments", "own_team"])
         overrides = kwargs.setdefault("overrides", {})
         overrides.setdefault("name", "{0} - Build: {1}".format(
             self.name, build))
@@ -92,19 +169,77 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
 
 
     def activate(self, *args, **kwargs):
-        """Make run active, locking in runcaseversions for all suites."""
-        if self.status == self.STATUS.draft:
-            self.update_case_versions()
+        """
+        Make run active, locking in runcaseversions for all suites.
+
+        Takes an optional ``progress`` callable; see ``_lock_case_versions``.
+
+        """
+        progress = kwargs.pop("progress", None)
+        if self.status in [self.STATUS.draft, self.STATUS.activating]:
+            self.update_case_versions(progress=progress)
         super(Run, self).activate(*args, **kwargs)
 
 
     def refresh(self, *args, **kwargs):
-        """Update all the runcaseversions while the run is active."""
+        """
+        Update all the runcaseversions while the run is active.
+
+        Takes an optional ``progress`` callable; see ``_lock_case_versions``.
+
+        """
+        progress = kwargs.pop("progress", None)
         if self.status == self.STATUS.active:
-            self.update_case_versions()
+            self.update_case_versions(progress=progress)
+
+
+    def queue_activation(self, user=None):
+        """
+        Activate this run, locking runcaseversions in a background job.
+
+        A draft run is marked "activating" and a ``RunJob`` is queued to lock
+        its caseversions and make it active; the job is returned. Runs that
+        have nothing to lock (not draft, or a series) are activated
+        immediately and None is returned. If ``settings.RUN_JOBS_ASYNC`` is
+        False, activation always happens immediately.
+
+        """
+        if (not settings.RUN_JOBS_ASYNC or self.is_series or
+                self.status != self.STATUS.draft):
+            self.activate(user=user)
+            return None
+        self.status = self.STATUS.activating
+        self.save(force_update=True, user=user)
+        return RunJob.objects.create(
+            run=self, action=RunJob.ACTION.activate, user=user)
+
+
+    def queue_refresh(self, user=None):
+        """
+        Refresh this run's runcaseversions in a background job.
+
+        Returns the queued ``RunJob``, or None if the run is not active (or is
+        a series) and so has nothing to refresh. If ``settings.RUN_JOBS_ASYNC``
+        is False, the refresh happens immediately.
+
+        """
+        if (not settings.RUN_JOBS_ASYNC or self.is_series or
+                self.status != self.STATUS.active):
+            self.refresh(user=user)
+            return None
+        return RunJob.objects.create(
+            run=self, action=RunJob.ACTION.refresh, user=user)
+
+
+    def latest_job(self):
+        """Return the most recently queued ``RunJob`` for this run, or None."""
+        try:
+            return self.jobs.order_by("-created_on", "-id")[0]
+        except IndexError:
+            return None
 
 
-    def update_case_versions(self):
+    def update_case_versions(self, progress=None):
         """
         Update the runcaseversions with any changes to suites.
 
@@ -114,191 +249,303 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
         # series member runs that will use them.  So only lock the caseversions
         # if this is NOT a series.
         if not self.is_series:
-            self._lock_case_versions()
+            self._lock_case_versions(progress=progress)
 
 
     @transaction.commit_on_success
-    def _lock_case_versions(self):
+    def _lock_case_versions(self, progress=None):
         """
         Select caseversions from suites, create runcaseversions.
 
+        The work is done in set-based statements: the desired caseversions
+        are computed in SQL and runcaseversions (and their environments) are
+        inserted, re-ordered and deleted in bulk, new runcaseversions in
+        batches of at most ``BULK_UPDATE_BATCH_SIZE``.
+
+        If given, ``progress`` is called with the number of runcaseversions
+        the run has so far before and after inserting each batch. It must not
+        commit: locking is a single transaction, and a partial lock (stale
+        runcaseversions deleted, new ones only partly inserted, none with
+        environments yet) must never be committed.
+
         WARNING: Testing this code in the PyCharm debugger will give an
         incorrect number of queries, because for the debugger to show all the
         information it wants, it must do queries itself.  When testing with
         assertNumQueries, don't use the PyCharm debugger.
 
         """
-
-        # get the list of environments for this run
-        run_env_ids = self.environments.values_list("id", flat=True)
-
         # make a list of cvs in order by RunSuite, then SuiteCase.
         # This list is built from the run / suite / env combination and has
         # no knowledge of any possibly existing runcaseversions yet.
-        if len(run_env_ids):
-            cursor = connection.cursor()
-            sql = """SELECT DISTINCT cv.id as id
-                FROM execution_run as r
-                    INNER JOIN execution_runsuite as rs
-                        ON rs.run_id = r.id
-                    INNER JOIN library_suitecase as sc
-                        ON rs.suite_id = sc.suite_id
-                    INNER JOIN library_suite as s
-                        ON sc.suite_id = s.id
-                    INNER JOIN library_caseversion as cv
-                        ON cv.case_id = sc.case_id
-                        AND cv.productversion_id = r.productversion_id
-                    INNER JOIN library_caseversion_environments as cve
-                        ON cv.id = cve.caseversion_id
-                WHERE cv.status = 'active'
-                    AND cv.deleted_on IS NULL
-                    AND s.status = 'active'
-                    AND rs.run_id = {0}
-                    AND cve.environment_id IN ({1})
-                ORDER BY rs.order, sc.order
-                """.format(self.id, ",".join(map(str, run_env_ids)))
-            cursor.execute(sql)
-
-            cv_list = [x[0] for x in cursor.fetchall()]
-
-            # @@@ do we need to check for duplicates?
-            # use itertools.unique_everseen
-            #if len(set(cv_list)) != len(cv_list):
-            #    cv_list = itertools.unique_everseen(cv_list)
-
-        else:
-            cv_list = []
+        sql, params = self._runcaseversion_source_sql(ordered=True)
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        cv_list = []
+        seen = set()
+        for (cv_id,) in cursor.fetchall():
+            # a case may be included via more than one suite; the first
+            # occurrence determines its order.
+            if cv_id not in seen:
+                seen.add(cv_id)
+                cv_list.append(cv_id)
 
         # delete rcvs that we won't be needing anymore
-        self._delete_runcaseversions(cv_list)
+        self._delete_runcaseversions()
 
         # audit for duplicate rcvs for the same cv.id
-        dups = self.runcaseversions.values("caseversion_id").annotate(
-            num_records=Count("caseversion")).filter(num_records__gt=1)
-        if len(dups) > 0:
-            for dup in dups:
-                # get the runcaseversions, and sort descending by the id
-                # of the results.  So the first one is the one with the latest
-                # result.  We keep that one and delete the rest.
-                rcv_to_save = self.runcaseversions.annotate(
-                    latest_result=Max("results__id")).filter(
-                        caseversion=dup["caseversion_id"]).order_by(
-                            "-latest_result")[0]
-                self.runcaseversions.filter(
-                    caseversion=dup["caseversion_id"]).exclude(
-                        id=rcv_to_save.id).delete()
-
-        # remaining rcvs should be ones we want to keep, and we need to inject
-        # those ids into the insert/update list for bulk_insert.  So create
-        # a dict mapping cv_id: rcv_id.  If one exists, its order field will
-        # be updated in the build_update cmd.
-        existing_rcv_map = {}
-        for map_item in self.runcaseversions.values("id", "caseversion_id"):
-            existing_rcv_map[map_item["caseversion_id"]] = map_item["id"]
+        self._delete_duplicate_runcaseversions()
 
-        # build the list of rcvs that we DO need.  Be sure to include the ids
-        # for rcvs that already exist so that we will just be updating the
-        # order and not replacing it.  We will use a special manager that does
-        # an update on insert error.
+        # remaining rcvs should be ones we want to keep; map cv_id to the
+        # existing rcv id and order so we only touch the ones that moved.
+        existing_rcv_map = {}
+        for rcv_id, cv_id, order in self.runcaseversions.values_list(
+                "id", "caseversion_id", "order"):
+            existing_rcv_map[cv_id] = (rcv_id, order)
 
+        # runcaseversion ids mapped to their new order
+        rcv_orders_to_update = {}
         # runcaseversion objects we will use to bulk create
-        rcv_to_update = []
         rcv_proxies_to_create = []
 
-        order = 1
-        for cv in cv_list:
+        for order, cv in enumerate(cv_list, 1):
             if cv in existing_rcv_map:
-                # we will just update the order value
-                rcv_to_update.append({"caseversion_id": cv, "order": order})
+                rcv_id, old_order = existing_rcv_map[cv]
+                if old_order != order:
+                    rcv_orders_to_update[rcv_id] = order
             else:
-                # we need to create a new one
-                kwargs = {
-                    "run_id": self.id,
-                    "caseversion_id": cv,
-                    "order": order
-                    }
-                rcv_proxies_to_create.append(RunCaseVersion(**kwargs))
-            order += 1
+                rcv_proxies_to_create.append(
+                    RunCaseVersion(
+                        run_id=self.id, caseversion_id=cv, order=order))
 
         # update existing rcvs
-        for rcv in rcv_to_update:
-            self.runcaseversions.filter(
-                caseversion=rcv["caseversion_id"]).update(order=rcv["order"])
+        self._bulk_update_runcaseversion_order(rcv_orders_to_update)
 
         # insert these rcvs in bulk
-        self._bulk_insert_new_runcaseversions(rcv_proxies_to_create)
+        locked = len(existing_rcv_map)
+        if progress is not None:
+            progress(locked)
+        for batch in bulk_batches(
+                rcv_proxies_to_create, BULK_UPDATE_BATCH_SIZE):
+            self._bulk_insert_new_runcaseversions(batch)
+            locked += len(batch)
+            if progress is not None:
+                progress(locked)
 
         self._bulk_update_runcaseversion_environments_for_lock()
 
         self._lock_caseversions_complete()
 
 
-    def _delete_runcaseversions(self, cv_list):
-        """Hook to delete runcaseversions we know we don't need anymore."""
-        self.runcaseversions.exclude(caseversion__in=cv_list).delete(
-            permanent=True)
+    def count_caseversions_to_lock(self):
+        """Return the number of caseversions activation would lock in."""
+        sql, params = self._runcaseversion_source_sql()
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(DISTINCT source.id) FROM ({0}) source".format(sql),
+            params,
+            )
+        return cursor.fetchone()[0]
 
 
-    def _bulk_insert_new_runcaseversions(self, rcv_proxies):
-        """Hook to bulk-insert runcaseversions we know we DO need."""
-        self.runcaseversions.bulk_create(rcv_proxies)
+    def _runcaseversion_source_sql(self, ordered=False):
+        """
+        Return (sql, params) selecting ids of caseversions this run should have.
 
+        A caseversion is included if it is active, belongs to an active suite
+        in this run and to the run's product version, and shares at least one
+        environment with the run. If ``ordered`` is True, rows are ordered by
+        RunSuite and then SuiteCase order (and may contain duplicates when a
+        case is in more than one suite); otherwise the query is suitable for
+        use as a subquery.
 
-    def _bulk_update_runcaseversion_environments_for_lock(self):
         """
-        update runcaseversion_environment records with latest state.
+        sql = """SELECT cv.id
+            FROM execution_runsuite rs
+                INNER JOIN library_suite s
+                    ON s.id = rs.suite_id
+                INNER JOIN library_suitecase sc
+                    ON sc.suite_id = rs.suite_id
+                INNER JOIN library_caseversion cv
+                    ON cv.case_id = sc.case_id
+            WHERE rs.run_id = %s
+                AND s.status = %s
+                AND cv.status = %s
+                AND cv.deleted_on IS NULL
+                AND cv.productversion_id = %s
+                AND EXISTS (
+                    SELECT 1
+                    FROM library_caseversion_environments cve
+                        INNER JOIN execution_run_environments re
+                            ON re.environment_id = cve.environment_id
+                        INNER JOIN environments_environment e
+                            ON e.id = cve.environment_id
+                    WHERE cve.caseversion_id = cv.id
+                        AND re.run_id = %s
+                        AND e.deleted_on IS NULL
+                    )
+            """
+        if ordered:
+            sql += "ORDER BY rs.{0}, sc.{0}, cv.id".format(qn("order"))
+        params = [
+            self.id,
+            Suite.STATUS.active,
+            CaseVersion.STATUS.active,
+            self.productversion_id,
+            self.id,
+            ]
+        return sql, params
+
 
-        Approach:
-          do another raw sql query to get all existing_rcv_envs for this run
-          existing_rcv_envs - needed_rcv_envs = list to delete (no longer needed)
-          needed_rcv_envs - existing_rcv_envs = list to create
-        build a list of RunCaseVersion_environment objects
-        and use bulk_create.
+    def _delete_runcaseversions(self):
+        """
+        Hook to delete runcaseversions we know we don't need anymore.
+
+        Runcaseversions whose caseversion is no longer selected for the run are
+        permanently deleted, along with their results and environments; if
+        any results went with them the run's result summaries are rebuilt.
+
+        """
+        source_sql, source_params = self._runcaseversion_source_sql()
+        stale_sql = """SELECT id FROM execution_runcaseversion
+            WHERE run_id = %s
+                AND deleted_on IS NULL
+                AND caseversion_id NOT IN ({0})
+            """.format(source_sql)
+        if _delete_runcaseversions_where(stale_sql, [self.id] + source_params):
+            RunEnvironmentSummary.rebuild([self.id])
+
+
+    def _delete_duplicate_runcaseversions(self):
+        """
+        Soft-delete all but one runcaseversion for any duplicated caseversion.
 
+        Of the duplicates, we keep the one with the latest result.
+
+        """
+        cursor = connection.cursor()
+        cursor.execute(
+            """SELECT rcv.id, rcv.caseversion_id, MAX(r.id)
+            FROM execution_runcaseversion rcv
+                LEFT OUTER JOIN execution_result r
+                    ON r.runcaseversion_id = rcv.id
+            WHERE rcv.run_id = %s
+                AND rcv.deleted_on IS NULL
+                AND rcv.caseversion_id IN (
+                    SELECT dup.caseversion_id
+                    FROM execution_runcaseversion dup
+                    WHERE dup.run_id = %s AND dup.deleted_on IS NULL
+                    GROUP BY dup.caseversion_id
+                    HAVING COUNT(*) > 1
+                    )
+            GROUP BY rcv.id, rcv.caseversion_id
+            """,
+            [self.id, self.id],
+            )
+        by_cv = {}
+        for rcv_id, cv_id, latest_result in cursor.fetchall():
+            by_cv.setdefault(cv_id, []).append((latest_result or 0, rcv_id))
+        to_delete = []
+        for candidates in by_cv.values():
+            candidates.sort(reverse=True)
+            to_delete.extend(rcv_id for (latest, rcv_id) in candidates[1:])
+        if to_delete:
+            self.runcaseversions.filter(pk__in=to_delete).delete()
+
+
+    def _bulk_update_runcaseversion_order(self, orders):
         """
+        Set new order on existing runcaseversions.
+
+        ``orders`` maps runcaseversion id to its new order; rows are updated
+        with a single CASE statement per batch.
 
-        # re-query all the rcvs (including newly created) for this run
-        final_rcvs = RunCaseVersion.objects.filter(run=self).select_related(
-            "caseversion").prefetch_related("caseversion__environments")
+        """
+        rcv_ids = sorted(orders)
+        now = utcnow()
+        for i in range(0, len(rcv_ids), BULK_UPDATE_BATCH_SIZE):
+            batch = rcv_ids[i:i + BULK_UPDATE_BATCH_SIZE]
+            whens = " ".join(
+                "WHEN {0:d} THEN {1:d}".format(rcv_id, orders[rcv_id])
+                for rcv_id in batch
+                )
+            _execute(
+                """UPDATE execution_runcaseversion
+                SET {0} = CASE id {1} END,
+                    modified_on = %s,
+                    modified_by_id = NULL,
+                    cc_version = cc_version + 1
+                WHERE id IN ({2})
+                """.format(
+                    qn("order"), whens, ",".join(map(str, batch))),
+                [now],
+                )
 
-        final_rcv_ids = [x.id for x in final_rcvs]
 
-        # runcaseversion_environments that were there prior to our changes
-        prev_rcv_envs_set = set(RunCaseVersion.environments.through.objects.filter(
-            runcaseversion_id__in=final_rcv_ids).values_list(
-                "runcaseversion_id", "environment_id"))
+    def _bulk_insert_new_runcaseversions(self, rcv_proxies):
+        """Hook to bulk-insert runcaseversions we know we DO need."""
+        self.runcaseversions.bulk_create(rcv_proxies)
 
-        # runcaseversion_environment objects we will use to bulk create
-        # loop through all cvs and fetch the env intersection with this run
-        needed_rcv_envs_tuples = []
-        run_env_ids = set(
-            self.environments.values_list("id", flat=True))
-        for rcv in final_rcvs:
-            case_env_ids = set([x.id for x in rcv.caseversion.environments.all()])
-            for env in run_env_ids.intersection(case_env_ids):
-                needed_rcv_envs_tuples.append((rcv.id, env))
-        needed_rcv_envs_set = set(needed_rcv_envs_tuples)
 
-        # get the set of rcv_envs we need to delete because they don't belong
-        # to the needed set.
-        delete_rcv_envs = prev_rcv_envs_set - needed_rcv_envs_set
-        if len(delete_rcv_envs):
-            delquery = Q()
-            for combo in delete_rcv_envs:
-                delquery = delquery | Q(
-                    **{"runcaseversion_id": combo[0],
-                       "environment_id": combo[1]})
-            RunCaseVersion.environments.through.objects.filter(delquery).delete()
+    def _bulk_update_runcaseversion_environments_for_lock(self):
+        """
+        update runcaseversion_environment records with latest state.
 
-        # get the set of rcv_envs we need to create that don't already exist
-        needed_rcv_envs_set = needed_rcv_envs_set - prev_rcv_envs_set
+        Each runcaseversion should have the intersection of the run's and its
+        caseversion's environments. Rows outside that intersection are
+        deleted, and missing rows are inserted, each with a single statement.
 
-        # build all the objects to pass to bulk_create
-        needed_rcv_envs = [RunCaseVersion.environments.through(
-            runcaseversion_id=needed[0],
-            environment_id=needed[1]) for needed in needed_rcv_envs_set]
+        """
+        needed_sql = """SELECT 1
+            FROM execution_runcaseversion rcv
+                INNER JOIN library_caseversion_environments cve
+                    ON cve.caseversion_id = rcv.caseversion_id
+                INNER JOIN execution_run_environments re
+                    ON re.run_id = rcv.run_id
+                    AND re.environment_id = cve.environment_id
+                INNER JOIN environments_environment e
+                    ON e.id = cve.environment_id
+            WHERE e.deleted_on IS NULL
+            """
+
+        _execute(
+            """DELETE FROM execution_runcaseversion_environments
+            WHERE runcaseversion_id IN (
+                    SELECT id FROM execution_runcaseversion
+                    WHERE run_id = %s AND deleted_on IS NULL
+                    )
+                AND NOT EXISTS ({0}
+                    AND rcv.id =
+                        execution_runcaseversion_environments.runcaseversion_id
+                    AND cve.environment_id =
+                        execution_runcaseversion_environments.environment_id
+                    )
+            """.format(needed_sql),
+            [self.id],
+            )
 
-        RunCaseVersion.environments.through.objects.bulk_create(needed_rcv_envs)
+        _execute(
+            """INSERT INTO execution_runcaseversion_environments
+                (runcaseversion_id, environment_id)
+            SELECT rcv.id, cve.environment_id
+            FROM execution_runcaseversion rcv
+                INNER JOIN library_caseversion_environments cve
+                    ON cve.caseversion_id = rcv.caseversion_id
+                INNER JOIN execution_run_environments re
+                    ON re.run_id = rcv.run_id
+                    AND re.environment_id = cve.environment_id
+                INNER JOIN environments_environment e
+                    ON e.id = cve.environment_id
+            WHERE rcv.run_id = %s
+                AND rcv.deleted_on IS NULL
+                AND e.deleted_on IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM execution_runcaseversion_environments x
+                    WHERE x.runcaseversion_id = rcv.id
+                        AND x.environment_id = cve.environment_id
+                    )
+            """,
+            [self.id],
+            )
 
 
     def _lock_caseversions_complete(self):
@@ -308,7 +555,48 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
 
     def result_summary(self):
         """Return a dict summarizing status of results."""
-        return result_summary(Result.objects.filter(runcaseversion__run=self))
+        if hasattr(self, "_result_summary"):
+            return self._result_summary
+        counts = self.result_counts()
+        return dict((s, counts[s]) for s in Result.COMPLETED_STATES)
+
+
+    @classmethod
+    def prefetch_result_summaries(cls, runs):
+        """
+        Fetch result summaries of all given runs in one query.
+
+        Return list of the runs, with summaries cached for ``result_summary``.
+
+        """
+        runs = list(runs)
+        sums = dict(
+            ("sum_" + s, models.Sum(s)) for s in Result.COMPLETED_STATES)
+        rows = RunEnvironmentSummary.objects.filter(
+            run__in=[r.id for r in runs]).values("run").annotate(
+            **sums).order_by()
+        by_run = dict((row["run"], row) for row in rows)
+        for run in runs:
+            row = by_run.get(run.id, {})
+            run._result_summary = dict(
+                (s, row.get("sum_" + s) or 0) for s in Result.COMPLETED_STATES)
+        return runs
+
+
+    def result_counts(self, environment=None):
+        """
+        Return dict of latest-result counts, optionally for one environment.
+
+        Keys are result statuses, plus "completed": the number of case/env
+        combos with a completed result. Read from ``RunEnvironmentSummary``.
+
+        """
+        summaries = self.environment_summaries.all()
+        if environment is not None:
+            summaries = summaries.filter(environment=environment)
+        counts = summaries.aggregate(
+            **dict((c, models.Sum(c)) for c in RunEnvironmentSummary.COUNTERS))
+        return dict((c, n or 0) for c, n in counts.items())
 
 
     def completion(self):
@@ -322,18 +610,10 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
             runcaseversion__run=self,
             runcaseversion__deleted_on=None,
             ).count()
-        skipped = Result.objects.filter(
-            runcaseversion__run=self,
-            is_latest=True,
-            status=Result.STATUS.skipped).count()
-        completed = Result.objects.filter(
-            status__in=Result.COMPLETED_STATES,
-            is_latest=True,
-            runcaseversion__run=self).values(
-            "runcaseversion", "environment").distinct().count()
+        counts = self.result_counts()
 
         try:
-            return float(completed) / (total - skipped)
+            return float(counts["completed"]) / (total - counts["skipped"])
         except ZeroDivisionError:
             return 0
 
@@ -343,20 +623,10 @@ class Run(MTModel, TeamModel, DraftStatusModel, HasEnvironmentsModel):
         total = RunCaseVersion.objects.filter(
             environments=env_id,
             run=self).count()
-        skipped = Result.objects.filter(
-            runcaseversion__run=self,
-            environment=env_id,
-            is_latest=True,
-            status=Result.STATUS.skipped).count()
-        completed = Result.objects.filter(
-            status__in=Result.COMPLETED_STATES,
-            is_latest=True,
-            environment=env_id,
-            runcaseversion__run=self).values(
-            "runcaseversion", "environment").distinct().count()
+        counts = self.result_counts(environment=env_id)
 
         try:
-            return float(completed) / (total - skipped)
+            return float(counts["completed"]) / (total - counts["skipped"])
         except ZeroDivisionError:
             return 0.0
 
@@ -428,9 +698,30 @@ class RunCaseVersion(HasEnvironmentsModel, MTModel):
 
     def result_summary(self):
         """Return a dict summarizing status of results."""
+        if hasattr(self, "_result_summary"):
+            return self._result_summary
         return result_summary(self.results.all())
 
 
+    @classmethod
+    def prefetch_result_summaries(cls, runcaseversions):
+        """
+        Fetch result summaries of all given runcaseversions in one query.
+
+        Return list of the runcaseversions, with summaries cached for
+        ``result_summary``.
+
+        """
+        rcvs = list(runcaseversions)
+        summaries = result_summaries(
+            Result.objects.filter(runcaseversion__in=[r.id for r in rcvs]),
+            "runcaseversion",
+            )
+        for rcv in rcvs:
+            rcv._result_summary = summaries.get(rcv.id, _empty_summary())
+        return rcvs
+
+
     def completion(self):
         """Return fraction of environments that have a completed result."""
         total = self.environments.count()
@@ -595,6 +886,140 @@ class RunSuite(MTModel):
 
 
 
+class RunJob(MTModel):
+    """
+    A queued activation or refresh of a Run, processed out of band.
+
+    Jobs are created by ``Run.queue_activation`` and ``Run.queue_refresh`` and
+    processed by the ``process_run_jobs`` management command. ``total`` is the
+    number of caseversions to lock and ``locked`` the number locked so far.
+
+    """
+    ACTION = Choices("activate", "refresh")
+    STATUS = Choices("queued", "running", "done", "failed")
+
+    # seconds the locked count of a running job is kept in the cache
+    PROGRESS_CACHE_TIMEOUT = 60 * 60
+
+    run = models.ForeignKey(Run, related_name="jobs")
+    action = models.CharField(max_length=30, choices=ACTION)
+    status = models.CharField(
+        max_length=30, db_index=True, choices=STATUS, default=STATUS.queued)
+    total = models.IntegerField(default=0)
+    locked = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    started_on = models.DateTimeField(blank=True, null=True)
+    finished_on = models.DateTimeField(blank=True, null=True)
+
+
+    def __unicode__(self):
+        """Return unicode representation."""
+        return "%s of run '%s' (%s)" % (self.action, self.run, self.status)
+
+
+    class Meta:
+        ordering = ["created_on", "id"]
+
+
+    @classmethod
+    def claim_next(cls):
+        """
+        Claim and return the oldest queued job, or None if there are none.
+
+        Claiming is a conditional update, so concurrent workers never process
+        the same job.
+
+        """
+        queued = cls.objects.filter(status=cls.STATUS.queued)
+        for job_id in queued.values_list("id", flat=True)[:10]:
+            claimed = cls.objects.filter(
+                pk=job_id, status=cls.STATUS.queued).update(
+                status=cls.STATUS.running, started_on=utcnow(), notrack=True)
+            if claimed:
+                return cls.objects.get(pk=job_id)
+        return None
+
+
+    def process(self):
+        """
+        Run this (claimed) job, recording progress and outcome.
+
+        Caseversions are locked in batches, in a single transaction; after
+        each batch the number locked so far is recorded in the cache (see
+        ``progress``), so it can be followed while the job runs without
+        committing a partial lock.
+
+        If activation fails, the run is returned to draft and the error is
+        recorded on the job before re-raising.
+
+        """
+        run = self.run
+        self.total = run.count_caseversions_to_lock()
+        self.save(force_update=True, notrack=True)
+        try:
+            if self.action == self.ACTION.activate:
+                # the run may have been reset to draft or disabled meanwhile
+                if run.status == Run.STATUS.activating:
+                    run.activate(
+                        user=self.created_by, progress=self._record_progress)
+            else:
+                run.refresh(
+                    user=self.created_by, progress=self._record_progress)
+        except Exception as e:
+            self.status = self.STATUS.failed
+            self.error = unicode(e)
+            if run.status == Run.STATUS.activating:
+                Run.objects.filter(pk=run.pk).update(
+                    status=Run.STATUS.draft, notrack=True)
+            raise
+        else:
+            self.status = self.STATUS.done
+            self.locked = run.runcaseversions.count()
+        finally:
+            self.finished_on = utcnow()
+            self.save(force_update=True, notrack=True)
+            cache.delete(self.progress_cache_key(self.id))
+
+
+    def _record_progress(self, locked):
+        """Record the number ``locked`` so far in the cache."""
+        cache.set(
+            self.progress_cache_key(self.id),
+            locked,
+            self.PROGRESS_CACHE_TIMEOUT,
+            )
+
+
+    @staticmethod
+    def progress_cache_key(job_id):
+        """Return cache key for the locked count of given running job id."""
+        return "moztrap:runjob:locked:{0}".format(job_id)
+
+
+    def progress(self):
+        """
+        Return a dict describing the state and progress of this job.
+
+        While the job is running, its locked count is read from the cache,
+        where the worker records it; that requires a cache backend shared by
+        the worker and web processes (not the default local-memory one).
+        Otherwise it's zero until the job is done.
+
+        """
+        locked = self.locked
+        if self.status == self.STATUS.running:
+            locked = cache.get(self.progress_cache_key(self.id), locked)
+        return {
+            "id": self.id,
+            "action": self.action,
+            "status": self.status,
+            "total": self.total,
+            "locked": locked,
+            "error": self.error,
+            }
+
+
+
 class Result(MTModel):
     """A result of a User running a RunCaseVersion in an Environment."""
     STATUS = Choices("assigned", "started", "passed", "failed", "invalidated",
@@ -642,8 +1067,26 @@ class Result(MTModel):
 
     def save(self, *args, **kwargs):
         if self.pk is None:
+            # results saved concurrently for this run and env must adjust the
+            # counters one at a time, each from the latest results as the
+            # other left them; so lock the summary first, and read those with
+            # a locking read (which sees the latest committed rows).
+            RunEnvironmentSummary.lock(
+                self.runcaseversion.run_id, self.environment_id)
+            # latest results of all testers for this case/env, before this one
+            # supersedes the current tester's; needed to keep counts in sync.
+            previous = list(
+                Result.objects.select_for_update().filter(
+                    runcaseversion=self.runcaseversion_id,
+                    environment=self.environment_id,
+                    is_latest=True,
+                    ).values_list("tester_id", "status")
+                )
             self.set_latest()
-        super(Result, self).save(*args, **kwargs)
+            super(Result, self).save(*args, **kwargs)
+            RunEnvironmentSummary.record(self, previous)
+        else:
+            super(Result, self).save(*args, **kwargs)
 
 
     def set_latest(self):
@@ -680,24 +1123,196 @@ class StepResult(MTModel):
 
 
 
+class RunEnvironmentSummary(MTModel):
+    """
+    Denormalized counts of the latest results of a run in one environment.
+
+    Has one counter per result status, plus ``completed``: the number of
+    runcaseversions with at least one latest result in a completed state.
+    Counters are adjusted as results are saved, so run completion and result
+    summaries don't have to scan the results table; ``rebuild`` recomputes
+    them after bulk changes that bypass ``Result.save``.
+
+    """
+    STATUSES = [status for status, label in Result.STATUS]
+    COUNTERS = STATUSES + ["completed"]
+
+    run = models.ForeignKey(Run, related_name="environment_summaries")
+    environment = models.ForeignKey(Environment, related_name="+")
+    assigned = models.IntegerField(default=0)
+    started = models.IntegerField(default=0)
+    passed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    invalidated = models.IntegerField(default=0)
+    blocked = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+
+
+    def __unicode__(self):
+        """Return unicode representation."""
+        return "Results of %s in %s" % (self.run, self.environment)
+
+
+    class Meta:
+        unique_together = [("run", "environment")]
+
+
+    @classmethod
+    def lock(cls, run_id, environment_id):
+        """
+        Lock the summary of given run and environment, creating it if needed.
+
+        The row stays locked until the current transaction ends (with
+        databases that support ``SELECT ... FOR UPDATE``).
+
+        """
+        cls.objects.select_for_update().get_or_create(
+            run_id=run_id, environment_id=environment_id)
+
+
+    @classmethod
+    def record(cls, result, previous):
+        """
+        Adjust counters for newly-saved latest ``result``.
+
+        ``previous`` is a list of (tester_id, status) for the latest results
+        on the same runcaseversion and environment before ``result`` was
+        saved; those of the same tester are no longer latest.
+
+        """
+        completed = Result.COMPLETED_STATES
+        deltas = dict((c, 0) for c in cls.COUNTERS)
+        for tester_id, status in previous:
+            if tester_id == result.tester_id:
+                deltas[status] -= 1
+        deltas[result.status] += 1
+        was_completed = any(status in completed for t, status in previous)
+        is_completed = result.status in completed or any(
+            status in completed
+            for tester_id, status in previous
+            if tester_id != result.tester_id
+            )
+        deltas["completed"] = int(is_completed) - int(was_completed)
+
+        changes = dict((c, d) for c, d in deltas.items() if d)
+        if not changes:
+            return
+        run_id = result.runcaseversion.run_id
+        summaries = cls.objects.filter(
+            run=run_id, environment=result.environment_id)
+        updates = dict((c, models.F(c) + d) for c, d in changes.items())
+        if not summaries.update(notrack=True, **updates):
+            summary, created = cls.objects.get_or_create(
+                run_id=run_id,
+                environment_id=result.environment_id,
+                defaults=changes,
+                )
+            if not created:
+                summaries.update(notrack=True, **updates)
+
+
+    @classmethod
+    def rebuild(cls, run_ids):
+        """
+        Recompute the summaries of the runs with given ids from their results.
+
+        """
+        run_ids = list(run_ids)
+        if not run_ids:
+            return
+        table = cls._meta.db_table
+        in_runs = ",".join(["%s"] * len(run_ids))
+        _execute(
+            "DELETE FROM {0} WHERE run_id IN ({1})".format(table, in_runs),
+            run_ids,
+            )
+
+        statuses = cls.STATUSES
+        completed = Result.COMPLETED_STATES
+        now = utcnow()
+        _execute(
+            """INSERT INTO {0}
+                (run_id, environment_id, {1}, completed,
+                 created_on, modified_on, cc_version)
+            SELECT rcv.run_id, r.environment_id, {2},
+                COUNT(DISTINCT CASE WHEN r.status IN ({3})
+                    THEN r.runcaseversion_id END),
+                %s, %s, 0
+            FROM execution_result r
+                INNER JOIN execution_runcaseversion rcv
+                    ON rcv.id = r.runcaseversion_id
+            WHERE r.is_latest = %s
+                AND r.deleted_on IS NULL
+                AND rcv.run_id IN ({4})
+            GROUP BY rcv.run_id, r.environment_id
+            """.format(
+                table,
+                ", ".join(qn(status) for status in statuses),
+                ", ".join(
+                    ["SUM(CASE WHEN r.status = %s THEN 1 ELSE 0 END)"]
+                    * len(statuses)
+                    ),
+                ",".join(["%s"] * len(completed)),
+                in_runs,
+                ),
+            statuses + completed + [now, now, True] + run_ids,
+            )
+
+
+
+def _rebuild_summaries_for_results(sender, queryset, **kwargs):
+    """Rebuild run summaries after results are soft-deleted or undeleted."""
+    RunEnvironmentSummary.rebuild(
+        set(
+            RunCaseVersion.everything.filter(
+                pk__in=queryset.values("runcaseversion")).values_list(
+                "run_id", flat=True)
+            )
+        )
+
+
+post_soft_delete.connect(_rebuild_summaries_for_results, sender=Result)
+post_undelete.connect(_rebuild_summaries_for_results, sender=Result)
+
+
+
 def result_summary(results):
     """
     Given a queryset of results, return a dict summarizing their states.
 
+    Counts of latest results are computed with a single grouped query.
+
     """
-    states = Result.COMPLETED_STATES
+    return result_summaries(results, None).get(None, _empty_summary())
 
-    result_ids = results.filter(is_latest=True).values_list("id", flat=True)
 
-    if not result_ids:
-        return dict((s, 0) for s in states)
 
-    cols = ["COUNT(CASE WHEN status=%s THEN 1 ELSE NULL END)"] * len(states)
-    sql = "SELECT {0} FROM {1} WHERE id IN ({2})".format(
-        ",".join(cols), Result._meta.db_table, ",".join(map(str, result_ids))
-        )
+def result_summaries(results, by):
+    """
+    Summarize states of a queryset of results, grouped by a field.
+
+    Return a dict mapping each value of the ``by`` field (e.g.
+    "runcaseversion") to a summary dict, as returned by ``result_summary``;
+    values with no latest results are omitted. Uses a single grouped query.
+    If ``by`` is None all results are summarized under the key None.
+
+    """
+    fields = ["status"] if by is None else [by, "status"]
+    counts = results.filter(
+        is_latest=True,
+        status__in=Result.COMPLETED_STATES,
+        ).values(*fields).annotate(count=models.Count("id")).order_by()
+
+    summaries = {}
+    for row in counts:
+        key = None if by is None else row[by]
+        summary = summaries.setdefault(key, _empty_summary())
+        summary[row["status"]] = row["count"]
+    return summaries
+
 
-    cursor = connection.cursor()
-    cursor.execute(sql, states)
 
-    return dict(zip(states, cursor.fetchone()))
+def _empty_summary():
+    """Return a result summary dict with all counts zero."""
+    return dict((s, 0) for s in Result.COMPLETED_STATES)
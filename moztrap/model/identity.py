@@ -0,0 +1,205 @@
+"""
+Request-scoped identity map of model instances.
+
+While a map is active (for the duration of a request, see
+``moztrap.view.utils.middleware.IdentityMapMiddleware``), instances looked up
+by pk through this module are fetched at most once and shared, as are values
+memoized on them. With no active map, lookups go straight to the database.
+
+"""
+from contextlib import contextmanager
+from collections import defaultdict
+import threading
+
+
+
+_state = threading.local()
+
+
+
+class IdentityMap(object):
+    """Instances by (model, pk), with memoized values and hit/miss counts."""
+    def __init__(self):
+        self.instances = {}
+        self.memos = {}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+
+    def get(self, model, pk):
+        """
+        Return non-deleted instance of ``model`` with given ``pk``.
+
+        Raises ``model.DoesNotExist`` if there is no such instance.
+
+        """
+        found = self.get_many(model, [pk])
+        if pk is None or int(pk) not in found:
+            raise model.DoesNotExist(
+                "{0} matching query does not exist.".format(
+                    model._meta.object_name)
+                )
+        return found[int(pk)]
+
+
+    def get_many(self, model, pks):
+        """
+        Return dict of non-deleted ``model`` instances by pk, for given pks.
+
+        Instances not yet in the map are fetched in a single query; pks with
+        no matching instance are left out.
+
+        """
+        label = _label(model)
+        found = {}
+        missing = set()
+        for pk in pks:
+            if pk is None:
+                continue
+            pk = int(pk)
+            obj = self.instances.get((model, pk))
+            if obj is None:
+                missing.add(pk)
+            else:
+                self.hits[label] += 1
+                if getattr(obj, "deleted_on", None) is None:
+                    found[pk] = obj
+        if missing:
+            self.misses[label] += len(missing)
+            for obj in model.objects.filter(pk__in=missing):
+                self.instances[(model, obj.pk)] = obj
+                found[obj.pk] = obj
+        return found
+
+
+    def related(self, obj, name):
+        """Return the object ``obj`` points to via foreign key ``name``."""
+        field = obj._meta.get_field(name)
+        pk = getattr(obj, field.attname)
+        if pk is None:
+            return None
+        model = field.rel.to
+        target = self.instances.get((model, pk))
+        if target is None:
+            self.misses[_label(model)] += 1
+            target = self.instances[(model, pk)] = getattr(obj, name)
+        else:
+            self.hits[_label(model)] += 1
+        setattr(obj, field.get_cache_name(), target)
+        return target
+
+
+    def add(self, obj):
+        """Add ``obj`` to the map, unless present; return the mapped one."""
+        return self.instances.setdefault((obj.__class__, obj.pk), obj)
+
+
+    def memoize(self, obj, name, func):
+        """Return value ``name`` of ``obj``, calling ``func()`` only once."""
+        key = (obj.__class__, obj.pk, name)
+        label = _label(obj.__class__)
+        if key in self.memos:
+            self.hits[label] += 1
+        else:
+            self.misses[label] += 1
+            self.memos[key] = func()
+        return self.memos[key]
+
+
+    def forget(self, model, pks):
+        """Drop values memoized on ``model`` instances with given ``pks``."""
+        pks = set(pks)
+        for key in list(self.memos):
+            if key[0] is model and key[1] in pks:
+                del self.memos[key]
+
+
+    def stats(self):
+        """Return dict mapping model label to (hits, misses)."""
+        return dict(
+            (label, (self.hits[label], self.misses[label]))
+            for label in set(self.hits) | set(self.misses)
+            )
+
+
+
+def _label(model):
+    """Return app-label.model-name of ``model``."""
+    return "{0}.{1}".format(
+        model._meta.app_label, model._meta.object_name)
+
+
+
+def activate():
+    """Start a new identity map for this thread, and return it."""
+    _state.map = IdentityMap()
+    return _state.map
+
+
+
+def deactivate():
+    """End this thread's identity map, and return it (or None)."""
+    return _state.__dict__.pop("map", None)
+
+
+
+def current():
+    """Return this thread's active identity map, or None."""
+    return getattr(_state, "map", None)
+
+
+
+@contextmanager
+def active():
+    """Context manager activating an identity map for its block."""
+    previous = deactivate()
+    try:
+        yield activate()
+    finally:
+        deactivate()
+        if previous is not None:
+            _state.map = previous
+
+
+
+def get(model, pk):
+    """Return non-deleted ``model`` instance with ``pk``, via active map."""
+    identity_map = current()
+    if identity_map is None:
+        return model.objects.get(pk=pk)
+    return identity_map.get(model, pk)
+
+
+
+def related(obj, name):
+    """Return the object ``obj`` points to via foreign key ``name``."""
+    identity_map = current()
+    if identity_map is None:
+        return getattr(obj, name)
+    return identity_map.related(obj, name)
+
+
+
+def add(obj):
+    """Add ``obj`` to the active map, unless present; return the mapped one."""
+    identity_map = current()
+    if identity_map is None:
+        return obj
+    return identity_map.add(obj)
+
+
+
+def memoize(obj, name, func):
+    """Return ``func()``, memoized as value ``name`` of ``obj`` if active."""
+    identity_map = current()
+    if identity_map is None:
+        return func()
+    return identity_map.memoize(obj, name, func)
+
+
+
+def forget(model, pks):
+    """Drop values memoized on ``model`` instances with given ``pks``."""
+    identity_map = current()
+    if identity_map is not None:
+        identity_map.forget(model, pks)
@@ -6,6 +6,7 @@ from ..core.api import (ProductVersionResource, ProductResource,
                         UserResource)
 from .models import CaseVersion, Case, Suite, CaseStep, SuiteCase
 from ...model.core.models import ProductVersion
+from .. import identity
 from ..mtapi import MTResource, MTAuthorization
 from ..environments.api import EnvironmentResource
 from ..tags.api import TagResource
@@ -255,15 +256,15 @@ class CaseVersionResource(MTResource):
         # create
         if bundle.request.META['REQUEST_METHOD'] == 'POST':
             pv_id = self._id_from_uri(bundle.data['productversion'])
-            pv = ProductVersion.objects.get(id=pv_id)
+            pv = identity.get(ProductVersion, pv_id)
             case_id = self._id_from_uri(bundle.data['case'])
             case = Case.objects.get(id=case_id)
-            if not case.product.id == pv.product.id:
+            if not case.product_id == pv.product_id:
                 message = str("productversion must match case's product")
                 logger.error("\n".join([message,
                     "productversion product id: %s case product id: %s"], ),
-                    pv.product.id,
-                    case.product.id)
+                    pv.product_id,
+                    case.product_id)
                 raise ImmediateHttpResponse(
                     response=http.HttpBadRequest(message))
 
@@ -31,10 +31,20 @@ class BulkParser(object):
     """
     def parse(self, text):
         """Parse given text and return list of data dictionaries."""
+        return list(self.iter_parse(text.splitlines()))
+
+
+    def iter_parse(self, lines):
+        """
+        Parse given lines, yielding each data dictionary once it's complete.
+
+        Yields the same data dictionaries that ``parse`` returns, without
+        holding more than one in memory; nothing is yielded after an error.
+
+        """
         data = []
         state = self.begin
 
-        lines = text.splitlines()
         error = False
 
         for line in lines:
@@ -47,6 +57,9 @@ class BulkParser(object):
                     data[-1]["error"] = str(e)
                     error = True
                     break
+                # states only add to the last item; the others are complete
+                while len(data) > 1:
+                    yield self._finish(data.pop(0))
 
         if not error and not state.expect_end:
             if not data:
@@ -57,14 +70,18 @@ class BulkParser(object):
                 )
 
         for item in data:
-            if "description" in item:
-                item["description"] = "\n".join(item["description"])
-            for step in item.get("steps", []):
-                step["instruction"] = "\n".join(step["instruction"])
-                if "expected" in step:
-                    step["expected"] = "\n".join(step["expected"])
-
-        return data
+            yield self._finish(item)
+
+
+    def _finish(self, item):
+        """Join the lines of a parsed data dictionary; return it."""
+        if "description" in item:
+            item["description"] = "\n".join(item["description"])
+        for step in item.get("steps", []):
+            step["instruction"] = "\n".join(step["instruction"])
+            if "expected" in step:
+                step["expected"] = "\n".join(step["expected"])
+        return item
 
 
     def begin(self, lc, orig, data):
@@ -1,12 +1,23 @@
 """Importer for suites and cases from a dictionary."""
 
 import json
+import multiprocessing
 
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Q
 
 from ..core.auth import User
+from ..core.models import ProductVersion
+from ..mtmodel import bulk_create_with_pks, bulk_insert, utcnow
 from ..tags.models import Tag
-from .models import Case, CaseVersion, CaseStep, Suite, SuiteCase
+from .models import (
+    Case, CaseVersion, CaseStep, Suite, SuiteCase, SearchTerm)
+from .readers import READERS
+
+
+
+# number of cases imported at a time by ``Importer.import_stream``
+STREAM_BATCH_SIZE = 1000
 
 
 
@@ -53,10 +64,16 @@ class Importer(object):
     * suites: the number of suites imported
     * warnings: list of warnings about the imported items, if any.
 
+    Pass ``bulk=True`` to ``import_data`` to import large data sets with a
+    fixed number of queries (see ``BulkCaseImporter``). Files too large to
+    load at once can be imported a batch of cases at a time with
+    ``import_stream``.
+
     """
 
     @transaction.commit_on_success
-    def import_data(self, productversion, case_data, force_dupes=False):
+    def import_data(self, productversion, case_data, force_dupes=False,
+                    bulk=False):
         """
         Import the top-level dictionary of cases and suites.
 
@@ -69,23 +86,33 @@ class Importer(object):
         * case_data -- a dictionary of cases and/or suites to be imported
         * force_dupes -- if True, will import cases with duplicate names.  If
           False, they will be skipped.
+        * bulk -- if True, use the bulk importers, which load existing data
+          up front and insert new rows in batches.
 
         """
 
         # the result object used to keep track of import status
         result = ImportResult()
 
+        if bulk:
+            case_importer_class = BulkCaseImporter
+            suite_importer_class = BulkSuiteImporter
+        else:
+            case_importer_class = CaseImporter
+            suite_importer_class = SuiteImporter
+
         # importer for suites.
         suite_importer = None
         if "suites" in case_data:
-            suite_importer = SuiteImporter(productversion.product)
+            suite_importer = suite_importer_class(productversion.product)
             suite_importer.add_dicts(case_data["suites"])
 
 
         # no reason why the data couldn't include ONLY suites.  So function
         # gracefully if no cases.
         if "cases" in case_data:
-            case_importer = CaseImporter(productversion, suite_importer)
+            case_importer = case_importer_class(
+                productversion, suite_importer)
             result.append(case_importer.import_cases(
                 case_data["cases"],
                 force_dupes=force_dupes))
@@ -97,6 +124,62 @@ class Importer(object):
         return result
 
 
+    @transaction.commit_on_success
+    def import_stream(self, productversion, fh, force_dupes=False,
+                      batch_size=STREAM_BATCH_SIZE, progress=None,
+                      reserved_names=(), format="json"):
+        """
+        Import cases and suites from file-like ``fh``.
+
+        The data is read incrementally in the given format (see
+        ``moztrap.model.library.readers``; JSON is structured as for
+        ``import_data``), and imported (with the bulk importers) a batch of
+        cases at a time, so the whole of it is never held in memory.
+
+        Keyword arguments:
+
+        * productversion, force_dupes -- as for ``import_data``
+        * fh -- a file-like object to read data from
+        * batch_size -- the number of cases to import at a time
+        * progress -- if given, called with the number of cases read so far
+          after each batch is imported
+        * reserved_names -- names of cases to skip as if they already existed
+          (unless force_dupes is True)
+        * format -- "json", "csv" or "text"
+
+        Raises ``ValueError`` if the data can't be parsed, in which case
+        nothing is imported.
+
+        """
+        result = ImportResult()
+        suite_importer = BulkSuiteImporter(productversion.product)
+        case_importer = BulkCaseImporter(productversion, suite_importer)
+        case_importer.reserve(reserved_names)
+
+        batch = []
+        num_read = 0
+        for key, item in READERS[format](fh):
+            if key == "suites":
+                suite_importer.add_dicts([item])
+                continue
+            batch.append(item)
+            num_read += 1
+            if len(batch) >= batch_size:
+                result.append(case_importer.import_cases(batch, force_dupes))
+                suite_importer.import_suites()
+                batch = []
+                if progress is not None:
+                    progress(num_read)
+
+        if batch:
+            result.append(case_importer.import_cases(batch, force_dupes))
+            if progress is not None:
+                progress(num_read)
+        result.append(suite_importer.import_suites())
+
+        return result
+
+
 
 class CaseImporter(object):
     """Imports cases and links to or creates associated tags, suites."""
@@ -271,7 +354,7 @@ class CaseImporter(object):
 
         for step_num, new_step in enumerate(step_data):
             try:
-                casestep = CaseStep.objects.create(
+                casestep = CaseStep(
                     caseversion=caseversion,
                     number=step_num + 1,
                     instruction=new_step["instruction"],
@@ -279,6 +362,208 @@ class CaseImporter(object):
                     )
             except KeyError:
                 raise ValueError(ImportResult.SKIP_STEP_NO_INSTRUCTION)
+            casestep.save(skip_index=True)
+
+        SearchTerm.index([caseversion.pk])
+
+
+
+class BulkCaseImporter(CaseImporter):
+    """
+    Imports cases with queries per batch of cases, rather than per case.
+
+    Existing case names, users, tags and suites are loaded up front, cases are
+    validated in memory (giving the same warnings as ``CaseImporter``), and
+    the rows for all accepted cases are inserted in batches of at most
+    ``BATCH_SIZE`` rows (see ``mtmodel.bulk_insert``).
+
+    """
+    BATCH_SIZE = 500
+
+
+    def __init__(self, productversion, suite_importer=None):
+        """
+        Construct a BulkCaseImporter.
+
+        Takes the same arguments as ``CaseImporter``. If no suite importer is
+        given, this importer imports the suites of the cases itself.
+
+        """
+        super(BulkCaseImporter, self).__init__(
+            productversion,
+            suite_importer or BulkSuiteImporter(productversion.product),
+            )
+        self.imports_suites = suite_importer is None
+        self.tag_importer = BulkTagImporter(self.productversion.product)
+        # folded names of cases in the product version, once loaded
+        self.taken = None
+        self.reserved = set()
+
+
+    def reserve(self, names):
+        """Skip cases with given names as if they already existed."""
+        names = set(_fold(name) for name in names)
+        self.reserved.update(names)
+        if self.taken is not None:
+            self.taken.update(names)
+
+
+    def import_cases(self, case_dict_list, force_dupes=False):
+        """
+        Import the test cases in the data.
+
+        Data and warnings are as for ``CaseImporter.import_cases``.
+
+        """
+        case_dict_list = list(case_dict_list)
+        result = ImportResult()
+
+        self.user_cache.preload(
+            set(c["created_by"] for c in case_dict_list if "created_by" in c))
+        if not force_dupes and self.taken is None:
+            self.taken = self.reserved | set(
+                _fold(name) for name in CaseVersion.objects.filter(
+                    productversion=self.productversion).values_list(
+                    "name", flat=True)
+                )
+
+        accepted = []
+        for new_case in case_dict_list:
+            if not "name" in new_case:
+                result.warn(
+                    ImportResult.SKIP_CASE_NO_NAME,
+                    new_case,
+                    )
+                continue
+
+            if not force_dupes and _fold(new_case["name"]) in self.taken:
+                result.warn(
+                    ImportResult.SKIP_CASE_NAME_CONFLICT,
+                    new_case,
+                    )
+                continue
+
+            user = None
+            if "created_by" in new_case:
+                try:
+                    email = new_case["created_by"]
+                    user = self.user_cache.get_user(email)
+
+                except User.DoesNotExist:
+                    result.warn(
+                        ImportResult.WARN_USER_NOT_FOUND,
+                        email,
+                        )
+
+            caseversion = CaseVersion(
+                productversion=self.productversion,
+                name=new_case["name"],
+                description=new_case.get("description", ""),
+                created_by=user,
+                modified_by=user,
+                )
+
+            if "steps" in new_case:
+                if not all("instruction" in s for s in new_case["steps"]):
+                    result.warn(
+                        ImportResult.SKIP_STEP_NO_INSTRUCTION,
+                        new_case,
+                        )
+                    continue
+            else:
+                result.warn(
+                    ImportResult.WARN_NO_STEPS,
+                    caseversion,
+                    )
+
+            if self.taken is not None:
+                self.taken.add(_fold(new_case["name"]))
+            accepted.append((new_case, caseversion))
+            result.num_cases += 1
+
+        self.create_cases(accepted)
+
+        for new_case, caseversion in accepted:
+            if "tags" in new_case:
+                self.tag_importer.add_names(caseversion, new_case["tags"])
+            if "suites" in new_case:
+                self.suite_importer.add_names(
+                    caseversion.case, new_case["suites"])
+
+        self.tag_importer.import_tags()
+        if self.imports_suites:
+            result.append(self.suite_importer.import_suites())
+
+        return result
+
+
+    def create_cases(self, accepted):
+        """
+        Insert cases, caseversions and steps for ``accepted`` cases.
+
+        ``accepted`` is a list of (case data, unsaved caseversion) pairs; the
+        caseversions (and their new cases) get their ids set. New
+        caseversions get the product version's environments, are indexed for
+        search and marked as the latest versions of their cases.
+
+        """
+        if not accepted:
+            return
+        product = self.productversion.product
+        now = utcnow()
+
+        cases = [
+            Case(
+                product=product,
+                idprefix=new_case.get("idprefix", ""),
+                created_on=now,
+                modified_on=now,
+                )
+            for new_case, caseversion in accepted
+            ]
+        bulk_create_with_pks(cases, self.BATCH_SIZE)
+
+        caseversions = []
+        for case, (new_case, caseversion) in zip(cases, accepted):
+            caseversion.case = case
+            caseversion.created_on = caseversion.modified_on = now
+            caseversions.append(caseversion)
+        bulk_create_with_pks(caseversions, self.BATCH_SIZE)
+
+        bulk_insert(
+            [
+                CaseStep(
+                    caseversion=caseversion,
+                    number=step_num + 1,
+                    instruction=new_step["instruction"],
+                    expected=new_step.get("expected", ""),
+                    created_on=now,
+                    modified_on=now,
+                    )
+                for new_case, caseversion in accepted
+                for step_num, new_step in enumerate(new_case.get("steps", []))
+                ],
+            self.BATCH_SIZE,
+            )
+
+        CaseVersion._add_envs(
+            caseversions, self.productversion.environments.all())
+        SearchTerm.index([cv.pk for cv in caseversions])
+        CaseVersion._update_latest(caseversions)
+
+
+
+def _fold(name):
+    """
+    Return ``name`` as compared by the database.
+
+    MySQL compares with case-insensitive collations (and so finds existing
+    names case-insensitively); other databases compare exactly.
+
+    """
+    if connection.vendor == "mysql":
+        return name.lower()
+    return name
 
 
 
@@ -295,6 +580,30 @@ class UserCache(object):
         """Create a UserCache with an internal dictionary cache."""
 
         self.cache = {}
+        # emails preloaded without finding a user, not yet reported
+        self.missing = set()
+
+
+    def preload(self, emails):
+        """
+        Cache users for all given emails with one query.
+
+        Emails with no user are cached as not found, but still raise once
+        from ``get_user``, as if they hadn't been looked up yet.
+
+        """
+        emails = set(emails) - set(self.cache) - self.missing
+        if not emails:
+            return
+        found = dict(
+            (_fold(user.email), user)
+            for user in User.objects.filter(email__in=emails)
+            )
+        for email in emails:
+            if _fold(email) in found:
+                self.cache[email] = found[_fold(email)]
+            else:
+                self.missing.add(email)
 
 
     def get_user(self, email):
@@ -317,6 +626,12 @@ class UserCache(object):
         if email in self.cache:
             return self.cache[email]
 
+        elif email in self.missing:
+            self.missing.discard(email)
+            self.cache[email] = None
+            raise User.DoesNotExist(
+                "User matching query does not exist.")
+
         else:
             try:
                 user = User.objects.get(email=email)
@@ -400,6 +715,58 @@ class TagImporter(object):
 
 
 
+class BulkTagImporter(TagImporter):
+    """Imports tags with a fixed number of queries, however many there are."""
+
+    def import_tags(self):
+        """
+        Import all added tags, with the priorities of ``TagImporter``.
+
+        Existing tags are looked up with one query, and missing tags and the
+        tagging of caseversions are each inserted in batches.
+
+        """
+        if not self.map:
+            return
+
+        tags = {}
+        # product tags come last, and so take priority over global ones
+        for tag in Tag.objects.filter(
+                Q(product=None) | Q(product=self.product),
+                name__in=list(self.map),
+                ).order_by("product", "-id"):
+            tags[_fold(tag.name)] = tag
+
+        new_tags = {}
+        for tag_name in self.map:
+            if _fold(tag_name) not in tags:
+                new_tags.setdefault(
+                    _fold(tag_name),
+                    Tag(name=tag_name, product=self.product),
+                    )
+        if new_tags:
+            new_tags = new_tags.values()
+            bulk_create_with_pks(new_tags, BulkCaseImporter.BATCH_SIZE)
+            tags.update((_fold(tag.name), tag) for tag in new_tags)
+
+        Through = CaseVersion.tags.through
+        bulk_insert(
+            [
+                Through(caseversion_id=cv_id, tag_id=tag_id)
+                for cv_id, tag_id in set(
+                    (caseversion.pk, tags[_fold(tag_name)].pk)
+                    for tag_name, caseversions in self.map.items()
+                    for caseversion in caseversions
+                    )
+                ],
+            BulkCaseImporter.BATCH_SIZE,
+            )
+
+        # we have imported these items.  clear them out now.
+        self.map.clear()
+
+
+
 class SuiteImporter(object):
     """
     Imports suites based on lists and dicts of suites used to build it.
@@ -516,6 +883,78 @@ class SuiteImporter(object):
 
 
 
+class BulkSuiteImporter(SuiteImporter):
+    """Imports suites with a fixed number of queries, however many."""
+
+    def __init__(self, product):
+        """Construct a BulkSuiteImporter, as for ``SuiteImporter``."""
+        super(BulkSuiteImporter, self).__init__(product)
+        # suites created by this importer, by folded name
+        self.created = {}
+
+
+    def import_suites(self):
+        """
+        Import all mapped suites, as ``SuiteImporter.import_suites`` does.
+
+        Existing suites are looked up with one query, and missing suites and
+        the cases added to suites are each inserted in batches.
+
+        May be called more than once (as ``Importer.import_stream`` does); a
+        suite created without a description by an earlier call gets the
+        description of a suite dict added later.
+
+        """
+        if self.map:
+            suites = {}
+            for suite in Suite.objects.filter(
+                    product=self.product,
+                    name__in=list(self.map),
+                    ).order_by("-id"):
+                suites[_fold(suite.name)] = suite
+
+            for suite_name, suite_data in self.map.items():
+                suite = self.created.get(_fold(suite_name))
+                if (suite is not None and not suite.description and
+                        suite_data.get("description")):
+                    suite.description = suite_data["description"]
+                    Suite.objects.filter(pk=suite.pk).update(
+                        description=suite.description)
+
+            new_suites = {}
+            for suite_name, suite_data in self.map.items():
+                if _fold(suite_name) not in suites:
+                    new_suites.setdefault(
+                        _fold(suite_name),
+                        Suite(
+                            name=suite_name,
+                            product=self.product,
+                            description=suite_data.get("description", ""),
+                            ),
+                        )
+            if new_suites:
+                new_suites = new_suites.values()
+                bulk_create_with_pks(new_suites, BulkCaseImporter.BATCH_SIZE)
+                suites.update((_fold(s.name), s) for s in new_suites)
+                self.created.update((_fold(s.name), s) for s in new_suites)
+                self.result.num_suites += len(new_suites)
+
+            bulk_insert(
+                [
+                    SuiteCase(suite=suites[_fold(suite_name)], case=case)
+                    for suite_name, suite_data in self.map.items()
+                    for case in suite_data.get("cases", [])
+                    ],
+                BulkCaseImporter.BATCH_SIZE,
+                )
+
+        # we have imported (or warned on) these items, so reset map.
+        self.map.clear()
+
+        return self.result
+
+
+
 class ImportResult(object):
     """
     Results of the import process.
@@ -593,3 +1032,118 @@ class ImportResult(object):
         result_list.append("Imported {0} cases".format(self.num_cases))
         result_list.append("Imported {0} suites".format(self.num_suites))
         return result_list
+
+
+
+def import_files(productversion, paths, jobs=1, force_dupes=False,
+                 batch_size=STREAM_BATCH_SIZE, format="json"):
+    """
+    Import files of cases and suites at ``paths``, ``jobs`` at a time.
+
+    Each file is imported with ``Importer.import_stream`` in its own
+    transaction; with more than one job, in a pool of that many processes,
+    each with its own database connection.
+
+    So that files can be imported concurrently with the same results as one
+    after another, the files are read once up front: tags and suites they
+    name are created then, and names of cases a file would import are
+    reserved for that file, skipping same-named cases in later files.
+
+    Files are all in the given ``format``, as for ``import_stream``.
+
+    Return an ``ImportResult`` for all files. Raises ``ValueError`` if a file
+    can't be parsed, and ``IOError`` if it can't be read; in either case,
+    before any cases are imported.
+
+    """
+    result, reserved = _prepare_files(
+        productversion, paths, force_dupes, format)
+    tasks = [
+        (productversion.id, path, force_dupes, batch_size, names, format)
+        for path, names in zip(paths, reserved)
+        ]
+
+    if jobs > 1:
+        # forked workers must not share the parent's database connection
+        connection.close()
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(_import_file, tasks)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        results = map(_import_file, tasks)
+
+    for file_result in results:
+        result.append(file_result)
+    return result
+
+
+
+@transaction.commit_on_success
+def _prepare_files(productversion, paths, force_dupes, format):
+    """
+    Create tags and suites named in files, and reserve case names per file.
+
+    Return an ``ImportResult`` counting created suites, and a list with, for
+    each path, the set of names of its cases that an earlier file imports.
+
+    """
+    product = productversion.product
+    tag_importer = BulkTagImporter(product)
+    suite_importer = BulkSuiteImporter(product)
+    existing = set()
+    if not force_dupes:
+        existing.update(
+            _fold(name) for name in CaseVersion.objects.filter(
+                productversion=productversion).values_list("name", flat=True)
+            )
+
+    claimed = set()
+
+    reserved = []
+    for path in paths:
+        names = set()
+        imported = set()
+        with open(path) as fh:
+            for key, item in READERS[format](fh):
+                if key == "suites":
+                    if "name" in item:
+                        suite_importer.add_dicts([item])
+                    continue
+                for tag_name in item.get("tags", []):
+                    tag_importer.map.setdefault(tag_name, [])
+                for suite_name in item.get("suites", []):
+                    suite_importer.map.setdefault(suite_name, {})
+                # only cases that import_cases would accept are reserved
+                if ("name" not in item or force_dupes or not all(
+                        "instruction" in step
+                        for step in item.get("steps", []))):
+                    continue
+                if _fold(item["name"]) in claimed:
+                    names.add(item["name"])
+                elif _fold(item["name"]) not in existing:
+                    imported.add(_fold(item["name"]))
+        claimed.update(imported)
+        reserved.append(names)
+
+    tag_importer.import_tags()
+    return suite_importer.import_suites(), reserved
+
+
+
+def _import_file(task):
+    """Import one file of ``import_files``; return its ``ImportResult``."""
+    (productversion_id, path, force_dupes, batch_size, reserved_names,
+     format) = task
+    productversion = ProductVersion.objects.get(pk=productversion_id)
+    with open(path) as fh:
+        return Importer().import_stream(
+            productversion,
+            fh,
+            force_dupes=force_dupes,
+            batch_size=batch_size,
+            reserved_names=reserved_names,
+            format=format,
+            )
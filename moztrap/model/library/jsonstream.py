@@ -0,0 +1,127 @@
+"""
+Incremental reading of the arrays in a large JSON object.
+
+``iter_arrays`` reads a file-like object holding a single JSON object a chunk
+at a time, and yields the items of its array values one by one, so the
+object is never held in memory as a whole.
+
+"""
+import json
+import re
+
+
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+
+def iter_arrays(fh, keys, chunk_size=CHUNK_SIZE):
+    """
+    Yield (key, item) for items of arrays in the JSON object read from ``fh``.
+
+    Only the values of the given ``keys`` are read item by item, in the order
+    they appear in the file; each must be an array. Values of other keys are
+    read whole and skipped.
+
+    Raises ``ValueError`` if the data is not valid JSON.
+
+    """
+    reader = _Reader(fh, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+    else:
+        while True:
+            key = reader.value()
+            if not isinstance(key, basestring):
+                reader.error("Expecting property name")
+            reader.expect(":")
+            if key in keys:
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield key, reader.value()
+                        if reader.expect(",]") == "]":
+                            break
+            else:
+                reader.value()
+            if reader.expect(",}") == "}":
+                break
+    if reader.peek():
+        reader.error("Extra data")
+
+
+
+class _Reader(object):
+    """Buffered reader of JSON tokens and values from a file-like object."""
+    def __init__(self, fh, chunk_size):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        # position in buffer, and number of characters dropped before it
+        self.pos = 0
+        self.offset = 0
+
+
+    def read(self, size):
+        """Add up to ``size`` characters to the buffer; False if none left."""
+        data = self.fh.read(size)
+        if not data:
+            return False
+        if self.pos:
+            self.offset += self.pos
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        self.buffer += data
+        return True
+
+
+    def peek(self):
+        """Skip whitespace; return next character, or "" at end of file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read(self.chunk_size):
+                return ""
+
+
+    def expect(self, chars):
+        """Consume and return next character, which must be in ``chars``."""
+        char = self.peek()
+        if not char or char not in chars:
+            self.error(
+                "Expecting {0}".format(" or ".join(repr(c) for c in chars)))
+        self.pos += 1
+        return char
+
+
+    def value(self):
+        """Consume and return the next JSON value."""
+        if not self.peek():
+            self.error("Expecting value")
+        while True:
+            # reading as much again as is buffered keeps retries linear
+            size = max(self.chunk_size, len(self.buffer) - self.pos)
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.read(size):
+                    continue
+                raise
+            # a number or literal at the end of the buffer may be cut short
+            if end == len(self.buffer) and self.read(size):
+                continue
+            self.pos = end
+            return value
+
+
+    def error(self, message):
+        """Raise ValueError with ``message`` at the current position."""
+        raise ValueError(
+            "{0}: char {1}".format(message, self.offset + self.pos))
@@ -2,11 +2,18 @@
 Models for test-case library (cases, suites).
 
 """
+import re
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models
+from django.db.models.sql import aggregates as sql_aggregates
+
+from model_utils import Choices
 
 from ..attachments.models import Attachment
-from ..mtmodel import MTModel, DraftStatusModel
+from ..mtmodel import (
+    MTModel, DraftStatusModel, bulk_insert, commit_raw_sql, post_soft_delete,
+    post_undelete)
 from ..core.models import Product, ProductVersion
 from ..environments.models import HasEnvironmentsModel
 from ..tags.models import Tag
@@ -18,6 +25,9 @@ class Case(MTModel):
     product = models.ForeignKey(Product, related_name="cases")
     idprefix = models.CharField(max_length=25, blank=True)
 
+    # number of cases whose latest version is marked in one UPDATE
+    BATCH_SIZE = 400
+
 
     def __unicode__(self):
         return "case #%s" % (self.id,)
@@ -37,21 +47,53 @@ class Case(MTModel):
         appropriately.
 
         """
-        try:
-            latest_version = self.versions.order_by("-productversion__order")[0]
-        except IndexError:
-            pass
-        else:
-            self.versions.exclude(pk=latest_version.pk).update(
-                latest=False, notrack=True)
-            self.versions.filter(pk=latest_version.pk).update(
-                latest=True, notrack=True)
-            if update_instance is not None:
-                update_instance.cc_version += 1
-                if update_instance == latest_version:
-                    update_instance.latest = True
-                else:
-                    update_instance.latest = False
+        latest = self.set_latest_versions([self.pk])
+        if update_instance is not None and self.pk in latest:
+            update_instance.cc_version += 1
+            update_instance.latest = (update_instance.pk == latest[self.pk])
+
+
+    @classmethod
+    def set_latest_versions(cls, case_ids):
+        """
+        Mark latest version of given cases in DB, marking all others non-latest.
+
+        Flags are set with one UPDATE per batch of ``BATCH_SIZE`` cases. Return
+        dictionary mapping case ids to the id of their latest version (cases
+        without versions are left out).
+
+        """
+        case_ids = sorted(set(case_ids))
+        latest = {}
+        for start in range(0, len(case_ids), cls.BATCH_SIZE):
+            latest.update(
+                cls._set_latest_versions(
+                    case_ids[start:start + cls.BATCH_SIZE]))
+        return latest
+
+
+    @classmethod
+    def _set_latest_versions(cls, case_ids):
+        """Mark latest versions of one batch of cases; return their ids."""
+        latest = {}
+        for case_id, cv_id in CaseVersion.objects.filter(
+                case__in=case_ids).order_by(
+                "case", "-productversion__order").values_list("case", "id"):
+            latest.setdefault(case_id, cv_id)
+        if latest:
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE {0} SET latest = (id IN ({1})), "
+                "cc_version = cc_version + 1 "
+                "WHERE case_id IN ({2}) AND deleted_on IS NULL".format(
+                    CaseVersion._meta.db_table,
+                    ",".join(["%s"] * len(latest)),
+                    ",".join(["%s"] * len(latest)),
+                    ),
+                latest.values() + latest.keys(),
+                )
+            commit_raw_sql()
+        return latest
 
 
     def all_versions(self):
@@ -113,22 +155,73 @@ class CaseVersion(MTModel, DraftStatusModel, HasEnvironmentsModel):
 
 
     def save(self, *args, **kwargs):
-        """Save CaseVersion, updating latest version."""
+        """Save CaseVersion, updating latest version and names of siblings."""
         skip_set_latest = kwargs.pop("skip_set_latest", False)
         skip_sync_name = kwargs.pop("skip_sync_name", False)
+        skip_index = kwargs.pop("skip_index", False)
+        user = kwargs.get("user")
         super(CaseVersion, self).save(*args, **kwargs)
+        if not skip_index:
+            SearchTerm.index([self.pk])
         if not skip_set_latest:
-            self.case.set_latest_version(update_instance=self)
+            self._update_latest([self])
 
         # keep the name in sync for all caseversions
         if not skip_sync_name:
-            for cv in self.case.versions.all():
-                if not cv == self:
-                    cv.name = self.name
-                    cv.save(
-                        skip_sync_name=True,
-                        skip_set_latest=True,
-                        )
+            self._sync_names([self], user)
+
+
+    @classmethod
+    def bulk_save(cls, caseversions, user=None):
+        """
+        Save many ``caseversions``, updating latest versions and names once.
+
+        Each caseversion is saved (as by ``user``) on its own, but indexing,
+        marking latest versions and syncing names to other versions of the
+        same cases are done for all of them together, with a fixed number of
+        queries. If several given caseversions of one case have different
+        names, the last one's name wins.
+
+        """
+        caseversions = list(caseversions)
+        for cv in caseversions:
+            super(CaseVersion, cv).save(user=user)
+        SearchTerm.index([cv.pk for cv in caseversions])
+        cls._update_latest(caseversions)
+        cls._sync_names(caseversions, user)
+
+
+    @classmethod
+    def _update_latest(cls, caseversions):
+        """Mark latest versions of the cases of ``caseversions`` (updated)."""
+        latest = Case.set_latest_versions(cv.case_id for cv in caseversions)
+        for cv in caseversions:
+            if cv.case_id in latest:
+                cv.cc_version += 1
+                cv.latest = (cv.pk == latest[cv.case_id])
+
+
+    @classmethod
+    def _sync_names(cls, caseversions, user):
+        """Give other versions of the same cases the names of these."""
+        names = dict((cv.case_id, cv.name) for cv in caseversions)
+        saved = set(cv.pk for cv in caseversions)
+        case_ids = sorted(names)
+        stale = {}
+        for start in range(0, len(case_ids), Case.BATCH_SIZE):
+            for cv_id, case_id, name in cls.objects.filter(
+                    case__in=case_ids[start:start + Case.BATCH_SIZE]
+                    ).values_list("id", "case", "name"):
+                if cv_id not in saved and name != names[case_id]:
+                    stale.setdefault(names[case_id], []).append(cv_id)
+        for name, cv_ids in stale.items():
+            for start in range(0, len(cv_ids), Case.BATCH_SIZE):
+                cls.objects.filter(
+                    pk__in=cv_ids[start:start + Case.BATCH_SIZE]).update(
+                    name=name, user=user)
+        if stale:
+            SearchTerm.index(
+                cv_id for cv_ids in stale.values() for cv_id in cv_ids)
 
 
 
@@ -190,7 +283,10 @@ class CaseVersion(MTModel, DraftStatusModel, HasEnvironmentsModel):
         overrides.setdefault("name", u"Cloned: {0}".format(self.name))
         if "productversion" not in overrides and "case" not in overrides:
             overrides["case"] = self.case.clone(cascade=[])
-        return super(CaseVersion, self).clone(*args, **kwargs)
+        clone = super(CaseVersion, self).clone(*args, **kwargs)
+        # steps are copied in bulk, without saving (and indexing) each one
+        SearchTerm.index([clone.pk])
+        return clone
 
 
     @property
@@ -249,6 +345,20 @@ class CaseStep(MTModel):
         return u"step #%s" % (self.number,)
 
 
+    def save(self, *args, **kwargs):
+        """
+        Save CaseStep, updating the search index of its caseversion.
+
+        When saving several steps of a caseversion, pass ``skip_index=True``
+        and index the caseversion once afterwards.
+
+        """
+        skip_index = kwargs.pop("skip_index", False)
+        super(CaseStep, self).save(*args, **kwargs)
+        if not skip_index:
+            SearchTerm.index([self.caseversion_id])
+
+
     def clean(self):
         """
         Validate uniqueness of caseversion/number combo.
@@ -344,3 +454,200 @@ class SuiteCase(MTModel):
                 "'{0}' is already in suite '{1}'".format(
                     self.case, self.suite)
                 )
+
+
+
+class SearchTerm(models.Model):
+    """
+    A word found in a text field of a caseversion or of its steps.
+
+    Search terms let keyword filters find caseversions through an index
+    rather than scanning (and joining steps for) every caseversion. They are
+    kept current as caseversions and steps are saved and deleted, and can be
+    rebuilt with the ``rebuild_search_index`` management command.
+
+    """
+    FIELDS = Choices("name", "description", "instruction", "expected")
+    MAX_LENGTH = 50
+    WORD_RE = re.compile(r"\w+", re.UNICODE)
+    BATCH_SIZE = 500
+
+    caseversion = models.ForeignKey(CaseVersion, related_name="searchterms")
+    field = models.CharField(max_length=20, choices=FIELDS)
+    # not unique per caseversion and field: words that differ in Python may
+    # be equal in a case- and accent-insensitive database collation
+    term = models.CharField(max_length=MAX_LENGTH, db_index=True)
+
+
+    @classmethod
+    def words(cls, text):
+        """Return set of distinct lower-cased words (truncated) in ``text``."""
+        return set(
+            w[:cls.MAX_LENGTH] for w in cls.WORD_RE.findall(text.lower()))
+
+
+    @classmethod
+    def index(cls, caseversion_ids):
+        """Rebuild the search terms of the caseversions with given ids."""
+        caseversion_ids = sorted(set(caseversion_ids))
+        for start in range(0, len(caseversion_ids), cls.BATCH_SIZE):
+            cls._index(caseversion_ids[start:start + cls.BATCH_SIZE])
+
+
+    @classmethod
+    def _index(cls, caseversion_ids):
+        """Rebuild the search terms of one batch of caseversions."""
+        cursor = connection.cursor()
+        cursor.execute(
+            "DELETE FROM {0} WHERE caseversion_id IN ({1})".format(
+                cls._meta.db_table, ",".join(["%s"] * len(caseversion_ids))),
+            caseversion_ids,
+            )
+        commit_raw_sql()
+
+        # (caseversion id, field) -> set of words
+        found = {}
+        for cv_id, name, description in CaseVersion.everything.filter(
+                pk__in=caseversion_ids).values_list(
+                "id", "name", "description"):
+            found[(cv_id, cls.FIELDS.name)] = cls.words(name)
+            found[(cv_id, cls.FIELDS.description)] = cls.words(description)
+        for cv_id, instruction, expected in CaseStep.objects.filter(
+                caseversion__in=caseversion_ids).values_list(
+                "caseversion_id", "instruction", "expected"):
+            found.setdefault(
+                (cv_id, cls.FIELDS.instruction), set()).update(
+                cls.words(instruction))
+            found.setdefault(
+                (cv_id, cls.FIELDS.expected), set()).update(
+                cls.words(expected))
+
+        bulk_insert(
+            [
+                cls(caseversion_id=cv_id, field=field, term=term)
+                for (cv_id, field), terms in sorted(found.items())
+                for term in sorted(terms)
+                ]
+            )
+
+
+    @classmethod
+    def matching(cls, field, text):
+        """
+        Return queryset of ids of caseversions matching ``text`` in ``field``.
+
+        A caseversion matches if, for every word in ``text``, ``field`` (of
+        the caseversion, or of one of its steps) has a word starting with it.
+        If ``text`` has no words, return None.
+
+        The query is a single ``GROUP BY`` over the terms starting with any
+        of the words, keeping caseversions that have a term for each word.
+        (Words that are a prefix of another word are redundant and dropped,
+        so each term starts with at most one word.)
+
+        """
+        words = cls.words(text)
+        if not words:
+            return None
+        words = sorted(
+            w for w in words
+            if not any(o != w and o.startswith(w) for o in words)
+            )
+        starts = models.Q()
+        for word in words:
+            starts |= models.Q(term__startswith=word)
+        return cls.objects.filter(starts, field=field).values(
+            "caseversion").annotate(
+            matched=MatchedWordsCount("term", words=words)).filter(
+            matched=len(words)).values("caseversion")
+
+
+
+class MatchedWordsCount(models.Count):
+    """
+    Counts how many of ``words`` the grouped terms start with.
+
+    ``words`` must be ``SearchTerm.words``, none a prefix of another.
+
+    """
+    def __init__(self, lookup, words, **extra):
+        """Initialize the aggregate with the (prefix-free) ``words``."""
+        self.words = words
+        super(MatchedWordsCount, self).__init__(lookup, distinct=True, **extra)
+
+
+    def add_to_query(self, query, alias, col, source, is_summary):
+        """Add the aggregate, counting a MatchedWordColumn of ``col``."""
+        try:
+            table, field = col
+        except ValueError:
+            table, field = None, col
+        query.aggregates[alias] = MatchedWordsCountSQL(
+            MatchedWordColumn(table, field, self.words),
+            source=source,
+            is_summary=is_summary,
+            **self.extra
+            )
+
+
+
+class MatchedWordsCountSQL(sql_aggregates.Count):
+    """
+    SQL form of MatchedWordsCount.
+
+    Django only relabels aggregate columns that are (table, column) tuples;
+    this relabels the MatchedWordColumn too, so the table alias stays right
+    when the query is used as a subquery (e.g. in an ``__in`` lookup).
+
+    """
+    def relabel_aliases(self, change_map):
+        """Relabel the table alias of the counted column."""
+        self.col.relabel_aliases(change_map)
+
+
+
+class MatchedWordColumn(object):
+    """A column giving the index of the word a term starts with, or NULL."""
+    def __init__(self, table, field, words):
+        """Initialize the column with a table, field name and words."""
+        self.table = table
+        self.field = field
+        self.words = words
+
+
+    def relabel_aliases(self, change_map):
+        """Replace the table alias according to ``change_map``."""
+        self.table = change_map.get(self.table, self.table)
+
+
+    def as_sql(self, qn, connection):
+        """
+        Return CASE statement mapping terms to the word they start with.
+
+        Aggregates can't take query parameters, so the words are inlined;
+        they only contain word characters (see ``SearchTerm.WORD_RE``), so
+        this is safe.
+
+        """
+        field = qn(self.field)
+        if self.table is not None:
+            field = "{0}.{1}".format(qn(self.table), field)
+        whens = []
+        for i, word in enumerate(self.words):
+            if not word or SearchTerm.WORD_RE.sub("", word):
+                raise ValueError("Not a search word: {0!r}".format(word))
+            whens.append(
+                u"WHEN SUBSTR({0}, 1, {1}) = '{2}' THEN {3}".format(
+                    field, len(word), word, i))
+        return u"CASE {0} ELSE NULL END".format(" ".join(whens))
+
+
+
+def _index_steps_caseversions(sender, queryset, **kwargs):
+    """Reindex the caseversions of (un)deleted steps."""
+    SearchTerm.index(queryset.values_list("caseversion_id", flat=True))
+
+
+
+post_soft_delete.connect(_index_steps_caseversions, sender=CaseStep)
+post_undelete.connect(_index_steps_caseversions, sender=CaseStep)
@@ -0,0 +1,120 @@
+"""
+Readers of suite and case data in the file formats the importer accepts.
+
+Each reader takes a file-like object and yields ("suites" or "cases", data
+dictionary) pairs, with data dictionaries structured as for
+``Importer.import_data``. Files are read incrementally, so they are never held
+in memory as a whole. Readers raise ``ValueError`` for data they can't parse.
+
+"""
+import csv
+import re
+
+from .bulk import BulkParser
+from .jsonstream import iter_arrays
+
+
+
+def read_json(fh):
+    """Yield suites and cases from JSON structured as for ``import_data``."""
+    return iter_arrays(fh, ["suites", "cases"])
+
+
+
+STEP_COLUMN = re.compile(r"^(instruction|expected) ?(\d+)$")
+LIST_COLUMNS = ["tags", "suites"]
+TEXT_COLUMNS = ["name", "description", "idprefix", "created_by"]
+
+
+
+def read_csv(fh):
+    """
+    Yield cases from CSV with a header row and one row per case.
+
+    Columns are "name", "description", "idprefix", "created_by", "tags" and
+    "suites" (the latter two holding comma-separated names), and for each
+    step a pair of "instructionN" and "expectedN" columns, numbered from 1.
+    All columns but "name" are optional, and empty cells are left out of the
+    data, as are steps with both cells empty.
+
+    """
+    reader = csv.reader(fh)
+    try:
+        header = [_text(h).strip().lower() for h in next(reader, [])]
+        steps = {}
+        for i, column in enumerate(header):
+            match = STEP_COLUMN.match(column)
+            if match:
+                steps.setdefault(int(match.group(2)), {})[match.group(1)] = i
+            elif column not in LIST_COLUMNS + TEXT_COLUMNS:
+                raise ValueError("Unknown CSV column {0!r}".format(column))
+        if "name" not in header:
+            raise ValueError("CSV header row has no 'name' column")
+
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            cells = dict(
+                (column, _text(cell).strip())
+                for column, cell in zip(header, row)
+                )
+            case = dict(
+                (column, cells[column])
+                for column in TEXT_COLUMNS
+                if cells.get(column)
+                )
+            for column in LIST_COLUMNS:
+                if cells.get(column):
+                    case[column] = [
+                        name.strip()
+                        for name in cells[column].split(",")
+                        if name.strip()
+                        ]
+            case_steps = []
+            for number in sorted(steps):
+                step = dict(
+                    (key, _text(row[i]).strip())
+                    for key, i in steps[number].items()
+                    if i < len(row) and row[i].strip()
+                    )
+                if step:
+                    case_steps.append(step)
+            if case_steps:
+                case["steps"] = case_steps
+            yield "cases", case
+    except csv.Error as e:
+        raise ValueError("line {0}: {1}".format(reader.line_num, e))
+
+
+
+def read_text(fh):
+    """
+    Yield cases from bulk test case text, as parsed by ``BulkParser``.
+
+    The format is the one for adding cases in bulk in the web UI::
+
+        Test that I can log in
+        When I click the login button
+        Then I am logged in
+
+    """
+    for case in BulkParser().iter_parse(_text(line) for line in fh):
+        if "error" in case:
+            raise ValueError(case["error"])
+        yield "cases", case
+
+
+
+READERS = {
+    "json": read_json,
+    "csv": read_csv,
+    "text": read_text,
+    }
+
+
+
+def _text(value):
+    """Return ``value`` (UTF-8 encoded, if a byte string) as unicode."""
+    if isinstance(value, str):
+        return value.decode("utf-8")
+    return value
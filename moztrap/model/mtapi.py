@@ -1,10 +1,14 @@
 from tastypie import http
 from tastypie.authentication import ApiKeyAuthentication
 from tastypie.authorization import  Authorization
-from tastypie.exceptions import ImmediateHttpResponse
+from tastypie.exceptions import ImmediateHttpResponse, BadRequest
+from tastypie.paginator import Paginator
 from tastypie.resources import ModelResource
 
+from urllib import urlencode
+
 from .core.models import ApiKey
+from ..view.lists.pagination import KeysetPager, keyset_ordering
 
 import logging
 logger = logging.getLogger("moztrap.model.mtapi")
@@ -88,6 +92,52 @@ class MTAuthorization(Authorization):
 
 
 
+class KeysetPaginator(Paginator):
+    """
+    Paginator that can also page by cursor rather than by offset.
+
+    If the request has a ``cursor`` parameter (empty for the first page), the
+    requested page is found by its position in the sort order, which costs
+    the same however deep the page; ``meta`` then has ``next`` and
+    ``previous`` URLs carrying opaque cursors, and no ``offset`` or
+    ``total_count``. Without a ``cursor`` it paginates by offset as usual.
+
+    """
+    def page(self):
+        if "cursor" not in self.request_data:
+            return super(KeysetPaginator, self).page()
+
+        limit = self.get_limit()
+        if not limit:
+            return super(KeysetPaginator, self).page()
+        ordering = keyset_ordering(self.objects)
+        if ordering is None:
+            raise BadRequest("Cannot paginate by cursor in this order.")
+
+        pager = KeysetPager(
+            self.objects, limit, self.request_data["cursor"], ordering)
+        return {
+            "objects": pager.objects,
+            "meta": {
+                "limit": limit,
+                "previous": self._generate_cursor_uri(pager.prev_cursor),
+                "next": self._generate_cursor_uri(pager.next_cursor),
+                },
+            }
+
+
+    def _generate_cursor_uri(self, cursor):
+        if cursor is None or self.resource_uri is None:
+            return None
+
+        request_params = dict(
+            [k, v.encode("utf-8")] for k, v in self.request_data.items()
+            if k != "offset")
+        request_params["cursor"] = cursor
+        return "%s?%s" % (self.resource_uri, urlencode(request_params))
+
+
+
 class MTResource(ModelResource):
     """Implement the common code needed for CRUD API interfaces.
 
@@ -104,6 +154,7 @@ class MTResource(ModelResource):
         authorization = MTAuthorization()
         always_return_data = True
         ordering = ['id']
+        paginator_class = KeysetPaginator
 
     @property
     def model(self):
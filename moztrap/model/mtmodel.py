@@ -5,12 +5,18 @@ Soft-deletion (including cascade) and tracking of user and timestamp for model
 creation, modification, and soft-deletion.
 
 """
+from collections import defaultdict
 import datetime
+import operator
 
-from django.db import models, router
+from django.db import connection, models, router, transaction
 from django.db.models.deletion import Collector
+from django.db.models.fields.related import (
+    ForeignRelatedObjectsDescriptor, ManyRelatedObjectsDescriptor,
+    ReverseManyRelatedObjectsDescriptor)
 from django.db.models.query import QuerySet
-from django.db.models.signals import class_prepared
+from django.db.models.signals import class_prepared, m2m_changed
+from django.dispatch import Signal
 
 from model_utils import Choices
 
@@ -28,10 +34,464 @@ def utcnow():
 
 
 
+def commit_raw_sql():
+    """
+    Commit writes just made with raw SQL, unless a transaction is managed.
+
+    Raw cursor writes aren't seen by Django's transaction management. Within
+    a managed transaction this marks it dirty, so the writes are committed or
+    rolled back with it; otherwise (in a shell, script or unwrapped command)
+    they are committed now, as ``QuerySet.update`` does.
+
+    """
+    transaction.commit_unless_managed()
+
+
+
+# Soft delete and undelete are bulk updates that bypass ``save()``; these are
+# sent after a cascade is applied, once per affected model (as ``sender``),
+# with a ``queryset`` of the affected rows of that model.
+post_soft_delete = Signal(providing_args=["queryset"])
+post_undelete = Signal(providing_args=["queryset"])
+
+# maximum number of objects deleted directly (rather than by cascade) whose
+# cascade is applied together; keeps query parameters within SQLite's limit
+SOFT_DELETE_CHUNK_SIZE = 500
+
+# maximum width of the range of pks soft-deleted by one cascade statement
+SOFT_DELETE_RANGE_SIZE = 10000
+
+# maximum number of rows copied by one INSERT ... SELECT when bulk cloning;
+# keeps query parameters within SQLite's limit of 999
+CLONE_CHUNK_SIZE = 250
+
+# SQLite allows at most this many parameters in one statement
+MAX_QUERY_PARAMS = 999
+
+# default maximum number of rows inserted by one ``bulk_create``
+BULK_CREATE_BATCH_SIZE = 500
+
+
+
+def soft_delete(queryset, user=None):
+    """
+    Soft-delete all objects in ``queryset`` and their cascade, set-based.
+
+    Only the pks of the objects in ``queryset`` are loaded. The cascade is
+    applied one relation at a time, with ``UPDATE child ... WHERE fk IN
+    (SELECT pk FROM parent ...)`` statements whose subquery selects the
+    parents marked deleted by this deletion: those with its deletion time
+    whose own parents were, in turn, back to the objects in ``queryset``.
+    Each statement updates a range of at most ``SOFT_DELETE_RANGE_SIZE``
+    pks. Objects that were already deleted keep their original deletion time
+    and don't cascade again.
+
+    """
+    now = utcnow()
+    model = queryset.model
+    pks = sorted(
+        queryset.filter(deleted_on__isnull=True).values_list("pk", flat=True))
+    deleted = defaultdict(list)
+    for chunk in _chunks(pks, SOFT_DELETE_CHUNK_SIZE):
+        QuerySet.update(
+            model._base_manager.filter(pk__in=chunk, deleted_on__isnull=True),
+            deleted_by=user,
+            deleted_on=now,
+            )
+        pending = [
+            (model, model._base_manager.filter(pk__in=chunk, deleted_on=now),
+             (model,))
+            ]
+        while pending:
+            parent, parents, path = pending.pop(0)
+            deleted[parent].append(parents)
+            for child, fk_name in _soft_delete_cascades(parent):
+                children = child._base_manager.filter(
+                    **{"{0}__in".format(fk_name): parents.values("pk")})
+                if _mark_deleted(children, now, user, child in path):
+                    pending.append(
+                        (child, children.filter(deleted_on=now),
+                         path + (child,))
+                        )
+
+    for model, querysets in deleted.items():
+        post_soft_delete.send(
+            sender=model, queryset=reduce(operator.or_, querysets))
+
+
+
+def _mark_deleted(queryset, now, user, self_select=False):
+    """
+    Mark not-deleted rows of ``queryset`` deleted; return how many.
+
+    Rows are marked in ranges of at most ``SOFT_DELETE_RANGE_SIZE`` pks, each
+    starting at the lowest pk still to be marked. If ``queryset`` selects
+    from its own table in a subquery (``self_select``) and the database can't
+    update a table it selects from (MySQL), the pks of each range are
+    selected first.
+
+    """
+    remaining = queryset.filter(deleted_on__isnull=True)
+    marked = 0
+    while True:
+        start = remaining.aggregate(start=models.Min("pk"))["start"]
+        if start is None:
+            return marked
+        rows = remaining.filter(
+            pk__gte=start, pk__lt=start + SOFT_DELETE_RANGE_SIZE)
+        if self_select and not connection.features.update_can_self_select:
+            rows = queryset.model._base_manager.filter(
+                pk__in=list(rows.values_list("pk", flat=True)))
+        marked += QuerySet.update(rows, deleted_by=user, deleted_on=now)
+
+
+
+def _soft_delete_cascades(model):
+    """
+    Return list of (model, fk name) of relations soft-deletes cascade along.
+
+    These are the reverse foreign keys to ``model`` with on_delete CASCADE
+    from soft-deletable models; other related rows are left alone.
+
+    """
+    return [
+        (related.model, related.field.name)
+        for related in model._meta.get_all_related_objects(
+            include_hidden=True)
+        if issubclass(related.model, MTModel)
+        and related.field.rel.on_delete is models.CASCADE
+        ]
+
+
+
+def _chunks(items, size):
+    """Yield successive lists of at most ``size`` of ``items`` (a list)."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+
+def bulk_batches(objs, batch_size=BULK_CREATE_BATCH_SIZE):
+    """
+    Split ``objs`` (of one model) into lists ``bulk_create`` can insert.
+
+    Each list has at most ``batch_size`` objects, and few enough that their
+    field values stay within SQLite's limit of query parameters.
+
+    """
+    objs = list(objs)
+    if not objs:
+        return []
+    fields = [
+        f for f in type(objs[0])._meta.local_fields
+        if not isinstance(f, models.AutoField)
+        ]
+    size = max(1, min(batch_size, MAX_QUERY_PARAMS // max(len(fields), 1)))
+    return list(_chunks(objs, size))
+
+
+
+def bulk_insert(objs, batch_size=BULK_CREATE_BATCH_SIZE):
+    """Insert ``objs`` (of one model) with a ``bulk_create`` per batch."""
+    for batch in bulk_batches(objs, batch_size):
+        type(batch[0])._base_manager.bulk_create(batch)
+
+
+
+def bulk_create_with_pks(objs, batch_size=BULK_CREATE_BATCH_SIZE):
+    """
+    Insert ``objs`` (of one MTModel) in batches; set and return their pks.
+
+    ``bulk_create`` doesn't give back the pks of the inserted rows; they are
+    worked out from the id the database reports for each batch's single
+    ``INSERT`` statement (see ``_inserted_pks``).
+
+    """
+    pks = []
+    for batch in bulk_batches(objs, batch_size):
+        type(batch[0])._base_manager.bulk_create(batch)
+        new = _inserted_pks(len(batch))
+        for obj, pk in zip(batch, new):
+            obj.pk = pk
+        pks.extend(new)
+    return pks
+
+
+
+def _inserted_pks(count):
+    """
+    Return pks of the ``count`` rows inserted by the last ``INSERT``.
+
+    The database reports one auto-increment id per statement, per connection
+    (so inserts by other connections don't affect it): MySQL the first id of
+    a multi-row insert, SQLite the last. The others are consecutive, in order
+    of the inserted rows. SQLite writes one statement at a time; MySQL InnoDB
+    hands out consecutive ids to one statement as long as
+    ``innodb_autoinc_lock_mode`` is 0 or 1 (the default before MySQL 8), not 2
+    ("interleaved"), stepping by ``auto_increment_increment``.
+
+    """
+    cursor = connection.cursor()
+    if connection.vendor == "mysql":
+        cursor.execute("SELECT LAST_INSERT_ID(), @@auto_increment_increment")
+        first, step = cursor.fetchone()
+    elif connection.vendor == "sqlite":
+        cursor.execute("SELECT last_insert_rowid()")
+        first, step = cursor.fetchone()[0] - count + 1, 1
+    else:
+        raise NotImplementedError(
+            "Can't get inserted pks on {0}.".format(connection.vendor))
+    return [first + i * step for i in range(count)]
+
+
+
+def bulk_clone(queryset, cascade=None, overrides=None, user=None):
+    """
+    Clone all objects in ``queryset``, set-based; return {old pk: new pk}.
+
+    Rows are copied with an ``INSERT ... SELECT`` statement per chunk of
+    ``CLONE_CHUNK_SIZE`` objects, without instantiating them or calling their
+    ``save()`` or ``clone()`` methods. As with ``MTModel.clone``, clones get
+    new created-on and modified-on timestamps and ``user`` as created-by and
+    modified-by, and ``overrides`` gives values for other fields. An override
+    value may also be a dictionary mapping the original value of the field to
+    its replacement (e.g. old parent pks to new parent pks). Clones are not
+    deleted.
+
+    ``cascade`` names reverse foreign keys and many-to-many relations to clone
+    along, as for ``MTModel.clone``; filter callables of a ``cascade``
+    dictionary are passed the related objects of all cloned objects at once.
+    Each relation is cloned with another statement per chunk.
+
+    """
+    model = queryset.model
+    cascade = _cascade_dict(cascade)
+    now = utcnow()
+    values = dict(overrides or {})
+    values.update(
+        created_on=now, created_by=user, modified_on=now, modified_by=user,
+        deleted_on=None, deleted_by=None)
+
+    fields = [f for f in model._meta.local_fields if not f.primary_key]
+    mapped = [f for f in fields if isinstance(values.get(f.name), dict)]
+    for field in mapped:
+        values[field.name] = dict(
+            (_db_value(field, k), _db_value(field, v))
+            for k, v in values[field.name].items()
+            )
+
+    sources = list(
+        queryset.order_by("pk").values_list(
+            "pk", *[f.attname for f in mapped]))
+    if not sources:
+        return {}
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ", ".join(qn(f.column) for f in fields)
+
+    mapping = {}
+    cursor = connection.cursor()
+    for start in range(0, len(sources), CLONE_CHUNK_SIZE):
+        chunk = sources[start:start + CLONE_CHUNK_SIZE]
+        select = []
+        params = []
+        for field in fields:
+            column = qn(field.column)
+            if field.name not in values:
+                select.append(column)
+            elif field in mapped:
+                i = mapped.index(field) + 1
+                keys = set(row[i] for row in chunk)
+                sql, case_params = _case_sql(
+                    column,
+                    [(k, v) for k, v in values[field.name].items()
+                     if k in keys]
+                    )
+                select.append(sql)
+                params.extend(case_params)
+            else:
+                select.append("%s")
+                params.append(_db_value(field, values[field.name]))
+        # MySQL can't insert into a table selected from in a subquery
+        cursor.execute(
+            "INSERT INTO {0} ({1}) SELECT {2} FROM {0} WHERE {3} IN ({4}) "
+            "ORDER BY {3}".format(
+                table,
+                columns,
+                ", ".join(select),
+                qn(model._meta.pk.column),
+                ", ".join(["%s"] * len(chunk)),
+                ),
+            params + [row[0] for row in chunk],
+            )
+        # auto-increment pks are handed out in order of the copied rows
+        new = _inserted_pks(len(chunk))
+        mapping.update(zip([row[0] for row in chunk], new))
+    commit_raw_sql()
+
+    for name, filter_func in cascade.items():
+        kind, relation = _cascade_relation(model, name)
+        if kind == "m2m":
+            targets = None
+            if filter_func is not None:
+                targets = filter_func(_related_manager(relation[3]).all())
+            _clone_m2m_rows(relation, mapping, targets)
+        else:
+            child, fk_name = relation
+            related = child.objects.filter(
+                **{"{0}__in".format(fk_name): queryset.values("pk")})
+            if filter_func is not None:
+                related = filter_func(related)
+            bulk_clone(related, overrides={fk_name: mapping}, user=user)
+
+    return mapping
+
+
+
+def _cascade_dict(cascade):
+    """
+    Return ``cascade`` as a dictionary of relation name to filter func.
+
+    Relations given in a list get a filter func of None: clone all.
+
+    """
+    if cascade is None:
+        return {}
+    try:
+        cascade.iteritems
+    except AttributeError:
+        cascade = dict.fromkeys(cascade)
+    return cascade
+
+
+
+def _cascade_relation(model, name):
+    """
+    Return kind and description of the relation ``name`` of ``model``.
+
+    Kind is "m2m" for a many-to-many relation, described by its (through
+    model, source column, target column, target model), or "fk" for a reverse
+    foreign key, described by its (related model, foreign key name). Raises
+    ValueError for anything else.
+
+    """
+    descriptor = getattr(model, name, None)
+    if isinstance(descriptor, ReverseManyRelatedObjectsDescriptor):
+        field = descriptor.field
+        return "m2m", (
+            field.rel.through,
+            field.m2m_column_name(),
+            field.m2m_reverse_name(),
+            field.rel.to,
+            )
+    if isinstance(descriptor, ManyRelatedObjectsDescriptor):
+        field = descriptor.related.field
+        return "m2m", (
+            field.rel.through,
+            field.m2m_reverse_name(),
+            field.m2m_column_name(),
+            descriptor.related.model,
+            )
+    if isinstance(descriptor, ForeignRelatedObjectsDescriptor):
+        return "fk", (descriptor.related.model, descriptor.related.field.name)
+    raise ValueError(
+        "Cannot cascade-clone '{0}'; "
+        "not a many-to-many or reverse foreignkey.".format(name))
+
+
+
+def _clone_m2m_rows(relation, mapping, targets=None):
+    """
+    Copy many-to-many rows of ``relation`` from old to new pks in ``mapping``.
+
+    Only rows pointing to ``targets`` (a queryset or list of pks) are copied;
+    by default, rows pointing to any object that isn't deleted. Rows the new
+    objects already had (e.g. added on save) are replaced.
+
+    """
+    through, source, target, target_model = relation
+    if not through._meta.auto_created:
+        raise ValueError(
+            "Cannot cascade-clone many-to-many through {0}; "
+            "cascade its reverse foreignkey instead.".format(
+                through.__name__))
+    if targets is None:
+        targets = _related_manager(target_model).all()
+    if isinstance(targets, QuerySet):
+        # MySQL can't insert into a table selected from in a subquery, so
+        # target querysets must not join the through table.
+        targets_sql, targets_params = targets.values("pk").query.get_compiler(
+            connection=connection).as_sql()
+        targets_params = list(targets_params)
+    else:
+        targets_params = list(targets)
+        if not targets_params:
+            return
+        targets_sql = ", ".join(["%s"] * len(targets_params))
+
+    qn = connection.ops.quote_name
+    items = sorted(mapping.items())
+    cursor = connection.cursor()
+    for start in range(0, len(items), CLONE_CHUNK_SIZE):
+        chunk = items[start:start + CLONE_CHUNK_SIZE]
+        cursor.execute(
+            "DELETE FROM {0} WHERE {1} IN ({2})".format(
+                qn(through._meta.db_table),
+                qn(source),
+                ", ".join(["%s"] * len(chunk)),
+                ),
+            [new for old, new in chunk],
+            )
+        case_sql, case_params = _case_sql(qn(source), chunk)
+        cursor.execute(
+            "INSERT INTO {0} ({1}, {2}) SELECT {3}, {2} FROM {0} "
+            "WHERE {1} IN ({4}) AND {2} IN ({5})".format(
+                qn(through._meta.db_table),
+                qn(source),
+                qn(target),
+                case_sql,
+                ", ".join(["%s"] * len(chunk)),
+                targets_sql,
+                ),
+            case_params + [old for old, new in chunk] + targets_params,
+            )
+    commit_raw_sql()
+
+
+
+def _related_manager(model):
+    """Return manager for related ``model`` objects; hides deleted ones."""
+    if issubclass(model, MTModel):
+        return model.objects
+    return model._default_manager
+
+
+
+def _case_sql(column, pairs):
+    """Return SQL and params for ``column`` mapped by (old, new) ``pairs``."""
+    if not pairs:
+        return column, []
+    return (
+        "CASE {0} {1} ELSE {0} END".format(
+            column, " ".join(["WHEN %s THEN %s"] * len(pairs))),
+        [p for pair in pairs for p in pair],
+        )
+
+
+
+def _db_value(field, value):
+    """Return ``value`` of ``field`` prepared as a query parameter."""
+    if isinstance(value, models.Model):
+        value = value.pk
+    return field.get_db_prep_save(value, connection=connection)
+
+
+
 class SoftDeleteCollector(Collector):
     """
-    A variant of Django's default delete-cascade collector that implements soft
-    delete.
+    A variant of Django's default delete-cascade collector that implements
+    undelete of soft-deleted objects.
 
     """
     def collect(self, objs, *args, **kwargs):
@@ -46,19 +506,6 @@ class SoftDeleteCollector(Collector):
         super(SoftDeleteCollector, self).collect(objs, *args, **kwargs)
 
 
-    def delete(self, user=None):
-        """
-        Soft-delete all collected instances.
-
-        """
-        now = utcnow()
-        for model, instances in self.data.iteritems():
-            pk_list = [obj.pk for obj in instances]
-            model._base_manager.filter(
-                pk__in=pk_list, deleted_on__isnull=True).update(
-                deleted_by=user, deleted_on=now)
-
-
     def undelete(self, user=None):
         """
         Undelete all collected instances that were deleted.
@@ -68,10 +515,16 @@ class SoftDeleteCollector(Collector):
         # deleted in one of these same cascade batches should be undeleted.
         deletion_times = set([o.deleted_on for o in self.root_objs])
         for model, instances in self.data.iteritems():
+            if not issubclass(model, MTModel):
+                continue
             pk_list = [obj.pk for obj in instances]
             model._base_manager.filter(
                 pk__in=pk_list, deleted_on__in=deletion_times).update(
                 deleted_by=None, deleted_on=None)
+            post_undelete.send(
+                sender=model,
+                queryset=model._base_manager.filter(pk__in=pk_list),
+                )
 
 
 
@@ -110,9 +563,7 @@ class MTQuerySet(QuerySet):
         """
         if permanent:
             return super(MTQuerySet, self).delete()
-        collector = SoftDeleteCollector(using=self.db)
-        collector.collect(self)
-        collector.delete(user)
+        soft_delete(self, user)
 
 
     def undelete(self, user=None):
@@ -236,14 +687,15 @@ class MTModel(models.Model):
         and values are a callable that takes the queryset of all related
         objects and returns those that should be cloned.
 
+        M2M relations are copied, and reverse FK related objects whose model
+        doesn't customize ``clone()`` are cloned, set-based with
+        ``bulk_clone``; others are cloned one at a time.
+
         """
-        if cascade is None:
-            cascade = {}
-        else:
-            try:
-                cascade.iteritems
-            except AttributeError:
-                cascade = dict((i, lambda qs: qs) for i in cascade)
+        cascade = _cascade_dict(cascade)
+        relations = dict(
+            (name, _cascade_relation(self.__class__, name))
+            for name in cascade)
 
         if overrides is None:
             overrides = {}
@@ -263,21 +715,23 @@ class MTModel(models.Model):
         clone.save(force_insert=True)
 
         for name, filter_func in cascade.items():
-            mgr = getattr(self, name)
-            if mgr.__class__.__name__ == "ManyRelatedManager":  # M2M
-                clone_mgr = getattr(clone, name)
-                existing = set(clone_mgr.all())
-                new = set(filter_func(mgr.all()))
-                clone_mgr.add(*new.difference(existing))
-                clone_mgr.remove(*existing.difference(new))
-            elif mgr.__class__.__name__ == "RelatedManager":  # reverse FK
-                reverse_name = getattr(self.__class__, name).related.field.name
-                for obj in filter_func(mgr.all()):
-                    obj.clone(overrides={reverse_name: clone})
+            kind, relation = relations[name]
+            related = getattr(self, name).all()
+            if filter_func is not None:
+                related = filter_func(related)
+            if kind == "m2m":
+                targets = None
+                if filter_func is not None:
+                    # related objects are selected via the through table
+                    targets = list(related.values_list("pk", flat=True))
+                _clone_m2m_rows(relation, {self.pk: clone.pk}, targets)
+                continue
+            model, reverse_name = relation
+            if model.clone.im_func is MTModel.clone.im_func:
+                bulk_clone(related, overrides={reverse_name: clone}, user=user)
             else:
-                raise ValueError(
-                    "Cannot cascade-clone '{0}'; "
-                    "not a many-to-many or reverse foreignkey.".format(name))
+                for obj in related:
+                    obj.clone(overrides={reverse_name: clone}, user=user)
 
         return clone
 
@@ -289,7 +743,7 @@ class MTModel(models.Model):
         """
         if permanent:
             return super(MTModel, self).delete()
-        self._collector.delete(user)
+        soft_delete(self.__class__._base_manager.filter(pk=self.pk), user)
 
 
     def undelete(self, user=None):
@@ -364,18 +818,88 @@ class TeamModel(models.Model):
 
     If a ``TeamModel`` does not implement a ``parent`` property that returns
     its "parent" for purposes of team inheritance, it will be considered to be
-    the top of the inheritance chain and won't inherit a team.
+    the top of the inheritance chain and won't inherit a team. Models that do
+    should also name the parent foreign key in ``PARENT_FIELD``, so teams can
+    be resolved in bulk (see ``resolve_teams``).
 
     """
     has_team = models.BooleanField(default=False)
     own_team = models.ManyToManyField(User, blank=True)
 
+    PARENT_FIELD = None
+
 
     @property
     def team(self):
+        return self.team_owner.own_team
+
+
+    @property
+    def team_owner(self):
+        """Return the object (this one or an ancestor) whose team is used."""
         if self.has_team or self.parent is None:
-            return self.own_team
-        return self.parent.team
+            return self
+        return self.parent.team_owner
+
+
+    def team_members(self):
+        """
+        Return list of team members.
+
+        The list is cached on the team owner until its team changes.
+
+        """
+        owner = self.team_owner
+        if "_team_members" not in owner.__dict__:
+            owner._team_members = list(owner.own_team.all())
+        return owner._team_members
+
+
+    @classmethod
+    def resolve_teams(cls, objs):
+        """
+        Return dict mapping pk of each given object to list of team members.
+
+        Uncached parents are fetched a level at a time, and team members a
+        model at a time, so the number of queries doesn't depend on the
+        number of objects. Resolved members are cached as for
+        ``team_members``.
+
+        """
+        objs = list(objs)
+        level = objs
+        while level:
+            field_name = level[0].PARENT_FIELD
+            inheriting = [o for o in level if not o.has_team]
+            if field_name is None or not inheriting:
+                break
+            field = level[0]._meta.get_field(field_name)
+            cache_name = field.get_cache_name()
+            uncached = [o for o in inheriting if not hasattr(o, cache_name)]
+            if uncached:
+                parents = field.rel.to._base_manager.in_bulk(
+                    set(getattr(o, field.attname) for o in uncached))
+                for o in uncached:
+                    setattr(o, cache_name, parents[getattr(o, field.attname)])
+            level = _unique([getattr(o, cache_name) for o in inheriting])
+
+        unresolved = defaultdict(list)
+        for owner in _unique([o.team_owner for o in objs]):
+            if "_team_members" not in owner.__dict__:
+                unresolved[owner.__class__].append(owner)
+        for model, owners in unresolved.items():
+            field = model._meta.get_field("own_team")
+            members = defaultdict(list)
+            for row in field.rel.through.objects.filter(
+                    **{field.m2m_field_name() + "__in": owners}
+                    ).select_related(field.m2m_reverse_field_name()
+                    ).order_by("id"):
+                members[getattr(row, field.m2m_column_name())].append(
+                    getattr(row, field.m2m_reverse_field_name()))
+            for owner in owners:
+                owner._team_members = members[owner.pk]
+
+        return dict((o.pk, o.team_members()) for o in objs)
 
 
     def add_to_team(self, *users):
@@ -396,21 +920,39 @@ class TeamModel(models.Model):
 
 
 
-class DraftStatusModel(models.Model):
-    """
-    Model which has a status that can be draft, active, or disabled.
+def _unique(objs):
+    """Return list of given objects without repeats of the same instance."""
+    return dict((id(o), o) for o in objs).values()
 
-    Also provides ``activate`` and ``deactivate`` model methods.
 
-    """
-    STATUS = Choices("draft", "active", "disabled")
-    DEFAULT_STATUS = STATUS.draft
 
+def forget_team_members(sender, instance, reverse, **kwargs):
+    """Drop team members cached on an object whose own team changed."""
+    if reverse:
+        return
+    instance.__dict__.pop("_team_members", None)
 
-    status = models.CharField(
-        max_length=30, db_index=True, choices=STATUS, default=DEFAULT_STATUS)
 
 
+def connect_team_signals(sender, **kwargs):
+    """Drop cached team members of a TeamModel on changes to its team."""
+    if issubclass(sender, TeamModel) and not sender._meta.abstract:
+        m2m_changed.connect(
+            forget_team_members,
+            sender=sender._meta.get_field("own_team").rel.through,
+            )
+
+
+
+class BaseDraftStatusModel(models.Model):
+    """
+    Model with ``activate``, ``draft`` and ``deactivate`` methods.
+
+    Subclasses declare their own ``STATUS`` choices (including at least
+    draft, active and disabled) and ``status`` field; most should use
+    ``DraftStatusModel`` instead.
+
+    """
     def activate(self, user=None):
         """Activate this object."""
         self.status = self.STATUS.active
@@ -434,6 +976,26 @@ class DraftStatusModel(models.Model):
 
 
 
+class DraftStatusModel(BaseDraftStatusModel):
+    """
+    Model which has a status that can be draft, active, or disabled.
+
+    Also provides ``activate`` and ``deactivate`` model methods.
+
+    """
+    STATUS = Choices("draft", "active", "disabled")
+    DEFAULT_STATUS = STATUS.draft
+
+
+    status = models.CharField(
+        max_length=30, db_index=True, choices=STATUS, default=DEFAULT_STATUS)
+
+
+    class Meta:
+        abstract = True
+
+
+
 def set_default_status(sender, **kwargs):
     """Set the default status on a DraftStatusModel subclass."""
     if issubclass(sender, DraftStatusModel):
@@ -441,3 +1003,4 @@ def set_default_status(sender, **kwargs):
 
 
 class_prepared.connect(set_default_status)
+class_prepared.connect(connect_team_signals)
@@ -3,6 +3,7 @@ from tastypie import http
 from tastypie.resources import ALL, ALL_WITH_RELATIONS
 from tastypie.exceptions import ImmediateHttpResponse
 
+from .. import identity
 from .models import Tag
 from ..mtapi import MTResource
 from ..core.api import ProductResource
@@ -58,7 +59,11 @@ class TagResource(MTResource):
                 logger.debug('tag in use')
                 desired_product = bundle.data['product']
                 products = set(
-                    [cv.productversion.product for cv in caseversions]
+                    [
+                        identity.related(
+                            identity.related(cv, "productversion"), "product")
+                        for cv in caseversions
+                        ]
                     )
                 # if it is *changing* the product
                 if desired_product != tag.product:
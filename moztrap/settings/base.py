@@ -19,6 +19,8 @@ ADMINS = [
 
 MANAGERS = ADMINS
 
+# Bulk inserts work out the pks of inserted rows from LAST_INSERT_ID(), so
+# the MySQL server must have innodb_autoinc_lock_mode 0 or 1 (not 2).
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.mysql",
@@ -103,6 +105,7 @@ MIDDLEWARE_CLASSES = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "session_csrf.CsrfMiddleware",
     "moztrap.view.users.middleware.SetUsernameMiddleware",
+    "moztrap.view.utils.middleware.IdentityMapMiddleware",
 ]
 
 ROOT_URLCONF = "moztrap.view.urls"
@@ -242,3 +245,29 @@ SITE_URL = "http://localhost:8000"
 BROWSERID_CREATE_USER = "moztrap.model.core.auth.browserid_create_user"
 
 USE_BROWSERID = True
+
+# If True, activating or refreshing a run from the web UI queues a background
+# job rather than locking its caseversions inside the request. Queued jobs are
+# processed by the "process_run_jobs" management command, which must be kept
+# running. Their progress is reported through the cache, so it only shows
+# while they run if the cache backend is shared (e.g. memcached).
+RUN_JOBS_ASYNC = False
+
+# Seconds to cache the total count of a paginated list, per list and set of
+# filters; 0 counts on every render.
+PAGINATION_COUNT_CACHE_TIMEOUT = 0
+
+# Seconds to cache each user's set of permissions (direct and via roles); 0
+# queries them on every request. Cached sets are dropped when roles or
+# permissions change, so this requires a cache backend shared by all processes.
+PERMISSION_CACHE_TIMEOUT = 0
+
+# Above this many rows (as estimated by the database planner), paginated lists
+# show an approximate total rather than counting exactly; None always counts.
+PAGINATION_ESTIMATE_THRESHOLD = None
+
+# By default, keyword filters on case names, descriptions and steps match any
+# substring, by scanning the text of every caseversion (and its steps). If
+# True, they use the search index instead, and match the start of words only
+# ("log" finds "login", but "login" doesn't find "relogin").
+KEYWORD_SEARCH_INDEX = False
@@ -116,6 +116,23 @@ Copy local.sample.py to local.py and modify as needed.
 #    }
 #}
 
+# Uncomment this to activate and refresh runs in the background instead of
+# during the web request. Requires running "python manage.py process_run_jobs"
+# (e.g. under a process supervisor) to process the queued jobs, and a shared
+# cache backend (such as memcached, above) to report their progress.
+#RUN_JOBS_ASYNC = True
+
+# Uncomment these to cache list totals for a minute, and to show an estimated
+# "about N" total rather than counting lists with more than 100000 rows
+# (estimates are available on MySQL and PostgreSQL).
+#PAGINATION_COUNT_CACHE_TIMEOUT = 60
+#PAGINATION_ESTIMATE_THRESHOLD = 100000
+
+# Uncomment this to cache each user's permissions for ten minutes rather than
+# querying them on every request (notably API requests). Requires a cache
+# backend shared by all processes, such as memcached above.
+#PERMISSION_CACHE_TIMEOUT = 600
+
 # if DEBUG:
     # LOGGING["handlers"]["console"] = {
     #     "level": "DEBUG",
@@ -16,6 +16,7 @@ v1_api.register(execution.RunResource())
 v1_api.register(execution.RunCaseVersionResource())
 v1_api.register(execution.RunSuiteResource())
 v1_api.register(execution.ResultResource())
+v1_api.register(execution.BulkResultResource())
 v1_api.register(execution.SuiteSelectionResource())
 v1_api.register(library.CaseResource())
 v1_api.register(library.CaseVersionResource())
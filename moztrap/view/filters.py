@@ -107,8 +107,18 @@ class RunCaseVersionFilterSet(filters.FilterSet):
             ),
         filters.KeywordExactFilter(
             "id", lookup="caseversion__case__id", coerce=int),
-        filters.KeywordFilter("name", lookup="caseversion__name"),
-        filters.KeywordFilter("description", lookup="caseversion__description"),
+        cases.SearchFilter(
+            "name",
+            lookup="caseversion__name",
+            field="name",
+            caseversion_lookup="caseversion",
+            ),
+        cases.SearchFilter(
+            "description",
+            lookup="caseversion__description",
+            field="description",
+            caseversion_lookup="caseversion",
+            ),
         filters.ModelFilter(
             "tag",
             lookup="caseversion__tags",
@@ -129,12 +139,19 @@ class RunCaseVersionFilterSet(filters.FilterSet):
             key="productversion",
             queryset=model.ProductVersion.objects.all().order_by(
                 "product__name", "version")),
-        filters.KeywordFilter(
-            "instruction", lookup="caseversion__steps__instruction"),
-        filters.KeywordFilter(
+        cases.SearchFilter(
+            "instruction",
+            lookup="caseversion__steps__instruction",
+            field="instruction",
+            caseversion_lookup="caseversion",
+            ),
+        cases.SearchFilter(
             "expected result",
             lookup="caseversion__steps__expected",
-            key="expected"),
+            key="expected",
+            field="expected",
+            caseversion_lookup="caseversion",
+            ),
         filters.ModelFilter(
             "creator",
             lookup="caseversion__created_by",
@@ -157,18 +174,35 @@ class RunTestsRunCaseVersionFilterSet(filters.FilterSet):
     filters = [
         filters.KeywordExactFilter(
             "id", lookup="caseversion__case__id", coerce=int),
-        filters.KeywordFilter("name", lookup="caseversion__name"),
-        filters.KeywordFilter("description", lookup="caseversion__description"),
+        cases.SearchFilter(
+            "name",
+            lookup="caseversion__name",
+            field="name",
+            caseversion_lookup="caseversion",
+            ),
+        cases.SearchFilter(
+            "description",
+            lookup="caseversion__description",
+            field="description",
+            caseversion_lookup="caseversion",
+            ),
         filters.ModelFilter(
             "tag",
             lookup="caseversion__tags",
             queryset=model.Tag.objects.all().order_by("name")),
-        filters.KeywordFilter(
-            "instruction", lookup="caseversion__steps__instruction"),
-        filters.KeywordFilter(
+        cases.SearchFilter(
+            "instruction",
+            lookup="caseversion__steps__instruction",
+            field="instruction",
+            caseversion_lookup="caseversion",
+            ),
+        cases.SearchFilter(
             "expected result",
             lookup="caseversion__steps__expected",
-            key="expected"),
+            key="expected",
+            field="expected",
+            caseversion_lookup="caseversion",
+            ),
         filters.ModelFilter(
             "creator",
             lookup="caseversion__created_by",
@@ -240,8 +274,8 @@ class CaseVersionFilterSet(filters.FilterSet):
             choices=sorted(model.CaseVersion.STATUS),
             ),
         cases.PrefixIDFilter("id"),
-        filters.KeywordFilter("name"),
-        filters.KeywordFilter("description"),
+        cases.SearchFilter("name", field="name"),
+        cases.SearchFilter("description", field="description"),
         filters.ModelFilter(
             "tag",
             lookup="tags",
@@ -257,11 +291,13 @@ class CaseVersionFilterSet(filters.FilterSet):
             key="productversion",
             queryset=model.ProductVersion.objects.all().order_by(
                 "product__name", "version").select_related()),
-        filters.KeywordFilter("instruction", lookup="steps__instruction"),
-        filters.KeywordFilter(
+        cases.SearchFilter(
+            "instruction", lookup="steps__instruction", field="instruction"),
+        cases.SearchFilter(
             "expected result",
             lookup="steps__expected",
-            key="expected"),
+            key="expected",
+            field="expected"),
         filters.ModelFilter(
             "creator",
             lookup="created_by",
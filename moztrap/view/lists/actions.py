@@ -15,7 +15,9 @@ def actions(model, allowed_actions, permission=None, fall_through=False):
 
     Handles any POST keys named "action-method", where "method" must be in
     ``allowed_actions``. The value of the key should be an ID of a ``model``,
-    and "method" will be called on it, with any errors handled.
+    and "method" will be called on it, with any errors handled. If
+    ``allowed_actions`` is a dictionary, it maps action names to the names of
+    the model methods to call for them.
 
     By default, any "POST" request will be redirected back to the same URL
     (unless it's an AJAX request, in which case it sets the request method to
@@ -43,7 +45,10 @@ def actions(model, allowed_actions, permission=None, fall_through=False):
                         except model.DoesNotExist:
                             pass
                         else:
-                            getattr(obj, action)(user=request.user)
+                            method = action
+                            if isinstance(allowed_actions, dict):
+                                method = allowed_actions[action]
+                            getattr(obj, method)(user=request.user)
                             action_taken = True
                 if action_taken or not fall_through:
                     if request.is_ajax():
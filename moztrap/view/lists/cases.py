@@ -1,6 +1,9 @@
 from filters import KeywordFilter
+from django.conf import settings
 from django.db.models import Q
 
+from moztrap.model import SearchTerm
+
 
 class PrefixIDFilter(KeywordFilter):
     """
@@ -54,3 +57,49 @@ class PrefixIDFilter(KeywordFilter):
             return queryset.filter(query_filters).distinct()
 
         return queryset
+
+
+
+class SearchFilter(KeywordFilter):
+    """
+    A keyword filter on caseversion text, using the search index.
+
+    Rather than an ``icontains`` scan of ``lookup`` (joined through steps for
+    step fields), each value matches caseversions with a word starting with
+    each of its words in the indexed ``field`` (see ``SearchTerm``).
+    ``caseversion_lookup`` is the lookup from the filtered model to the
+    caseversion id. Values with no words (punctuation only) fall back to
+    ``icontains``.
+
+    Unlike ``icontains``, this finds words by their start only: "log" finds
+    "login", but "login" doesn't find "relogin". So the index is only used if
+    ``settings.KEYWORD_SEARCH_INDEX`` is True; by default, all values are
+    matched as substrings of ``lookup`` (slowly, as ``KeywordFilter`` does).
+
+    Values are ANDed.
+
+    """
+    def __init__(self, name, field, caseversion_lookup="id", **kwargs):
+        self.field = field
+        self.caseversion_lookup = caseversion_lookup
+        super(SearchFilter, self).__init__(name, **kwargs)
+
+
+    def filter(self, queryset, values):
+        if not settings.KEYWORD_SEARCH_INDEX:
+            return super(SearchFilter, self).filter(queryset, values)
+        scanned = False
+        for value in values:
+            ids = SearchTerm.matching(self.field, value)
+            if ids is None:
+                queryset = queryset.filter(
+                    **{"{0}__icontains".format(self.lookup): value})
+                scanned = True
+            else:
+                queryset = queryset.filter(
+                    **{"{0}__in".format(self.caseversion_lookup): ids})
+
+        if scanned:
+            return queryset.distinct()
+
+        return queryset
@@ -2,8 +2,23 @@
 List pagination utilities.
 
 """
+import base64
+import datetime
+import decimal
+import hashlib
+import json
 import math
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.sql.datastructures import EmptyResultSet
 from django.db.utils import DatabaseError
+
 from ..utils.querystring import update_querystring
 
 
@@ -26,8 +41,35 @@ def from_request(request):
 
 
 
+def cursor_from_request(request):
+    """Given a request, return its pagination cursor, or None."""
+    return request.GET.get("cursor") or None
+
+
+
+def count_cache_key(queryset):
+    """
+    Return cache key for the total count of ``queryset``, or None.
+
+    The key is derived from the queryset's SQL and parameters (without its
+    ordering), so it differs for every filter that applies to the list:
+    those in the querystring, those pinned in cookies, and any the view adds
+    itself. Return None if the queryset can't match anything.
+
+    """
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    return "pagination-count:{0}:{1}".format(
+        queryset.model._meta.db_table,
+        hashlib.md5(repr((sql, tuple(params)))).hexdigest(),
+        )
+
+
+
 def pagesize_url(url, pagesize):
-    return update_querystring(url, pagesize=pagesize, pagenumber=1)
+    return update_querystring(url, pagesize=pagesize, pagenumber=1, cursor=None)
 
 
 
@@ -36,13 +78,26 @@ def pagenumber_url(url, pagenumber):
 
 
 
+def cursor_url(url, cursor):
+    return update_querystring(url, cursor=cursor, pagenumber=None)
+
+
+
 class Pager(object):
     """Handles pagination given queryset, page size, and page number."""
-    def __init__(self, queryset, pagesize, pagenumber):
-        """Initialize a ``Pager`` with queryset, page size, and page number."""
+    def __init__(self, queryset, pagesize, pagenumber, count_key=None):
+        """
+        Initialize a ``Pager`` with queryset, page size, and page number.
+
+        If ``count_key`` is given, the total is cached under that key for
+        ``settings.PAGINATION_COUNT_CACHE_TIMEOUT`` seconds.
+
+        """
         self._queryset = queryset
         self._sliced_qs = None
         self._cached_total = None
+        self._approximate = False
+        self._count_key = count_key
         self.pagesize = pagesize
         self.pagenumber = pagenumber
 
@@ -91,20 +146,28 @@ class Pager(object):
 
     @property
     def total(self):
-        """The total number of objects."""
+        """The total number of objects (possibly estimated)."""
         if self._cached_total is None:
-            # @@@ Django 1.5 should not require the .values part and could be
-            # changed to just:
-            #     self._cached_total = self._queryset.count()
-            # Bug 18248
-            try:
-                self._cached_total = self._queryset.count()
-            except DatabaseError:
-                self._cached_total = self._queryset.values("id").count()
+            timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+            counted = None
+            if self._count_key and timeout:
+                counted = cache.get(self._count_key)
+            if counted is None:
+                counted = count_total(self._queryset)
+                if self._count_key and timeout:
+                    cache.set(self._count_key, counted, timeout)
+            self._cached_total, self._approximate = counted
 
         return self._cached_total
 
 
+    @property
+    def approximate(self):
+        """True if the total is the database's estimate, not an exact count."""
+        self.total  # counting determines whether the total is approximate
+        return self._approximate
+
+
     @property
     def objects(self):
         """
@@ -164,6 +227,316 @@ class Pager(object):
 
 
 
+def count_total(queryset):
+    """
+    Return tuple (total, approximate) counting the objects in ``queryset``.
+
+    If the database planner estimates at least
+    ``settings.PAGINATION_ESTIMATE_THRESHOLD`` rows, that estimate is
+    returned (with ``approximate`` True) rather than counting exactly.
+
+    """
+    threshold = settings.PAGINATION_ESTIMATE_THRESHOLD
+    if threshold is not None:
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate >= threshold:
+            return estimate, True
+
+    # @@@ Django 1.5 should not require the .values part and could be
+    # changed to just:
+    #     return queryset.count(), False
+    # Bug 18248
+    try:
+        return queryset.count(), False
+    except DatabaseError:
+        return queryset.values("id").count(), False
+
+
+
+def estimate_count(queryset):
+    """
+    Return the database planner's estimate of rows in ``queryset``, or None.
+
+    Estimates come from EXPLAIN on MySQL (the estimate for the driving
+    table of the join) and PostgreSQL; for other databases (or a query that
+    can't be explained) return None.
+
+    """
+    connection = connections[queryset.db]
+    if connection.vendor not in ["mysql", "postgresql"]:
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute("EXPLAIN " + sql, params)
+        rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+
+    if connection.vendor == "mysql":
+        # one row per table, in join order, estimating the rows examined in
+        # it for each row of the tables before it; the first (driving) table
+        # estimates the rows listed, without the fan-out of joins
+        column = [c[0] for c in cursor.description].index("rows")
+        return rows[0][column] if rows else None
+    match = re.search(r"rows=(\d+)", rows[0][0]) if rows else None
+    return int(match.group(1)) if match else None
+
+
+
+class KeysetPager(object):
+    """
+    Handles keyset pagination given queryset, page size, and cursor.
+
+    Rather than slicing at an offset and counting the whole queryset, each
+    page is found by filtering for the rows that follow (or precede) the edge
+    of the adjacent page in the queryset's sort order, so a deep page costs
+    the same as the first. Page positions are passed around as opaque
+    cursors; a missing, invalid or stale cursor gives the first page.
+
+    """
+    keyset = True
+
+
+    def __init__(self, queryset, pagesize, cursor=None, ordering=None):
+        """
+        Initialize a ``KeysetPager`` with queryset, page size, and cursor.
+
+        ``ordering`` is the ``keyset_ordering`` of ``queryset``, if already
+        known; the queryset must have one.
+
+        """
+        self._queryset = queryset
+        self._ordering = ordering or keyset_ordering(queryset)
+        self._objects = None
+        self._has_prev = False
+        self._has_next = False
+        self.pagesize = pagesize
+        self.cursor = cursor
+
+
+    def sizes(self):
+        """
+        Returns an ordered list of pagesize links to display.
+
+        Includes all default page sizes, plus the current page size.
+
+        """
+        return sorted(set(PAGESIZES + [self.pagesize]))
+
+
+    @property
+    def objects(self):
+        """
+        The list of objects on the current page.
+
+        Fetches one object more than the page size, to know whether there is
+        a following page without counting.
+
+        """
+        if self._objects is None:
+            queryset = self._queryset
+            forward = True
+            position = decode_cursor(
+                self.cursor, queryset.model, self._ordering)
+            if position is not None:
+                values, forward = position
+                queryset = queryset.filter(
+                    _keyset_filter(self._ordering, values, forward))
+            order_by = [
+                ("-" if descending == forward else "") + path
+                for path, descending in self._ordering
+                ]
+            objects = list(queryset.order_by(*order_by)[:self.pagesize + 1])
+            more = len(objects) > self.pagesize
+            objects = objects[:self.pagesize]
+            if forward:
+                self._has_prev = position is not None
+                self._has_next = more
+            else:
+                objects.reverse()
+                self._has_prev = more
+                self._has_next = True
+            self._objects = objects
+        return self._objects
+
+
+    @property
+    def prev_cursor(self):
+        """Cursor for the previous page; None if no previous page."""
+        if not (self.objects and self._has_prev):
+            return None
+        return encode_cursor(
+            self._ordering,
+            _keyset_values(self.objects[0], self._ordering),
+            forward=False,
+            )
+
+
+    @property
+    def next_cursor(self):
+        """Cursor for the next page; None if there is no next page."""
+        if not (self.objects and self._has_next):
+            return None
+        return encode_cursor(
+            self._ordering,
+            _keyset_values(self.objects[-1], self._ordering),
+            forward=True,
+            )
+
+
+
+def keyset_ordering(queryset):
+    """
+    Return list of (field path, descending) keying ``queryset``, or None.
+
+    This is the queryset's ``order_by`` (or else its model's default
+    ordering), with the primary key appended to break ties. If any ordering
+    can't serve as a key (random or extra ordering, relations, multi-valued
+    or nullable fields) return None; such querysets can only be paginated by
+    offset.
+
+    """
+    query = queryset.query
+    if query.extra_order_by:
+        return None
+    if query.order_by:
+        fields = list(query.order_by)
+    elif query.default_ordering:
+        fields = list(query.model._meta.ordering)
+    else:
+        fields = []
+
+    pk_name = query.model._meta.pk.name
+    ordering = []
+    for field in fields:
+        descending = field.startswith("-")
+        path = field.lstrip("-")
+        if path == "pk":
+            path = pk_name
+        if _order_field(query.model, path) is None:
+            return None
+        ordering.append((path, descending))
+    if pk_name not in [path for path, descending in ordering]:
+        ordering.append((pk_name, ordering[-1][1] if ordering else False))
+    return ordering
+
+
+
+def encode_cursor(ordering, values, forward):
+    """
+    Return opaque cursor for the position ``values`` in ``ordering``.
+
+    ``forward`` is True for a cursor to the objects following the position,
+    False for a cursor to the objects preceding it.
+
+    """
+    data = {
+        "o": _ordering_names(ordering),
+        "v": [
+            unicode(v)
+            if isinstance(v, (datetime.date, datetime.time, decimal.Decimal))
+            else v
+            for v in values
+            ],
+        "f": forward,
+        }
+    return base64.urlsafe_b64encode(json.dumps(data))
+
+
+
+def decode_cursor(cursor, model, ordering):
+    """
+    Return (values, forward) tuple from ``cursor``, or None.
+
+    Returns None for a missing or invalid cursor, and for one encoded for a
+    different ordering (e.g. before the list was re-sorted).
+
+    """
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        if data["o"] != _ordering_names(ordering):
+            return None
+        values = [
+            _order_field(model, path).to_python(value)
+            for (path, descending), value in zip(ordering, data["v"])
+            ]
+        if len(values) != len(ordering):
+            return None
+        return values, bool(data["f"])
+    except (TypeError, ValueError, KeyError, ValidationError):
+        return None
+
+
+
+def _ordering_names(ordering):
+    """Return ``order_by`` names for given keyset ordering."""
+    return [("-" if descending else "") + path for path, descending in ordering]
+
+
+
+def _order_field(model, path):
+    """
+    Return the field at lookup ``path`` from ``model``, if it can be a key.
+
+    Following only non-null forward foreign keys, the path must end at a
+    non-null, non-relation field; otherwise return None.
+
+    """
+    opts = model._meta
+    bits = path.split("__")
+    for i, bit in enumerate(bits):
+        try:
+            field, m, direct, m2m = opts.get_field_by_name(bit)
+        except FieldDoesNotExist:
+            return None
+        if not direct or m2m or field.null:
+            return None
+        if i == len(bits) - 1:
+            return field if field.rel is None else None
+        if field.rel is None:
+            return None
+        opts = field.rel.to._meta
+
+
+
+def _keyset_filter(ordering, values, forward):
+    """
+    Return Q for objects after (or, if not ``forward``, before) ``values``.
+
+    For ordering (a, b, id) and values (x, y, z) ascending, objects after
+    are those with a > x, or a = x and b > y, or a = x, b = y and id > z.
+
+    """
+    q = None
+    for i, (path, descending) in enumerate(ordering):
+        op = "gt" if descending != forward else "lt"
+        term = Q(**{"{0}__{1}".format(path, op): values[i]})
+        for (prev_path, d), value in zip(ordering[:i], values[:i]):
+            term &= Q(**{prev_path: value})
+        q = term if q is None else q | term
+    return q
+
+
+
+def _keyset_values(obj, ordering):
+    """Return the values of ``obj`` for the fields of ``ordering``."""
+    values = []
+    for path, descending in ordering:
+        value = obj
+        for bit in path.split("__"):
+            value = getattr(value, bit)
+        values.append(value)
+    return values
+
+
+
 def positive_integer(val, default):
     """Attempt to coerce ``val`` to a positive integer, with fallback."""
     try:
@@ -2,10 +2,11 @@
 Template tags for pagination.
 
 """
+from django.conf import settings
 from django.template import Library
 
 from classytags.core import Tag, Options
-from classytags.arguments import Argument
+from classytags.arguments import Argument, Flag
 
 from .. import pagination
 
@@ -16,20 +17,40 @@ register = Library()
 
 
 class Paginate(Tag):
-    """Paginate the given queryset, placing a Pager in the template context."""
+    """
+    Paginate the given queryset, placing a Pager in the template context.
+
+    With the ``keyset`` flag, places a KeysetPager instead, if the queryset's
+    sort order allows it.
+
+    """
     name = "paginate"
     options = Options(
         Argument("queryset"),
         "as",
         Argument("varname", resolve=False),
+        Flag("keyset", true_values=["keyset"], default=False),
         )
 
 
-    def render_tag(self, context, queryset, varname):
+    def render_tag(self, context, queryset, varname, keyset):
         """Place Pager for given ``queryset`` in context as ``varname``."""
         request = context["request"]
         pagesize, pagenum = pagination.from_request(request)
-        context[varname] = pagination.Pager(queryset, pagesize, pagenum)
+        ordering = pagination.keyset_ordering(queryset) if keyset else None
+        if ordering is not None:
+            context[varname] = pagination.KeysetPager(
+                queryset,
+                pagesize,
+                pagination.cursor_from_request(request),
+                ordering,
+                )
+        else:
+            count_key = None
+            if settings.PAGINATION_COUNT_CACHE_TIMEOUT:
+                count_key = pagination.count_cache_key(queryset)
+            context[varname] = pagination.Pager(
+                queryset, pagesize, pagenum, count_key)
         return u""
 
 
@@ -44,6 +65,13 @@ def pagenumber_url(request, pagenumber):
 
 
 
+@register.filter
+def cursor_url(request, cursor):
+    """Return current full URL with pagination cursor replaced."""
+    return pagination.cursor_url(request.get_full_path(), cursor)
+
+
+
 @register.filter
 def pagesize_url(request, pagesize):
     """Return current full URL with pagesize replaced."""
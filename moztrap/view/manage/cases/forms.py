@@ -7,6 +7,8 @@ from django.forms.models import inlineformset_factory, BaseInlineFormSet
 from django.db.models import Max
 import floppyforms as forms
 
+from moztrap.model.mtmodel import bulk_create_with_pks, bulk_insert
+
 from .... import model
 
 from ...utils import mtforms
@@ -189,7 +191,6 @@ class AddCaseForm(BaseAddCaseForm, BaseCaseVersionForm, BaseCaseForm):
             )
 
         version_kwargs["case"] = case
-        version_kwargs["user"] = self.user
 
         del version_kwargs["add_tags"]
         del version_kwargs["add_attachment"]
@@ -214,8 +215,9 @@ class AddCaseForm(BaseAddCaseForm, BaseCaseVersionForm, BaseCaseForm):
         for productversion in productversions:
             this_version_kwargs = version_kwargs.copy()
             this_version_kwargs["productversion"] = productversion
-            caseversion = model.CaseVersion.objects.create(
-                **this_version_kwargs)
+            caseversion = model.CaseVersion(**this_version_kwargs)
+            # the steps formset indexes the caseversion once its steps are in
+            caseversion.save(user=self.user, skip_index=True)
             steps_formset = StepFormSet(
                 data=self.data, instance=caseversion)
             steps_formset.save(user=self.user)
@@ -259,7 +261,14 @@ class AddBulkCaseForm(BaseAddCaseForm, BaseCaseForm):
 
 
     def save(self):
-        """Create and return the new case(s) and version(s)."""
+        """
+        Create and return the new case(s) and version(s).
+
+        Cases, their suite memberships, versions, steps and tags are each
+        inserted in batches, and latest versions are marked once for all
+        cases, so the number of queries grows per batch, not per case.
+
+        """
         assert self.is_valid()
 
         product = self.cleaned_data["product"]
@@ -273,52 +282,79 @@ class AddBulkCaseForm(BaseAddCaseForm, BaseCaseForm):
                     order__gt=productversions[0].order))
 
         suite = self.cleaned_data.get("suite")
+        cases_data = self.cleaned_data["cases"]
+        if not cases_data:
+            return []
 
-        cases = []
+        # created-on and modified-on timestamps default to now
+        stamps = {"created_by": self.user, "modified_by": self.user}
+
+        cases = [
+            model.Case(product=product, idprefix=idprefix, **stamps)
+            for case_data in cases_data
+            ]
+        bulk_create_with_pks(cases)
 
-        order = 0
         if suite:
             order = model.SuiteCase.objects.filter(
                 suite=suite,
                 ).aggregate(Max("order"))["order__max"] or 0
-
-        for case_data in self.cleaned_data["cases"]:
-            case = model.Case.objects.create(
-                product=product,
-                user=self.user,
-                idprefix=idprefix,
+            bulk_insert(
+                [
+                    model.SuiteCase(
+                        case=case, suite=suite, order=order + i, **stamps)
+                    for i, case in enumerate(cases, 1)
+                    ]
                 )
 
-            version_kwargs = case_data.copy()
-            steps_data = version_kwargs.pop("steps")
-
-            version_kwargs["case"] = case
-            version_kwargs["status"] = self.cleaned_data["status"]
-            version_kwargs["user"] = self.user
+        caseversions = [
+            model.CaseVersion(
+                case=case,
+                productversion=productversion,
+                name=case_data["name"],
+                description=case_data.get("description", ""),
+                status=self.cleaned_data["status"],
+                **stamps)
+            for case, case_data in zip(cases, cases_data)
+            for productversion in productversions
+            ]
+        bulk_create_with_pks(caseversions)
+
+        steps_data = [
+            case_data["steps"]
+            for case_data in cases_data
+            for productversion in productversions
+            ]
+        bulk_insert(
+            [
+                model.CaseStep(
+                    caseversion=caseversion,
+                    number=i,
+                    **dict(step_kwargs, **stamps))
+                for caseversion, steps in zip(caseversions, steps_data)
+                for i, step_kwargs in enumerate(steps, 1)
+                ]
+            )
 
-            if suite:
-                order += 1
-                model.SuiteCase.objects.create(
-                    case=case,
-                    suite=suite,
-                    user=self.user,
-                    order=order,
-                    )
+        TagCV = model.CaseVersion.tags.through
+        bulk_insert(
+            [
+                TagCV(caseversion_id=caseversion.id, tag_id=tag_id)
+                for caseversion in caseversions
+                for tag_id in self.cleaned_data.get("tags", set())
+                ]
+            )
 
-            for productversion in productversions:
-                this_version_kwargs = version_kwargs.copy()
-                this_version_kwargs["productversion"] = productversion
-                caseversion = model.CaseVersion.objects.create(
-                    **this_version_kwargs)
-                for i, step_kwargs in enumerate(steps_data, 1):
-                    model.CaseStep.objects.create(
-                        user=self.user,
-                        caseversion=caseversion,
-                        number=i,
-                        **step_kwargs)
-                self.save_tags(caseversion)
-
-            cases.append(case)
+        for productversion in productversions:
+            model.CaseVersion._add_envs(
+                [
+                    cv for cv in caseversions
+                    if cv.productversion_id == productversion.id
+                    ],
+                productversion.environments.all(),
+                )
+        model.SearchTerm.index([cv.id for cv in caseversions])
+        model.CaseVersion._update_latest(caseversions)
 
         return cases
 
@@ -365,7 +401,8 @@ class EditCaseVersionForm(mtforms.SaveIfValidMixin,
             self.instance.case.idprefix = idprefix
             self.instance.case.save(force_update=True)
 
-        self.instance.save(force_update=True)
+        # the steps formset indexes the caseversion once its steps are saved
+        self.instance.save(force_update=True, skip_index=True)
 
         self.save_new_tags(self.instance.case.product)
         self.save_tags(self.instance)
@@ -396,7 +433,7 @@ class BaseStepFormSet(BaseInlineFormSet):
 
 
     def save(self, user=None):
-        """Save all forms in this formset."""
+        """Save all forms in this formset, then index the caseversion once."""
         assert self.is_valid()
 
         to_delete = set([o.pk for o in self.get_queryset()])
@@ -421,10 +458,12 @@ class BaseStepFormSet(BaseInlineFormSet):
         self.model._base_manager.filter(pk__in=to_delete).delete()
 
         for step in existing:
-            step.save(user=user, force_update=True)
+            step.save(user=user, force_update=True, skip_index=True)
 
         for step in new:
-            step.save(user=user, force_insert=True)
+            step.save(user=user, force_insert=True, skip_index=True)
+
+        model.SearchTerm.index([self.instance.pk])
 
         return steps
 
@@ -71,9 +71,11 @@ def profile_add(request):
         form = forms.AddProfileForm(request.POST, user=request.user)
         profile = form.save_if_valid()
         if profile is not None:
+            count = profile.environments.count()
             messages.success(
-                request, u"Profile '{0}' added.".format(
-                    profile.name)
+                request,
+                u"Profile '{0}' added with {1} environment{2}.".format(
+                    profile.name, count, "" if count == 1 else "s")
                 )
             return redirect("manage_profiles")
     else:
@@ -124,9 +126,7 @@ def profile_edit(request, profile_id):
                 messages.error(
                     request, "Please select some environment elements.")
             else:
-                env = model.Environment.objects.create(
-                    profile=profile, user=request.user)
-                env.elements.add(*element_ids)
+                profile.add_environments([element_ids], user=request.user)
 
     return TemplateResponse(
         request,
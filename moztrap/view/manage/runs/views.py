@@ -2,6 +2,9 @@
 Manage views for runs.
 
 """
+import json
+
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
 from django.views.decorators.cache import never_cache
@@ -28,7 +31,14 @@ from . import forms
 @login_maybe_required
 @lists.actions(
     model.Run,
-    ["delete", "clone", "activate", "draft", "deactivate", "refresh"],
+    {
+        "delete": "delete",
+        "clone": "clone",
+        "activate": "queue_activation",
+        "draft": "draft",
+        "deactivate": "deactivate",
+        "refresh": "queue_refresh",
+        },
     permission="execution.manage_runs")
 @lists.finder(ManageFinder)
 @lists.filter("runs", filterset_class=RunFilterSet)
@@ -63,6 +73,25 @@ def run_details(request, run_id):
 
 
 
+@never_cache
+@permission_required("execution.manage_runs")
+def run_progress(request, run_id):
+    """Return JSON status and progress of a run's latest activation job."""
+    run = get_object_or_404(model.Run, pk=run_id)
+    job = run.latest_job()
+    return HttpResponse(
+        json.dumps(
+            {
+                "run": run.id,
+                "status": run.status,
+                "job": job.progress() if job is not None else None,
+                }
+            ),
+        content_type="application/json",
+        )
+
+
+
 @never_cache
 @permission_required("execution.manage_runs")
 def run_add(request):
@@ -80,6 +80,11 @@ urlpatterns = patterns(
         "runs.views.run_details",
         name="manage_run_details"),
 
+    # ajax activation progress
+    url(r"^runs/_progress/(?P<run_id>\d+)/$",
+        "runs.views.run_progress",
+        name="manage_run_progress"),
+
     # add
     url(r"^run/add/$",
         "runs.views.run_add",
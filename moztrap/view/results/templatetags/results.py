@@ -28,3 +28,19 @@ def percentage(val):
     else:
         val = math.ceil(val)
     return int(val)
+
+
+
+@register.filter
+def with_result_summaries(objects):
+    """
+    Prefetch result summaries for a page of runs or runcaseversions.
+
+    Returns the objects as a list, so the summaries are fetched in one query
+    rather than one per object.
+
+    """
+    objects = list(objects)
+    if objects:
+        objects[0].prefetch_result_summaries(objects)
+    return objects
@@ -5,12 +5,124 @@ from classytags.core import Tag, Options
 from classytags.arguments import Argument
 
 from .... import model
+from ....model import identity
 
 
 
 register = template.Library()
 
 
+# context variable where ``prefetch_results_for`` places a PrefetchedResults
+PREFETCHED_RESULTS = "prefetched_results"
+
+
+
+class PrefetchedResults(object):
+    """
+    Results for a page of runcaseversions, for one user and environment.
+
+    Fetches the user's latest results, other users' latest completed or
+    skipped results, and the step results of the user's results in a fixed
+    number of queries, so that ``result_for``, ``other_result_for`` and
+    ``stepresult_for`` don't need queries for each runcaseversion or step.
+
+    """
+    def __init__(self, runcaseversions, user, environment):
+        """Fetch results for given runcaseversions, user and environment."""
+        self.rcv_ids = set(rcv.id for rcv in runcaseversions)
+        self.user_id = user.id
+        self.environment_id = environment.id
+        self.results = {}
+        self.other_results = {}
+        self.stepresults = {}
+        if not self.rcv_ids:
+            return
+
+        dupes = set()
+        for result in model.Result.objects.filter(
+                runcaseversion__in=self.rcv_ids,
+                environment=environment,
+                tester=user,
+                is_latest=True,
+                ).order_by("-modified_on"):
+            if result.runcaseversion_id in self.results:
+                dupes.add(result.runcaseversion_id)
+            else:
+                self.results[result.runcaseversion_id] = result
+        for rcv_id in dupes:
+            _repair_latest(self.results[rcv_id])
+
+        for result in model.Result.objects.filter(
+                runcaseversion__in=self.rcv_ids,
+                environment=environment,
+                is_latest=True,
+                status__in=(model.Result.COMPLETED_STATES +
+                    [model.Result.STATUS.skipped]),
+                ).exclude(tester=user).select_related("tester").order_by(
+                "-modified_on"):
+            # the same few testers are shared by many results
+            result.tester = identity.add(result.tester)
+            self.other_results.setdefault(result.runcaseversion_id, result)
+
+        result_ids = [r.id for r in self.results.values()]
+        if result_ids:
+            for stepresult in model.StepResult.objects.filter(
+                    result__in=result_ids):
+                self.stepresults[
+                    (stepresult.result_id, stepresult.step_id)] = stepresult
+
+
+    def covers(self, runcaseversion, user, environment):
+        """Return True if results for these arguments were prefetched."""
+        return (
+            runcaseversion.id in self.rcv_ids and
+            user.id == self.user_id and
+            environment.id == self.environment_id
+            )
+
+
+    def covers_result(self, result):
+        """Return True if step results of given result were prefetched."""
+        return result.runcaseversion_id in self.results and (
+            self.results[result.runcaseversion_id].id == result.id)
+
+
+
+def _repair_latest(result):
+    """Make ``result`` the only latest of its user's duplicate latests."""
+    result.set_latest()
+    result.save()
+    model.RunEnvironmentSummary.rebuild([result.runcaseversion.run_id])
+
+
+
+class PrefetchResultsFor(Tag):
+    """
+    Prefetches results for a page of runcaseversions into the context.
+
+    The ``result_for``, ``other_result_for`` and ``stepresult_for`` tags
+    then read from the prefetched results instead of querying.
+
+    """
+    name = "prefetch_results_for"
+    options = Options(
+        Argument("runcaseversions"),
+        Argument("user"),
+        Argument("environment"),
+        )
+
+
+    def render_tag(self, context, runcaseversions, user, environment):
+        """Place PrefetchedResults in context."""
+        context[PREFETCHED_RESULTS] = PrefetchedResults(
+            runcaseversions, user, environment)
+        return u""
+
+
+register.tag(PrefetchResultsFor)
+
+
+
 class ResultFor(Tag):
     """
     Places Result for this runcaseversion/user/env in context.
@@ -37,17 +149,23 @@ class ResultFor(Tag):
             runcaseversion=runcaseversion,
             is_latest=True,
             )
-        try:
-            result = model.Result.objects.get(**result_kwargs)
-        except model.Result.DoesNotExist:
-            result = model.Result(**result_kwargs)
-        except model.Result.MultipleObjectsReturned:
-            # find the latest one and set it to latest, which will set all
-            # others to is_latest=False
-            result = model.Result.objects.filter(**result_kwargs).order_by(
-                "-modified_on")[0]
-            result.set_latest()
-            result.save()
+        prefetched = context.get(PREFETCHED_RESULTS)
+        if prefetched is not None and prefetched.covers(
+                runcaseversion, user, environment):
+            result = prefetched.results.get(runcaseversion.id)
+            if result is None:
+                result = model.Result(**result_kwargs)
+        else:
+            try:
+                result = model.Result.objects.get(**result_kwargs)
+            except model.Result.DoesNotExist:
+                result = model.Result(**result_kwargs)
+            except model.Result.MultipleObjectsReturned:
+                # find the latest one and set it to latest, which will set all
+                # others to is_latest=False
+                result = model.Result.objects.filter(
+                    **result_kwargs).order_by("-modified_on")[0]
+                _repair_latest(result)
 
         context[varname] = result
         return u""
@@ -75,6 +193,12 @@ class OtherResultFor(Tag):
     def render_tag(self, context, runcaseversion, user, environment, varname):
         """Get/construct Result and place it in context under ``varname``"""
 
+        prefetched = context.get(PREFETCHED_RESULTS)
+        if prefetched is not None and prefetched.covers(
+                runcaseversion, user, environment):
+            context[varname] = prefetched.other_results.get(runcaseversion.id)
+            return u""
+
         # if the result.status is pending or assigned, then we try to find a result
         # from another user to return instead.
         include_kwargs = dict(
@@ -127,9 +251,20 @@ class StepResultFor(Tag):
             result=result,
             step=casestep,
             )
-        try:
-            stepresult = model.StepResult.objects.get(**stepresult_kwargs)
-        except model.StepResult.DoesNotExist:
+        prefetched = context.get(PREFETCHED_RESULTS)
+        stepresult = None
+        # an unsaved result can't have step results
+        if result.pk is not None:
+            if prefetched is not None and prefetched.covers_result(result):
+                stepresult = prefetched.stepresults.get(
+                    (result.id, casestep.id))
+            else:
+                try:
+                    stepresult = model.StepResult.objects.get(
+                        **stepresult_kwargs)
+                except model.StepResult.DoesNotExist:
+                    pass
+        if stepresult is None:
             stepresult = model.StepResult(**stepresult_kwargs)
 
         context[varname] = stepresult
@@ -13,6 +13,7 @@ from django.views.decorators.cache import never_cache
 from django.contrib import messages
 
 from ... import model
+from ...model import identity
 
 from ..filters import RunTestsRunCaseVersionFilterSet
 from ..lists import decorators as lists
@@ -230,19 +231,23 @@ def run(request, run_id, env_id):
                 ["'{0}'".format(x) for x in model.Result.PENDING_STATES]
                 )))
 
+    productversion = identity.related(run, "productversion")
+    product = identity.related(productversion, "product")
+
     return TemplateResponse(
         request,
         "runtests/run.html",
         {
             "environment": environment,
-            "product": run.productversion.product,
-            "productversion": run.productversion,
+            "product": product,
+            "productversion": productversion,
             "run": run,
             "envform": envform,
             "runcaseversions": run.runcaseversions.select_related(
                 "caseversion").prefetch_related(
                     "caseversion__tags",
                     "caseversion__case__suites",
+                    "caseversion__steps",
                     ).filter(
                         environments=environment,
                         ).extra(select={
@@ -251,9 +256,9 @@ def run(request, run_id, env_id):
                 # finder decorator populates top column (products), we
                 # prepopulate the other two columns
                 "productversions": model.ProductVersion.objects.filter(
-                    product=run.productversion.product),
+                    product=product),
                 "runs": model.Run.objects.order_by("name").filter(
-                    productversion=run.productversion,
+                    productversion=productversion,
                     status=model.Run.STATUS.active),
                 },
             }
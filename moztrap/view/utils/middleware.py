@@ -0,0 +1,30 @@
+"""
+Request-scoped identity map middleware.
+
+"""
+import logging
+
+from moztrap.model import identity
+
+
+
+logger = logging.getLogger("moztrap.model.identity")
+
+
+
+class IdentityMapMiddleware(object):
+    """Activates an identity map for each request; logs its hits and misses."""
+    def process_request(self, request):
+        """Start a fresh identity map for this request."""
+        identity.activate()
+
+
+    def process_response(self, request, response):
+        """End the request's identity map, logging its stats."""
+        identity_map = identity.deactivate()
+        if identity_map is not None:
+            for label, (hits, misses) in sorted(identity_map.stats().items()):
+                logger.debug(
+                    "%s %s: %s hits, %s misses",
+                    request.path, label, hits, misses)
+        return response
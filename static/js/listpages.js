@@ -19,6 +19,7 @@ var MT = (function (MT, $) {
                 $.get(url, function (data) {
                     content.loadingOverlay('remove');
                     content.html(data.html);
+                    MT.pollRunProgress(content);
                 });
             } else { content.css('min-height', '0px'); }
             $(this).blur();
@@ -26,6 +27,32 @@ var MT = (function (MT, $) {
         });
     };
 
+    // Show progress of runs being activated, until they're done
+    MT.pollRunProgress = function (context) {
+        $(context).find('[data-progress-url]').each(function () {
+            var note = $(this),
+                url = note.data('progress-url'),
+                poll = function () {
+                    // stop once the note is no longer shown
+                    if (!$.contains(document.documentElement, note.get(0))) { return; }
+                    $.get(url, function (data) {
+                        var job = data.job;
+                        if (job && job.status === 'failed') {
+                            note.text('Activating this run failed: ' + job.error);
+                        } else if (data.status !== 'activating') {
+                            note.text('This run is now ' + data.status + '; reload the page to run its tests.');
+                        } else {
+                            if (job && job.total) {
+                                note.text('This run is being activated: ' + job.locked + ' of ' + job.total + ' cases locked.');
+                            }
+                            window.setTimeout(poll, 2000);
+                        }
+                    });
+                };
+            poll();
+        });
+    };
+
     // Expand list item details on direct hashtag links
     MT.openListItemDetails = function (context) {
         if ($(context).length && window.location.hash && $(window.location.hash).length) {
@@ -14,4 +14,5 @@ and admin sub-modules.
 from . import admin
 from . import api
 from . import view
-from .base import TestCase, DBTestCase, TransactionTestCase
+from .base import (
+    TestCase, DBTestCase, TransactionTestCase, UnmanagedTestCase)
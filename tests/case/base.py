@@ -47,6 +47,30 @@ class TransactionTestCase(DBMixin, django_test.TransactionTestCase):
 
 
 
+class UnmanagedTestCase(TransactionTestCase):
+    """
+    Test case run outside any transaction management.
+
+    This is the state of a fresh process, such as a shell or a management
+    command not wrapped in a transaction decorator.
+
+    """
+    def setUp(self):
+        from django.db import connection
+        self._transaction_state = (
+            connection.transaction_state, connection._dirty)
+        connection.transaction_state, connection._dirty = [], None
+        super(UnmanagedTestCase, self).setUp()
+
+
+    def tearDown(self):
+        from django.db import connection
+        super(UnmanagedTestCase, self).tearDown()
+        connection.transaction_state, connection._dirty = (
+            self._transaction_state)
+
+
+
 cursor_wrapper = mock.Mock()
 cursor_wrapper.side_effect = RuntimeError("No touching the database!")
 
@@ -353,6 +353,14 @@ class RunSuiteFactory(factory.Factory):
     order = 0
 
 
+
+class RunJobFactory(factory.Factory):
+    FACTORY_FOR = model.RunJob
+
+    run = factory.SubFactory(RunFactory)
+    action = model.RunJob.ACTION.activate
+
+
 class ResultFactory(factory.Factory):
     FACTORY_FOR = model.Result
 
@@ -159,6 +159,145 @@ class ImportCasesTest(case.DBTestCase):
             set(["Foo", "Foo"]))
 
 
+    def test_bulk(self):
+        """Cases can be imported in bulk mode."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data = {
+            "cases": [
+                {"name": "Foo", "steps": [{"instruction": "do this"}]},
+                {"name": "Foo", "steps": [{"instruction": "do this"}]},
+                {"name": "Bar", "steps": [{"instruction": "do that"}]},
+                ]}
+
+        with self.tempfile(json.dumps(data)) as path:
+            output = self.call_command("Foo", "1.0", path, bulk=True)
+
+        self.assertEqual(
+            "Skipped: Case with this name already exists for this product",
+            output[0][:60],
+            )
+        self.assertTrue(
+            output[0].endswith("Imported 2 cases\nImported 0 suites\n"))
+        self.assertEqual(
+            sorted(
+                self.model.CaseVersion.objects.values_list("name", flat=True)),
+            ["Bar", "Foo"],
+            )
+
+
+    def test_bulk_option(self):
+        """The bulk option is passed on to the importer."""
+        from moztrap.model.library.importer import ImportResult
+        pv = self.F.ProductVersionFactory.create(
+            product__name="Foo", version="1.0")
+        data = {"cases": []}
+
+        target = "moztrap.model.core.management.commands.import.Importer"
+        with self.tempfile(json.dumps(data)) as path:
+            with patch(target) as Importer:
+                import_data = Importer.return_value.import_data
+                import_data.return_value = ImportResult()
+                self.call_command("Foo", "1.0", path, bulk=True)
+
+        import_data.assert_called_once_with(
+            pv, data, force_dupes=False, bulk=True)
+
+
+    def test_stream(self):
+        """Files can be streamed; progress is reported after each batch."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data = {
+            "cases": [
+                {
+                    "name": name,
+                    "steps": [{"instruction": "do this"}],
+                    "suites": ["Suite"],
+                    }
+                for name in ["One", "Two", "Three"]
+                ],
+            "suites": [{"name": "Suite", "description": "A suite"}],
+            }
+
+        with self.tempfile(json.dumps(data)) as path:
+            output = self.call_command(
+                "Foo", "1.0", path, stream=True, batch_size=2)
+
+        self.assertEqual(
+            output,
+            (
+                "Imported 3 cases\nImported 1 suites\n",
+                "Read 2 cases\nRead 3 cases\n",
+                )
+            )
+        suite = self.model.Suite.objects.get()
+        self.assertEqual(suite.description, "A suite")
+        self.assertEqual(suite.cases.count(), 3)
+
+
+    def test_stream_bad_json(self):
+        """Error if streamed file contains malformed JSON."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        with self.tempfile('{"cases": [{"name": "Foo"}') as path:
+            output = self.call_command("Foo", "1.0", path, stream=True)
+
+        self.assertIn("Error: Could not parse JSON: Expecting", output[1])
+        self.assertEqual(self.model.CaseVersion.objects.count(), 0)
+
+
+    def test_csv(self):
+        """CSV files are imported with the csv format."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data = "name,instruction1\nFoo,do this\nBar,do that\n"
+
+        with self.tempfile(data) as path:
+            output = self.call_command("Foo", "1.0", path, format="csv")
+
+        self.assertEqual(
+            output,
+            ("Imported 2 cases\nImported 0 suites\n", "Read 2 cases\n"),
+            )
+        self.assertEqual(
+            set(self.model.CaseVersion.objects.values_list("name", flat=True)),
+            set(["Foo", "Bar"]))
+
+
+    def test_text(self):
+        """Bulk text files are imported with the text format."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data = "Test that foo\nWhen I do this\nThen it's done\n"
+
+        with self.tempfile(data) as path:
+            output = self.call_command("Foo", "1.0", path, format="text")
+
+        self.assertEqual(output[0], "Imported 1 cases\nImported 0 suites\n")
+        self.assertEqual(
+            self.model.CaseVersion.objects.get().name, "Test that foo")
+
+
+    def test_bad_text(self):
+        """Error if a bulk text file can't be parsed."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        with self.tempfile("Test that foo\n") as path:
+            output = self.call_command("Foo", "1.0", path, format="text")
+
+        self.assertIn(
+            "Error: Could not parse TEXT: Unexpected end of input", output[1])
+
+
+    def test_bad_batch_size(self):
+        """Error if batch size is less than one."""
+        output = self.call_command("Foo", "1.0", "file.json", batch_size=0)
+
+        self.assertEqual(
+            output, ("", "Error: --batch-size must be at least 1.\n"))
+
+
     def test_success_single_file_skip_dupes(self):
         """Successful import of one case, second dupe is skipped."""
         self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
@@ -206,6 +345,51 @@ class ImportCasesTest(case.DBTestCase):
             set(["Foo", "Foo2"]))
 
 
+    def test_jobs(self):
+        """With --jobs, files of a directory are imported in parallel."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        data1 = {
+            "cases": [{"name": "Foo", "steps": [{"instruction": "do this"}]}]}
+        data2 = {
+            "cases": [{"name": "Foo2", "steps": [{"instruction": "do this"}]}]}
+
+        dir = mkdtemp()
+        target = "moztrap.model.library.importer.multiprocessing.Pool"
+        with self.tempfile(json.dumps(data1), dir=dir) as filepath:
+            with self.tempfile(json.dumps(data2), dir=dir) as filepath2:
+                with patch(target) as Pool:
+                    Pool.return_value.map.side_effect = map
+                    output = self.call_command("Foo", "1.0", dir, jobs=2)
+
+        Pool.assert_called_once_with(2)
+        self.assertEqual(
+            output, ("Imported 2 cases\nImported 0 suites\n", ""))
+        self.assertEqual(
+            set(self.model.CaseVersion.objects.values_list("name", flat=True)),
+            set(["Foo", "Foo2"]))
+
+
+    def test_jobs_bad_json(self):
+        """Error, and nothing imported, if any of the files is bad JSON."""
+        self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
+
+        dir = mkdtemp()
+        with self.tempfile(json.dumps({"cases": [{"name": "Foo"}]}), dir=dir):
+            with self.tempfile("{", dir=dir):
+                output = self.call_command("Foo", "1.0", dir, jobs=2)
+
+        self.assertIn("Error: Could not parse JSON: Expecting", output[1])
+        self.assertEqual(self.model.CaseVersion.objects.count(), 0)
+
+
+    def test_bad_jobs(self):
+        """Error if number of jobs is less than one."""
+        output = self.call_command("Foo", "1.0", "file.json", jobs=0)
+
+        self.assertEqual(output, ("", "Error: --jobs must be at least 1.\n"))
+
+
     def test_skip_hidden_files(self):
         """Don't attempt to import hidden files in a directory."""
         self.F.ProductVersionFactory.create(product__name="Foo", version="1.0")
@@ -0,0 +1,126 @@
+"""
+Tests for management command to ingest newline-delimited JSON results.
+
+"""
+from contextlib import contextmanager
+from cStringIO import StringIO
+import json
+import os
+from tempfile import mkstemp
+
+from django.core.management import call_command
+
+from mock import patch
+
+from tests import case
+
+
+
+class IngestResultsTest(case.DBTestCase):
+    """Tests for ingest_results management command."""
+
+    def call_command(self, *args, **kwargs):
+        """
+        Runs the management command and returns (stdout, stderr) output.
+
+        Also patch ``sys.exit`` so a ``CommandError`` doesn't cause an exit.
+
+        """
+        with patch("sys.stdout", StringIO()) as stdout:
+            with patch("sys.stderr", StringIO()) as stderr:
+                with patch("sys.exit"):
+                    call_command("ingest_results", *args, **kwargs)
+
+        stdout.seek(0)
+        stderr.seek(0)
+        return (stdout.read(), stderr.read())
+
+
+    @contextmanager
+    def tempfile(self, contents):
+        """Write contents to a temporary file, yielding its path."""
+        (fd, path) = mkstemp()
+        fh = os.fdopen(fd, "w")
+        fh.write(contents)
+        fh.close()
+
+        try:
+            yield path
+        finally:
+            os.remove(path)
+
+
+    def lines(self, *statuses):
+        """Return newline-delimited JSON results for a new case."""
+        env = self.F.EnvironmentFactory.create()
+        rcv = self.F.RunCaseVersionFactory.create(environments=[env])
+        return "".join(
+            json.dumps(
+                {
+                    "case": rcv.caseversion.case.id,
+                    "environment": env.id,
+                    "run_id": rcv.run.id,
+                    "status": status,
+                    }
+                ) + "\n"
+            for status in statuses
+            )
+
+
+    def test_no_args(self):
+        """Command shows usage."""
+        output = self.call_command()
+
+        self.assertEqual(
+            output, ("", "Error: Usage: <username> <filename>\n"))
+
+
+    def test_bad_user(self):
+        """Error if given non-existent username."""
+        output = self.call_command("foo", "file.json")
+
+        self.assertEqual(output, ("", 'Error: User "foo" does not exist\n'))
+
+
+    def test_bad_file(self):
+        """Error if file can't be opened."""
+        self.F.UserFactory.create(username="foo")
+
+        output = self.call_command("foo", "does/not/exist.json")
+
+        self.assertEqual(
+            output,
+            (
+                "",
+                'Error: Could not open "does/not/exist.json", I/O error 2: '
+                "No such file or directory\n",
+                )
+            )
+
+
+    def test_ingest(self):
+        """Results are recorded; errors are reported by line."""
+        user = self.F.UserFactory.create(username="foo")
+
+        with self.tempfile(self.lines("passed", "bogus", "failed")) as path:
+            output = self.call_command("foo", path, chunk_size=2)
+
+        self.assertEqual(
+            output,
+            (
+                "Recorded 2 results, 1 errors.\n",
+                "Line 2: bogus is not a valid result status.\n",
+                )
+            )
+        self.assertEqual(
+            self.model.Result.objects.filter(tester=user).count(), 2)
+
+
+    def test_stdin(self):
+        """Results can be read from standard input."""
+        self.F.UserFactory.create(username="foo")
+
+        with patch("sys.stdin", StringIO(self.lines("passed"))):
+            output = self.call_command("foo", "-")
+
+        self.assertEqual(output, ("Recorded 1 results, 0 errors.\n", ""))
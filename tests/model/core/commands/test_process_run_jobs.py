@@ -0,0 +1,65 @@
+"""
+Tests for management command to process queued run jobs.
+
+"""
+from cStringIO import StringIO
+
+from django.core.management import call_command
+
+from mock import patch
+
+from tests import case
+
+
+
+class ProcessRunJobsTest(case.DBTestCase):
+    """Tests for process_run_jobs management command."""
+
+    def call_command(self, *args, **kwargs):
+        """Runs the management command and returns (stdout, stderr) output."""
+        with patch("sys.stdout", StringIO()) as stdout:
+            with patch("sys.stderr", StringIO()) as stderr:
+                call_command("process_run_jobs", *args, **kwargs)
+
+        stdout.seek(0)
+        stderr.seek(0)
+        return (stdout.read(), stderr.read())
+
+
+    def test_processes_queued_jobs(self):
+        """Processes all queued jobs and exits with --once."""
+        r = self.F.RunFactory.create(name="FF10", status="activating")
+        j = self.F.RunJobFactory.create(run=r)
+
+        stdout, stderr = self.call_command(once=True)
+
+        self.assertEqual(self.refresh(j).status, "done")
+        self.assertEqual(self.refresh(r).status, "active")
+        self.assertEqual(
+            stdout,
+            "Processed activate of run 'FF10' (done): "
+            "0 of 0 cases locked.\n"
+            )
+
+
+    def test_failed_job(self):
+        """A failing job is reported and doesn't stop the worker."""
+        r = self.F.RunFactory.create(name="FF10", status="activating")
+        j = self.F.RunJobFactory.create(run=r)
+        other = self.F.RunJobFactory.create()
+
+        with patch.object(self.model.Run, "update_case_versions") as ucv:
+            ucv.side_effect = RuntimeError("Surprise!")
+            stdout, stderr = self.call_command(once=True)
+
+        self.assertEqual(self.refresh(j).status, "failed")
+        self.assertEqual(
+            stderr, "Failed activate of run 'FF10' (failed): Surprise!\n")
+        self.assertEqual(self.refresh(other).status, "done")
+
+
+    def test_no_jobs(self):
+        """With nothing queued, --once exits without output."""
+        stdout, stderr = self.call_command(once=True)
+
+        self.assertEqual(stdout, "")
@@ -0,0 +1,42 @@
+"""
+Tests for management command to rebuild the caseversion search index.
+
+"""
+from cStringIO import StringIO
+
+from django.core.management import call_command
+
+from mock import patch
+
+from tests import case
+
+
+
+class RebuildSearchIndexTest(case.DBTestCase):
+    """Tests for rebuild_search_index management command."""
+    def call_command(self, *args, **kwargs):
+        """Runs the management command and returns (stdout, stderr) output."""
+        with patch("sys.stdout", StringIO()) as stdout:
+            with patch("sys.stderr", StringIO()) as stderr:
+                call_command("rebuild_search_index", *args, **kwargs)
+
+        stdout.seek(0)
+        stderr.seek(0)
+        return (stdout.read(), stderr.read())
+
+
+    def test_rebuild(self):
+        """Reindexes all caseversions."""
+        cv = self.F.CaseVersionFactory.create(name="One")
+        self.model.SearchTerm.objects.all().delete()
+
+        output = self.call_command()
+
+        self.assertEqual(output, ("Indexed 1 caseversions.\n", ""))
+        self.assertEqual(
+            list(
+                self.model.SearchTerm.objects.filter(
+                    caseversion=cv, field="name").values_list(
+                    "term", flat=True)),
+            ["one"],
+            )
@@ -52,3 +52,52 @@ class ProductTest(case.DBTestCase):
 
         self.assertEqual(self.refresh(v1).order, 1)
         self.assertEqual(self.refresh(v2).order, 2)
+
+
+    def test_reorder_versions_sets_latest_caseversions(self):
+        """Reordering versions recomputes latest caseversions of cases."""
+        p = self.F.ProductFactory()
+        v1 = self.F.ProductVersionFactory(product=p, version="1")
+        v3 = self.F.ProductVersionFactory(product=p, version="3")
+        cv1 = self.F.CaseVersionFactory(productversion=v1, case__product=p)
+        cv3 = self.F.CaseVersionFactory(productversion=v1, case__product=p)
+        cv3_3 = self.F.CaseVersionFactory(productversion=v3, case=cv3.case)
+
+        v3.version = "0"
+        v3.save()
+
+        self.assertEqual(
+            [
+                self.refresh(cv).latest
+                for cv in [cv1, cv3, cv3_3]
+                ],
+            [True, True, False],
+            )
+
+
+    def test_reorder_versions_only_changed(self):
+        """Only versions whose order or latest flag changes are updated."""
+        p = self.F.ProductFactory()
+        v1 = self.F.ProductVersionFactory(product=p, version="1")
+        v2 = self.F.ProductVersionFactory(product=p, version="2")
+        cc_version = self.refresh(v1).cc_version
+
+        self.F.ProductVersionFactory(product=p, version="3")
+
+        self.assertEqual(self.refresh(v1).cc_version, cc_version)
+        self.assertEqual(self.refresh(v2).latest, False)
+
+
+    def test_reorder_versions_queries(self):
+        """Number of queries doesn't depend on the number of cases."""
+        p = self.F.ProductFactory()
+        v = self.F.ProductVersionFactory(product=p, version="2")
+        for i in range(3):
+            self.F.CaseVersionFactory(productversion=v, case__product=p)
+
+        self.F.ProductVersionFactory.build(
+            product=p, version="1").save(skip_reorder=True)
+
+        # 1 to read versions, 1 to update versions, 1 for caseversions
+        with self.assertNumQueries(3):
+            p.reorder_versions()
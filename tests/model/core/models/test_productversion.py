@@ -239,6 +239,24 @@ class ProductVersionTest(case.DBTestCase):
 
 
 
+class UnmanagedProductVersionTest(case.UnmanagedTestCase):
+    """Tests for ProductVersion outside a managed transaction."""
+    def test_create(self):
+        """Creating a version commits its reordering of the product."""
+        p = self.F.ProductFactory.create()
+        pv1 = self.model.ProductVersion.objects.create(
+            product=p, version="1.0")
+        pv2 = self.model.ProductVersion.objects.create(
+            product=p, version="2.0")
+
+        self.assertEqual(
+            [(pv.order, pv.latest) for pv in [
+                    self.refresh(pv1), self.refresh(pv2)]],
+            [(1, False), (2, True)],
+            )
+
+
+
 class SortByVersionTest(case.DBTestCase):
     """
     Tests ``by_version`` sorting key func for ProductVersions.
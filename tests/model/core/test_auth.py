@@ -2,6 +2,9 @@
 Tests for auth proxy models.
 
 """
+from django.core.cache import cache
+from django.test.utils import override_settings
+
 from tests import case
 
 
@@ -109,6 +112,94 @@ class ModelBackendTest(case.DBTestCase):
 
 
 
+@override_settings(PERMISSION_CACHE_TIMEOUT=60)
+class PermissionCacheTest(case.DBTestCase):
+    """Tests for caching of user permissions by our ModelBackend."""
+    def setUp(self):
+        """Start with an empty cache, a user and a role."""
+        cache.clear()
+        self.user = self.F.UserFactory.create()
+        self.role = self.F.RoleFactory.create()
+        self.perm = self.model.Permission.objects.get(
+            codename="execute", content_type__app_label="execution")
+
+
+    def tearDown(self):
+        """Don't leave cached permissions for other tests."""
+        cache.clear()
+
+
+    def has_perm(self):
+        """Return whether a freshly-loaded user has the execute permission."""
+        return self.model.User.objects.get(pk=self.user.pk).has_perm(
+            "execution.execute")
+
+
+    def test_cached(self):
+        """Permissions are queried once, then read from the cache."""
+        self.user.user_permissions.add(self.perm)
+        self.assertTrue(self.has_perm())
+
+        user = self.model.User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("execution.execute"))
+
+
+    @override_settings(PERMISSION_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        """With no timeout, permissions aren't cached."""
+        self.has_perm()
+
+        user = self.model.User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(2):
+            user.has_perm("execution.execute")
+
+
+    def test_user_permissions_changed(self):
+        """Cached permissions are dropped when the user's permissions change."""
+        self.assertFalse(self.has_perm())
+
+        self.user.user_permissions.add(self.perm)
+
+        self.assertTrue(self.has_perm())
+
+
+    def test_user_roles_changed(self):
+        """Cached permissions are dropped when the user's roles change."""
+        self.role.permissions.add(self.perm)
+        self.assertFalse(self.has_perm())
+
+        self.user.roles.add(self.role)
+        self.assertTrue(self.has_perm())
+
+        self.role.user_set.clear()
+        self.assertFalse(self.has_perm())
+
+
+    def test_role_permissions_changed(self):
+        """Cached permissions are dropped when a role's permissions change."""
+        self.user.roles.add(self.role)
+        self.assertFalse(self.has_perm())
+
+        self.role.permissions.add(self.perm)
+        self.assertTrue(self.has_perm())
+
+        self.perm.group_set.clear()
+        self.assertFalse(self.has_perm())
+
+
+    def test_role_deleted(self):
+        """Cached permissions are dropped when a role is deleted."""
+        self.role.permissions.add(self.perm)
+        self.user.roles.add(self.role)
+        self.assertTrue(self.has_perm())
+
+        self.role.delete()
+
+        self.assertFalse(self.has_perm())
+
+
+
 class BrowserIDBackendTest(case.DBTestCase):
     """Tests for our custom BrowserIDBackend."""
     @property
@@ -98,3 +98,136 @@ class EnvironmentTest(case.DBTestCase):
         env = self.refresh(env)
         self.assertEqual(env.profile, None)
         self.assertEqual(env.modified_by, u)
+
+
+
+class FingerprintTest(case.DBTestCase):
+    """Tests for the stored element-set fingerprint of environments."""
+    def setUp(self):
+        """Create two elements."""
+        self.el1 = self.F.ElementFactory.create(name="OS X")
+        self.el2 = self.F.ElementFactory.create(name="English")
+
+
+    def env(self, *elements, **kwargs):
+        """Create an environment with given elements."""
+        env = self.F.EnvironmentFactory.create(**kwargs)
+        env.elements.add(*elements)
+        return env
+
+
+    def fingerprint(self, env):
+        """Return stored fingerprint of given environment."""
+        return self.refresh(env).fingerprint
+
+
+    def test_fingerprint_of(self):
+        """Fingerprint ignores order and duplicates; empty set is empty."""
+        F = self.model.Environment.fingerprint_of
+
+        self.assertEqual(
+            F([self.el1, self.el2]), F([self.el2.id, self.el1, self.el2]))
+        self.assertEqual(len(F([self.el1])), 40)
+        self.assertNotEqual(F([self.el1]), F([self.el1, self.el2]))
+        self.assertEqual(F([]), "")
+
+
+    def test_add_remove_clear(self):
+        """Fingerprint is maintained as elements are added and removed."""
+        F = self.model.Environment.fingerprint_of
+        env = self.F.EnvironmentFactory.create()
+
+        env.elements.add(self.el1, self.el2)
+        self.assertEqual(self.fingerprint(env), F([self.el1, self.el2]))
+        self.assertEqual(env.fingerprint, F([self.el1, self.el2]))
+
+        env.elements.remove(self.el2)
+        self.assertEqual(self.fingerprint(env), F([self.el1]))
+
+        env.elements.clear()
+        self.assertEqual(self.fingerprint(env), "")
+
+
+    def test_reverse(self):
+        """Fingerprints are maintained for changes from the element side."""
+        F = self.model.Environment.fingerprint_of
+        env = self.env(self.el1)
+
+        self.el2.environments.add(env)
+        self.assertEqual(self.fingerprint(env), F([self.el1, self.el2]))
+
+        self.el1.environments.clear()
+        self.assertEqual(self.fingerprint(env), F([self.el2]))
+
+
+    def test_does_not_bump_cc_version(self):
+        """Maintaining the fingerprint doesn't bump cc_version."""
+        env = self.F.EnvironmentFactory.create()
+        cc_version = self.refresh(env).cc_version
+
+        env.elements.add(self.el1)
+
+        self.assertEqual(self.refresh(env).cc_version, cc_version)
+
+
+    def test_generated(self):
+        """Generated environments have fingerprints."""
+        profile = self.model.Profile.generate("P", self.el1, self.el2)
+
+        self.assertEqual(
+            profile.environments.get().fingerprint,
+            self.model.Environment.fingerprint_of([self.el1, self.el2]),
+            )
+
+
+    def test_clone(self):
+        """A clone keeps the fingerprint only if its elements are copied."""
+        env = self.env(self.el1)
+
+        self.assertEqual(
+            self.fingerprint(env.clone()), self.fingerprint(env))
+        self.assertEqual(self.fingerprint(env.clone(cascade=[])), "")
+
+
+    def test_with_elements(self):
+        """with_elements finds environments with exactly given elements."""
+        env = self.env(self.el1, self.el2)
+        self.env(self.el1)
+
+        self.assertEqual(
+            list(self.model.Environment.with_elements([self.el2, self.el1])),
+            [env],
+            )
+
+
+    def test_resolve(self):
+        """resolve maps element sets to environment ids in one query."""
+        env1 = self.env(self.el1)
+        env2 = self.env(self.el1, self.el2)
+        env3 = self.env(self.el1, self.el2)
+
+        with self.assertNumQueries(1):
+            resolved = self.model.Environment.resolve(
+                [[self.el1], [self.el2.id, self.el1.id], [self.el2]])
+
+        self.assertEqual(
+            resolved,
+            {
+                frozenset([self.el1.id]): [env1.id],
+                frozenset([self.el1.id, self.el2.id]): [env2.id, env3.id],
+                frozenset([self.el2.id]): [],
+                },
+            )
+
+
+    def test_resolve_queryset(self):
+        """resolve can be limited to a queryset of environments."""
+        self.env(self.el1)
+        profile = self.F.ProfileFactory.create()
+        env = self.env(self.el1, profile=profile)
+
+        self.assertEqual(
+            self.model.Environment.resolve(
+                [[self.el1]], queryset=profile.environments.all()),
+            {frozenset([self.el1.id]): [env.id]},
+            )
@@ -24,3 +24,74 @@ class HasEnvironmentsModelTest(case.TestCase):
     def test_cascade_envs_to(self):
         """cascade_envs_to returns empty dict in base class."""
         self.assertEqual(self.model_class.cascade_envs_to([], True), {})
+
+
+
+class CascadeEnvsTest(case.DBTestCase):
+    """Tests for adding and removing environments with cascade."""
+    def setUp(self):
+        """Set up a productversion with a draft run and two caseversions."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux", "Windows"]})
+        self.pv = self.F.ProductVersionFactory.create(
+            environments=self.envs[:1])
+        self.run = self.F.RunFactory.create(
+            productversion=self.pv, status="draft")
+        self.cvs = [
+            self.F.CaseVersionFactory.create(productversion=self.pv)
+            for i in range(2)
+            ]
+
+
+    def env_ids(self, obj):
+        """Return set of ids of environments of ``obj``."""
+        return set(e.id for e in obj.environments.all())
+
+
+    def test_add_cascades(self):
+        """Added environments cascade to draft runs and caseversions."""
+        self.pv.add_envs(*self.envs[1:])
+
+        for obj in [self.pv, self.run] + self.cvs:
+            self.assertEqual(
+                self.env_ids(obj), set(e.id for e in self.envs))
+
+
+    def test_add_existing(self):
+        """Adding an environment an object already has is harmless."""
+        self.cvs[0].environments.add(self.envs[1])
+
+        self.pv.add_envs(self.envs[0].id, self.envs[1].id)
+
+        self.assertEqual(
+            self.env_ids(self.cvs[0]), set(e.id for e in self.envs[:2]))
+
+
+    def test_add_skips_narrowed(self):
+        """Added environments don't cascade to narrowed caseversions."""
+        self.cvs[0].remove_envs(self.envs[0])
+
+        self.pv.add_envs(self.envs[1])
+
+        self.assertEqual(self.env_ids(self.cvs[0]), set())
+        self.assertEqual(
+            self.env_ids(self.cvs[1]), set(e.id for e in self.envs[:2]))
+
+
+    def test_remove_cascades(self):
+        """Removed environments cascade to runs, caseversions and rcvs."""
+        rcv = self.F.RunCaseVersionFactory.create(
+            run=self.run, caseversion=self.cvs[0])
+        self.assertEqual(self.env_ids(rcv), set([self.envs[0].id]))
+
+        self.pv.remove_envs(self.envs[0])
+
+        for obj in [self.pv, self.run, rcv] + self.cvs:
+            self.assertEqual(self.env_ids(obj), set())
+
+
+    def test_add_queries(self):
+        """Number of queries doesn't depend on the number of objects."""
+        # one insert per model: productversion, run, caseversion
+        with self.assertNumQueries(3):
+            self.pv.add_envs(*self.envs[1:])
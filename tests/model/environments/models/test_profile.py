@@ -43,6 +43,63 @@ class ProfileTest(case.DBTestCase):
             )
 
 
+    def test_generate_queries(self):
+        """Generating doesn't take queries per environment."""
+        os = self.F.CategoryFactory(name="Operating System")
+        browser = self.F.CategoryFactory(name="Browser")
+        elements = [
+            self.F.ElementFactory(name=str(i), category=c)
+            for i in range(3)
+            for c in [os, browser]
+            ]
+
+        # profile, environments (insert, read last id), element
+        # relationships
+        with self.assertNumQueries(4):
+            p = self.model.Profile.generate("New Profile", *elements)
+
+        self.assertEqual(p.environments.count(), 9)
+
+
+    def test_add_environments(self):
+        """Can add environments from lists of elements or element ids."""
+        p = self.F.ProfileFactory.create()
+        existing = self.F.EnvironmentFactory.create(profile=p)
+        windows = self.F.ElementFactory(name="Windows")
+        linux = self.F.ElementFactory(name="Linux")
+        u = self.F.UserFactory.create()
+
+        added = p.add_environments([[windows], [linux.id, windows.id]], user=u)
+
+        self.assertEqual(added, 2)
+        envs = p.environments.exclude(pk=existing.pk).order_by("id")
+        self.assertEqual(
+            [set(e.elements.all()) for e in envs],
+            [set([windows]), set([linux, windows])],
+            )
+        self.assertEqual(envs[0].created_by, u)
+
+
+    def test_add_environments_batches(self):
+        """Many environments are added in batches the database accepts."""
+        p = self.F.ProfileFactory.create()
+        elements = [self.F.ElementFactory(name=str(i)) for i in range(150)]
+
+        added = p.add_environments([[e, elements[0]] for e in elements])
+
+        self.assertEqual(added, 150)
+        envs = p.environments.order_by("id")
+        self.assertEqual(
+            [set(e.elements.all()) for e in envs[:2]],
+            [set([elements[0]]), set([elements[1], elements[0]])],
+            )
+        self.assertEqual(
+            self.model.Environment.elements.through.objects.filter(
+                environment__profile=p).count(),
+            299,
+            )
+
+
     def test_clone(self):
         """Cloning a profile prefixes name with 'Cloned'."""
         p = self.F.ProfileFactory.create(name="Foo")
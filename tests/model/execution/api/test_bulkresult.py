@@ -0,0 +1,152 @@
+"""
+Tests for BulkResultResource api.
+
+This is a write-only resource via ``post``.
+
+"""
+import json
+import urllib
+
+from tests import case
+
+
+
+class BulkResultResourceTest(case.api.ApiTestCase):
+
+    @property
+    def resource_name(self):
+        return "bulkresult"
+
+
+    def setUp(self):
+        """Set up a run with one case, a tester and the tester's api key."""
+        super(BulkResultResourceTest, self).setUp()
+        self.user = self.F.UserFactory.create(
+            username="foo",
+            permissions=["execution.execute"],
+            )
+        self.apikey = self.F.ApiKeyFactory.create(owner=self.user)
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+                {"OS": ["OS X", "Linux"]})
+        pv = self.F.ProductVersionFactory.create(environments=self.envs)
+        self.run = self.F.RunFactory.create(productversion=pv)
+        self.cv = self.F.CaseVersionFactory.create(
+            case__product=pv.product, productversion=pv)
+        self.F.RunCaseVersionFactory.create(
+            caseversion=self.cv, run=self.run, environments=self.envs)
+
+
+    @property
+    def params(self):
+        return {"username": self.user.username, "api_key": self.apikey.key}
+
+
+    def item(self, env, status="passed"):
+        """Return a result object for the case in given environment."""
+        return {
+            "case": self.cv.case.id,
+            "environment": env.id,
+            "run_id": self.run.id,
+            "status": status,
+            }
+
+
+    def test_submit(self):
+        """Submitted results are recorded; errors are reported by index."""
+        res = self.post(
+            self.get_list_url(self.resource_name),
+            params=self.params,
+            payload={
+                "objects": [
+                    self.item(self.envs[0]),
+                    self.item(self.envs[1], status="bogus"),
+                    ]
+                },
+            status=202,
+            )
+
+        self.assertEqual(
+            res.json,
+            {
+                "recorded": 1,
+                "errors": [
+                    {
+                        "index": 1,
+                        "error": "bogus is not a valid result status.",
+                        },
+                    ],
+                },
+            )
+        result = self.model.Result.objects.get()
+        self.assertEqual(result.status, "passed")
+        self.assertEqual(result.tester, self.user)
+
+
+    def test_all_rejected(self):
+        """If no object can be recorded, response is 400."""
+        res = self.post(
+            self.get_list_url(self.resource_name),
+            params=self.params,
+            payload={"objects": [self.item(self.envs[0], status="bogus")]},
+            status=400,
+            )
+
+        self.assertEqual(res.json["recorded"], 0)
+        self.assertEqual(self.model.Result.objects.count(), 0)
+
+
+    def test_no_objects(self):
+        """Payload without a list of objects is rejected."""
+        res = self.post(
+            self.get_list_url(self.resource_name),
+            params=self.params,
+            payload={"foo": 1},
+            status=400,
+            )
+
+        self.assertEqual(
+            res.text, "Submitted data must have a list of 'objects'.")
+
+
+    def test_requires_permission(self):
+        """Users without execute permission can't submit results."""
+        user = self.F.UserFactory.create()
+        apikey = self.F.ApiKeyFactory.create(owner=user)
+
+        self.post(
+            self.get_list_url(self.resource_name),
+            params={"username": user.username, "api_key": apikey.key},
+            payload={"objects": [self.item(self.envs[0])]},
+            status=401,
+            )
+
+        self.assertEqual(self.model.Result.objects.count(), 0)
+
+
+    def test_stream(self):
+        """Results may be streamed as newline-delimited JSON."""
+        url = "{0}?{1}".format(
+            self.get_list_url(self.resource_name),
+            urllib.urlencode(dict(self.params, format="json")),
+            )
+        body = "\n".join(
+            [
+                json.dumps(self.item(self.envs[0], status="failed")),
+                "not json",
+                json.dumps(self.item(self.envs[1])),
+                ]
+            )
+
+        res = self.app.post(
+            url,
+            body,
+            headers={"content-type": "application/x-ndjson"},
+            status=202,
+            )
+
+        self.assertEqual(res.json["recorded"], 2)
+        self.assertEqual([e["line"] for e in res.json["errors"]], [2])
+        self.assertEqual(
+            set(self.model.Result.objects.values_list("status", flat=True)),
+            set(["failed", "passed"]),
+            )
@@ -79,3 +79,32 @@ class RunCaseVersionResourceTest(case.api.ApiTestCase):
 
         self.maxDiff = None
         self.assertEqual(exp_objects, act_objects)
+
+
+    def test_runcaseversion_list_by_cursor(self):
+        """With a cursor param, the list is paginated by cursor."""
+        rcvs = [self.factory.create() for i in range(3)]
+
+        res = self.get_list(params={"cursor": "", "limit": 2})
+
+        self.assertEqual(
+            [o["id"] for o in res.json["objects"]],
+            [unicode(rcv.id) for rcv in rcvs[:2]],
+            )
+        meta = res.json["meta"]
+        self.assertEqual(meta["previous"], None)
+        self.assertNotIn("total_count", meta)
+
+        res = self.app.get(meta["next"])
+
+        self.assertEqual(
+            [o["id"] for o in res.json["objects"]], [unicode(rcvs[2].id)])
+        self.assertEqual(res.json["meta"]["next"], None)
+
+        res = self.app.get(res.json["meta"]["previous"])
+
+        self.assertEqual(
+            [o["id"] for o in res.json["objects"]],
+            [unicode(rcv.id) for rcv in rcvs[:2]],
+            )
+
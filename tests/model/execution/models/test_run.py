@@ -248,6 +248,46 @@ class RunTest(case.DBTestCase):
             )
 
 
+    def test_prefetch_result_summaries(self):
+        """Summaries of several runs are fetched in one query."""
+        r = self.F.RunFactory()
+        r2 = self.F.RunFactory()
+        rcv = self.F.RunCaseVersionFactory(run=r)
+        rcv2 = self.F.RunCaseVersionFactory(run=r2)
+        self.F.ResultFactory(runcaseversion=rcv, status="passed")
+        self.F.ResultFactory(runcaseversion=rcv, status="blocked")
+        self.F.ResultFactory(runcaseversion=rcv2, status="invalidated")
+        r3 = self.F.RunFactory()
+
+        with self.assertNumQueries(1):
+            runs = self.model.Run.prefetch_result_summaries([r, r2, r3])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [run.result_summary() for run in runs],
+                [
+                    {
+                        "passed": 1,
+                        "failed": 0,
+                        "blocked": 1,
+                        "invalidated": 0,
+                        },
+                    {
+                        "passed": 0,
+                        "failed": 0,
+                        "blocked": 0,
+                        "invalidated": 1,
+                        },
+                    {
+                        "passed": 0,
+                        "failed": 0,
+                        "blocked": 0,
+                        "invalidated": 0,
+                        },
+                    ]
+                )
+
+
     def test_completion_percentage(self):
         """``completion`` returns fraction of case/env combos completed."""
         envs = self.F.EnvironmentFactory.create_full_set(
@@ -669,230 +709,32 @@ class RunActivationTest(case.DBTestCase):
         Queries explained:
         ------------------
 
-        Query 1: Get the environment ids from this run
-
-            "SELECT `environments_environment`.`id` FROM
-            `environments_environment` INNER JOIN
-            `execution_run_environments` ON (`environments_environment`.`id`
-             = `execution_run_environments`.`environment_id`) WHERE (
-             `environments_environment`.`deleted_on` IS NULL AND
-             `execution_run_environments`.`run_id` = 1 )",
-
-        Query 2: Get the caseversion ids that SHOULD be included in this run,
-            in order
-
-            "SELECT DISTINCT cv.id as id
-            FROM execution_run as r
-                INNER JOIN execution_runsuite as rs
-                    ON rs.run_id = r.id
-                INNER JOIN library_suitecase as sc
-                    ON rs.suite_id = sc.suite_id
-                INNER JOIN library_suite as s
-                    ON sc.suite_id = s.id
-                INNER JOIN library_caseversion as cv
-                    ON cv.case_id = sc.case_id
-                    AND cv.productversion_id = r.productversion_id
-                INNER JOIN library_caseversion_environments as cve
-                    ON cv.id = cve.caseversion_id
-            WHERE cv.status = 'active'
-                AND s.status = 'active'
-                AND rs.run_id = 1
-                AND cve.environment_id IN (1,2,3,4)
-            ORDER BY rs.order, sc.order
-            ",
-
-        Query 3-6: Get all the runcaseversions that are not in the result of
-         Query 2
-            to be used for delete. and then delete them.
-
-            "SELECT `execution_runcaseversion`.`id`,
-            `execution_runcaseversion`.`created_on`,
-            `execution_runcaseversion`.`created_by_id`,
-            `execution_runcaseversion`.`modified_on`,
-            `execution_runcaseversion`.`modified_by_id`,
-            `execution_runcaseversion`.`deleted_on`,
-            `execution_runcaseversion`.`deleted_by_id`,
-            `execution_runcaseversion`.`cc_version`,
-            `execution_runcaseversion`.`run_id`, `execution_runcaseversion`
-            .`caseversion_id`, `execution_runcaseversion`.`order` FROM
-            `execution_runcaseversion` WHERE (`execution_runcaseversion`
-            .`deleted_on` IS NULL AND `execution_runcaseversion`.`run_id` =
-            1  AND NOT (`execution_runcaseversion`.`caseversion_id` IN (2,
-            3, 4, 5, 6, 7))) ORDER BY `execution_runcaseversion`.`order` ASC",
-
-            "SELECT `execution_result`.`id`, `execution_result`
-            .`created_on`, `execution_result`.`created_by_id`,
-            `execution_result`.`modified_on`,
-            `execution_result`.`modified_by_id`,
-            `execution_result`.`deleted_on`, `execution_result`
-            .`deleted_by_id`, `execution_result`.`cc_version`,
-            `execution_result`.`tester_id`, `execution_result`
-            .`runcaseversion_id`, `execution_result`.`environment_id`,
-            `execution_result`.`status`, `execution_result`.`comment`,
-            `execution_result`.`is_latest`, `execution_result`.`review`,
-            `execution_result`.`reviewed_by_id` FROM `execution_result`
-            WHERE `execution_result`.`runcaseversion_id` IN (1)",
-
-            "DELETE FROM `execution_runcaseversion_environments` WHERE
-            `runcaseversion_id` IN (1)",
-
-            "DELETE FROM `execution_runcaseversion` WHERE `id` IN (1)",
-
-        Query 7: find duplicates in the existing rcvs, if they exist
-
-            SELECT `execution_runcaseversion`.`caseversion_id`,
-            COUNT(`execution_runcaseversion`.`caseversion_id`) AS
-            `num_records` FROM `execution_runcaseversion` WHERE (
-            `execution_runcaseversion`.`deleted_on` IS NULL AND
-            `execution_runcaseversion`.`run_id` = 8 ) GROUP BY
-            `execution_runcaseversion`.`caseversion_id` HAVING COUNT(
-            `execution_runcaseversion`.`caseversion_id`) > 1  ORDER BY
-            `execution_runcaseversion`.`order` ASC
-
-        Query 8: Get existing runcaseversions with the caseversion ids so we
-         can use
-            Them to build the new RunCaseVersion objects we will only be
-            updated
-            with order in the bulk create.
-
-            "SELECT `execution_runcaseversion`.`id`,
-            `execution_runcaseversion`.`caseversion_id` FROM
-            `execution_runcaseversion` WHERE (`execution_runcaseversion`
-            .`deleted_on` IS NULL AND `execution_runcaseversion`.`run_id` =
-            1 ) ORDER BY `execution_runcaseversion`.`order` ASC",
-
-        Query 9: update order on existing rcvs
-
-            "UPDATE `execution_runcaseversion` SET `modified_on` =
-            '2013-03-15 01:00:08', `modified_by_id` = NULL, `order` = 4,
-            `cc_version` = `execution_runcaseversion`.`cc_version` + 1 WHERE
-             (`execution_runcaseversion`.`deleted_on` IS NULL AND
-             `execution_runcaseversion`.`run_id` = 8  AND
-             `execution_runcaseversion`.`caseversion_id` = 16 )",
-
-        Query 10: bulk insert for RunCaseVersions
-
-            "INSERT INTO `execution_runcaseversion` (`created_on`,
-            `created_by_id`, `modified_on`, `modified_by_id`, `deleted_on`,
-            `deleted_by_id`, `cc_version`, `run_id`, `caseversion_id`,
-            `order`) VALUES ('2013-03-15 01:00:08', NULL,
-            '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 13, 1),
-            ('2013-03-15 01:00:08', NULL, '2013-03-15 01:00:08', NULL, NULL,
-             NULL, 0, 8, 14, 2), ('2013-03-15 01:00:08', NULL,
-             '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 15, 3),
-             ('2013-03-15 01:00:08', NULL, '2013-03-15 01:00:08', NULL, NULL,
-             NULL, 0, 8, 17, 5), ('2013-03-15 01:00:08', NULL,
-             '2013-03-15 01:00:08', NULL, NULL, NULL, 0, 8, 18, 6)"
-
-        Query 11: In order to add the runcaseversion_environment records,
-            we need to have all the relevant runcaseversions and prefetch the
-            environments for the caseversions
-
-            "SELECT `execution_runcaseversion`.`id`,
-            `execution_runcaseversion`.`created_on`,
-            `execution_runcaseversion`.`created_by_id`,
-            `execution_runcaseversion`.`modified_on`,
-            `execution_runcaseversion`.`modified_by_id`,
-            `execution_runcaseversion`.`deleted_on`,
-            `execution_runcaseversion`.`deleted_by_id`,
-            `execution_runcaseversion`.`cc_version`,
-            `execution_runcaseversion`.`run_id`, `execution_runcaseversion`
-            .`caseversion_id`, `execution_runcaseversion`.`order`,
-            `library_caseversion`.`id`, `library_caseversion`.`created_on`,
-            `library_caseversion`.`created_by_id`, `library_caseversion`
-            .`modified_on`, `library_caseversion`.`modified_by_id`,
-            `library_caseversion`.`deleted_on`, `library_caseversion`
-            .`deleted_by_id`, `library_caseversion`.`cc_version`,
-            `library_caseversion`.`status`, `library_caseversion`
-            .`productversion_id`, `library_caseversion`.`case_id`,
-            `library_caseversion`.`name`, `library_caseversion`
-            .`description`, `library_caseversion`.`latest`,
-            `library_caseversion`.`envs_narrowed` FROM
-            `execution_runcaseversion` INNER JOIN `library_caseversion` ON (
-            `execution_runcaseversion`.`caseversion_id` =
-            `library_caseversion`.`id`) WHERE (`execution_runcaseversion`
-            .`deleted_on` IS NULL AND `execution_runcaseversion`.`run_id` =
-            1 ) ORDER BY `execution_runcaseversion`.`order` ASC",
-
-        Query 12: This is the prefetch_related query used with Query 9.  Django
-            makes a separate query and links them in-memory.
-
-            "SELECT (`library_caseversion_environments`.`caseversion_id`) AS
-             `_prefetch_related_val`, `environments_environment`.`id`,
-             `environments_environment`.`created_on`,
-             `environments_environment`.`created_by_id`,
-             `environments_environment`.`modified_on`,
-             `environments_environment`.`modified_by_id`,
-             `environments_environment`.`deleted_on`,
-             `environments_environment`.`deleted_by_id`,
-             `environments_environment`.`cc_version`,
-             `environments_environment`.`profile_id` FROM
-             `environments_environment` INNER JOIN
-             `library_caseversion_environments` ON (
-             `environments_environment`.`id` =
-             `library_caseversion_environments`.`environment_id`) WHERE (
-             `environments_environment`.`deleted_on` IS NULL AND
-             `library_caseversion_environments`.`caseversion_id` IN (2, 3,
-             4, 5, 6, 7))",
-
-        Query 13: runcaseversion_environments that already existed that
-        pertain to
-            the runcaseversions that are still relevant.
-
-            "SELECT `execution_runcaseversion_environments`
-            .`runcaseversion_id`, `execution_runcaseversion_environments`
-            .`environment_id` FROM `execution_runcaseversion_environments`
-            WHERE `execution_runcaseversion_environments`
-            .`runcaseversion_id` IN (3, 4, 5, 2, 6, 7)",
-
-        Query 14: Get the environments for this run so we can find the
-        intersection
-            with the caseversions.
-
-            "SELECT `environments_environment`.`id` FROM
-            `environments_environment` INNER JOIN
-            `execution_run_environments` ON (`environments_environment`.`id`
-             = `execution_run_environments`.`environment_id`) WHERE (
-             `environments_environment`.`deleted_on` IS NULL AND
-             `execution_run_environments`.`run_id` = 1 )",
-
-        Query 15: Find the runcaseversion_environments that are no longer
-        relevant.
-
-            "SELECT `execution_runcaseversion_environments`.`id`,
-            `execution_runcaseversion_environments`.`runcaseversion_id`,
-            `execution_runcaseversion_environments`.`environment_id` FROM
-            `execution_runcaseversion_environments`
-            WHERE ((`execution_runcaseversion_environments`.`runcaseversion_id`
-            = 2  AND `execution_runcaseversion_environments`.`environment_id`
-            = 5 ))",
-
-        Query 16: Delete the runcaseversion_environments that pertained to the
-            caseversion that are no longer relevant.
-
-            "DELETE FROM `execution_runcaseversion_environments` WHERE `id`
-            IN (9)",
-
-        Query 17: Bulk insert of runcaseversion_environment mappings.
-
-            "INSERT INTO `execution_runcaseversion_environments`
-            (`runcaseversion_id`, `environment_id`) VALUES (7, 3), (5, 4),
-            (3, 1), (3, 3), (6, 4), (7, 4), (5, 2), (6, 1), (4, 4), (3, 2),
-            (7, 1), (6, 3), (6, 2), (4, 3), (4, 2), (3, 4), (5, 1), (4, 1),
-            (7, 2), (5, 3)",
-
-        Query 18: Update the test run to make it active.
-
-            "UPDATE `execution_run` SET `created_on` = '2012-11-20 00:11:25',
-            `created_by_id` = NULL, `modified_on` = '2012-11-20 00:11:25',
-            `modified_by_id` = NULL, `deleted_on` = NULL, `deleted_by_id` =
-            NULL, `cc_version` = 1, `has_team` = 0, `status` = 'active',
-            `productversion_id` = 1, `name` = 'Test Run', `description` = '',
-            `start` = '2012-11-19', `end` = NULL, `build` = NULL,
-            `is_series` = 0, `series_id` = NULL
-            WHERE (`execution_run`.`deleted_on` IS NULL
-            AND `execution_run`.`id` = 1
-            AND `execution_run`.`cc_version` = 0 )"
+        Query 1: Get the caseversion ids that SHOULD be included in this run,
+            in RunSuite / SuiteCase order.
+
+        Queries 2-5: Permanently delete the step results, results,
+            environments and runcaseversions of runcaseversions whose
+            caseversion is no longer in the run (the set of wanted
+            caseversions is a subquery, so no ids are loaded).
+
+        Query 6: Find duplicate runcaseversions for the same caseversion,
+            with the id of their latest result.
+
+        Query 7: Get existing runcaseversions with their caseversion ids and
+            order.
+
+        Query 8: Update order of existing runcaseversions that moved, with a
+            single CASE statement.
+
+        Query 9: Bulk insert of new RunCaseVersions.
+
+        Query 10: Delete runcaseversion_environments outside the intersection
+            of run and caseversion environments.
+
+        Query 11: Insert missing runcaseversion_environments with
+            INSERT ... SELECT.
+
+        Query 12: Update the test run to make it active.
 
         """
 
@@ -943,7 +785,7 @@ class RunActivationTest(case.DBTestCase):
         connection.queries = []
 
         try:
-            with self.assertNumQueries(18):
+            with self.assertNumQueries(12):
                 r.activate()
 
             # to debug, uncomment these lines:
@@ -957,10 +799,10 @@ class RunActivationTest(case.DBTestCase):
             updates = [x["sql"] for x in connection.queries if x["sql"].startswith("UPDATE")]
             deletes = [x["sql"] for x in connection.queries if x["sql"].startswith("DELETE")]
 
-            self.assertEqual(len(selects), 11)
+            self.assertEqual(len(selects), 3)
             self.assertEqual(len(inserts), 2)
             self.assertEqual(len(updates), 2)
-            self.assertEqual(len(deletes), 3)
+            self.assertEqual(len(deletes), 5)
         except AssertionError as e:
             raise e
         finally:
@@ -980,6 +822,62 @@ class RunActivationTest(case.DBTestCase):
             ).count(), 0)
 
 
+    def test_query_count_independent_of_run_size(self):
+        """Activating a larger run takes the same number of queries."""
+        def make_run(num_cases):
+            r = self.F.RunFactory.create(productversion=self.pv8)
+            ts = self.F.SuiteFactory.create(product=self.p, status="active")
+            self.F.RunSuiteFactory.create(suite=ts, run=r)
+            for num in range(num_cases):
+                cv = self.F.CaseVersionFactory.create(
+                    productversion=self.pv8, status="active")
+                self.F.SuiteCaseFactory.create(
+                    suite=ts, case=cv.case, order=num_cases - num)
+                self.F.RunCaseVersionFactory.create(
+                    run=r, caseversion=cv, order=num)
+            return r
+
+        small = make_run(2)
+        large = make_run(10)
+
+        # all runcaseversions exist already, so there's nothing to insert
+        with self.assertNumQueries(11):
+            small.activate()
+        with self.assertNumQueries(11):
+            large.activate()
+
+        self.assertEqual(
+            [rcv.order for rcv in large.runcaseversions.all()],
+            range(1, 11),
+            )
+
+
+    def test_case_in_multiple_suites(self):
+        """A case in more than one suite is included once, in first place."""
+        tc1 = self.F.CaseFactory.create(product=self.p)
+        tcv1 = self.F.CaseVersionFactory.create(
+            case=tc1, productversion=self.pv8, status="active")
+        tc2 = self.F.CaseFactory.create(product=self.p)
+        tcv2 = self.F.CaseVersionFactory.create(
+            case=tc2, productversion=self.pv8, status="active")
+
+        ts1 = self.F.SuiteFactory.create(product=self.p, status="active")
+        self.F.SuiteCaseFactory.create(suite=ts1, case=tc2, order=1)
+        ts2 = self.F.SuiteFactory.create(product=self.p, status="active")
+        self.F.SuiteCaseFactory.create(suite=ts2, case=tc1, order=1)
+        self.F.SuiteCaseFactory.create(suite=ts2, case=tc2, order=2)
+
+        r = self.F.RunFactory.create(productversion=self.pv8)
+        self.F.RunSuiteFactory.create(suite=ts1, run=r, order=1)
+        self.F.RunSuiteFactory.create(suite=ts2, run=r, order=2)
+
+        r.activate()
+
+        self.assertOrderedCaseVersions(r, [tcv2, tcv1])
+        self.assertEqual(
+            [rcv.order for rcv in r.runcaseversions.all()], [1, 2])
+
+
     def test_run_refresh(self):
         """
         Refresh the runcaseversions while the run remains active
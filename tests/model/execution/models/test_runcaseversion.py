@@ -179,6 +179,38 @@ class RunCaseVersionTest(case.DBTestCase):
             )
 
 
+    def test_prefetch_result_summaries(self):
+        """Summaries of several runcaseversions are fetched in one query."""
+        rcv = self.F.RunCaseVersionFactory()
+        rcv2 = self.F.RunCaseVersionFactory()
+        self.F.ResultFactory(runcaseversion=rcv, status="passed")
+        self.F.ResultFactory(runcaseversion=rcv, status="failed")
+        self.F.ResultFactory(runcaseversion=rcv, status="started")
+
+        with self.assertNumQueries(1):
+            rcvs = self.model.RunCaseVersion.prefetch_result_summaries(
+                [rcv, rcv2])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [r.result_summary() for r in rcvs],
+                [
+                    {
+                        "passed": 1,
+                        "failed": 1,
+                        "blocked": 0,
+                        "invalidated": 0,
+                        },
+                    {
+                        "passed": 0,
+                        "failed": 0,
+                        "blocked": 0,
+                        "invalidated": 0,
+                        },
+                    ]
+                )
+
+
     def test_completion_percentage(self):
         """``completion`` returns fraction of envs completed."""
         envs = self.F.EnvironmentFactory.create_full_set(
@@ -0,0 +1,181 @@
+"""
+Tests for RunEnvironmentSummary model.
+
+"""
+from mock import patch
+
+from tests import case
+
+
+
+class RunEnvironmentSummaryTest(case.DBTestCase):
+    """Tests for RunEnvironmentSummary."""
+    def setUp(self):
+        """Set up a run with one runcaseversion in two environments."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["Windows", "Linux"]})
+        self.run = self.F.RunFactory.create(environments=self.envs)
+        self.rcv = self.F.RunCaseVersionFactory.create(run=self.run)
+        self.rcv.environments.add(*self.envs)
+
+
+    def summary(self, env=None):
+        """Return nonzero counters for ``env`` (default first env)."""
+        try:
+            s = self.model.RunEnvironmentSummary.objects.get(
+                run=self.run, environment=env or self.envs[0])
+        except self.model.RunEnvironmentSummary.DoesNotExist:
+            return {}
+        return dict(
+            (c, getattr(s, c))
+            for c in self.model.RunEnvironmentSummary.COUNTERS
+            if getattr(s, c)
+            )
+
+
+    def test_unicode(self):
+        self.run.name = "FF10"
+        s = self.model.RunEnvironmentSummary(
+            run=self.run, environment=self.envs[1])
+
+        self.assertEqual(unicode(s), u"Results of FF10 in Linux")
+
+
+    def test_new_result_counted(self):
+        """A new result increments its status counter."""
+        u = self.F.UserFactory.create()
+        self.rcv.start(self.envs[0], user=u)
+
+        self.assertEqual(self.summary(), {"started": 1})
+
+
+    def test_superseded_result_uncounted(self):
+        """A result no longer latest is no longer counted."""
+        u = self.F.UserFactory.create()
+        self.rcv.start(self.envs[0], user=u)
+        self.rcv.result_pass(self.envs[0], user=u)
+
+        self.assertEqual(self.summary(), {"passed": 1, "completed": 1})
+
+
+    def test_completed_counted_once_per_case(self):
+        """Completed results by several testers complete a case once."""
+        u1 = self.F.UserFactory.create()
+        u2 = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u1)
+        self.rcv.result_fail(self.envs[0], user=u2)
+
+        self.assertEqual(
+            self.summary(), {"passed": 1, "failed": 1, "completed": 1})
+
+
+    def test_uncompleted(self):
+        """Restarting the only completed result uncompletes the case."""
+        u1 = self.F.UserFactory.create()
+        u2 = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u1)
+        self.rcv.start(self.envs[0], user=u2)
+        self.rcv.start(self.envs[0], user=u1)
+
+        self.assertEqual(self.summary(), {"started": 2})
+
+
+    def test_per_environment(self):
+        """Results are counted separately for each environment."""
+        u = self.F.UserFactory.create()
+        self.rcv.result_skip(user=u)
+        self.rcv.result_pass(self.envs[1], user=u)
+
+        self.assertEqual(self.summary(self.envs[0]), {"skipped": 1})
+        self.assertEqual(
+            self.summary(self.envs[1]), {"passed": 1, "completed": 1})
+
+
+    def test_rebuild(self):
+        """Rebuilding matches the incrementally maintained counters."""
+        u1 = self.F.UserFactory.create()
+        u2 = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u1)
+        self.rcv.result_fail(self.envs[0], user=u2)
+        self.rcv.start(self.envs[1], user=u1)
+        expected = [self.summary(self.envs[0]), self.summary(self.envs[1])]
+        self.model.RunEnvironmentSummary.objects.all().delete(permanent=True)
+
+        self.model.RunEnvironmentSummary.rebuild([self.run.id])
+
+        self.assertEqual(
+            [self.summary(self.envs[0]), self.summary(self.envs[1])],
+            expected)
+
+
+    def test_soft_delete_result(self):
+        """Soft-deleting a result removes it from the counters."""
+        u = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u)
+
+        self.rcv.results.get().delete()
+
+        self.assertEqual(self.summary(), {})
+
+
+    def test_lock_creates(self):
+        """Locking a summary that doesn't exist yet creates it, zeroed."""
+        self.model.RunEnvironmentSummary.lock(self.run.id, self.envs[0].id)
+
+        self.assertEqual(
+            self.model.RunEnvironmentSummary.objects.filter(
+                run=self.run, environment=self.envs[0]).count(),
+            1,
+            )
+        self.assertEqual(self.summary(), {})
+
+
+    def test_save_locks_summary(self):
+        """A new result locks its summary before reading latest results."""
+        u = self.F.UserFactory.create()
+
+        with patch.object(
+                self.model.RunEnvironmentSummary, "lock") as mock_lock:
+            self.rcv.result_pass(self.envs[0], user=u)
+
+        mock_lock.assert_called_once_with(self.run.id, self.envs[0].id)
+
+
+    def test_soft_delete_rebuilds_once(self):
+        """A deletion cascading to many results rebuilds each run once."""
+        u = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u)
+        self.rcv.result_fail(self.envs[1], user=u)
+        rebuild = self.model.RunEnvironmentSummary.rebuild
+
+        with patch("moztrap.model.mtmodel.SOFT_DELETE_RANGE_SIZE", 1):
+            with patch.object(
+                    self.model.RunEnvironmentSummary,
+                    "rebuild") as mock_rebuild:
+                mock_rebuild.side_effect = rebuild
+                self.run.productversion.delete()
+
+        mock_rebuild.assert_called_once_with(set([self.run.id]))
+        self.assertEqual(self.summary(), {})
+
+
+    def test_undelete_result(self):
+        """Undeleting a result counts it again."""
+        u = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u)
+        r = self.rcv.results.get()
+        r.delete()
+
+        self.refresh(r).undelete()
+
+        self.assertEqual(self.summary(), {"passed": 1, "completed": 1})
+
+
+    def test_stale_results_removed_on_activation(self):
+        """Results deleted with stale runcaseversions are uncounted."""
+        u = self.F.UserFactory.create()
+        self.rcv.result_pass(self.envs[0], user=u)
+
+        self.run.activate()
+
+        self.assertEqual(self.summary(), {})
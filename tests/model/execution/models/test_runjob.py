@@ -0,0 +1,210 @@
+"""
+Tests for RunJob model and queued run activation/refresh.
+
+"""
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from mock import patch
+
+from tests import case
+
+
+
+@override_settings(RUN_JOBS_ASYNC=True)
+class RunJobTest(case.DBTestCase):
+    def setUp(self):
+        """A draft run with one active case in an active suite."""
+        envs = self.F.EnvironmentFactory.create_full_set({"OS": ["Linux"]})
+        self.pv = self.F.ProductVersionFactory.create(environments=envs)
+        self.run = self.F.RunFactory.create(productversion=self.pv)
+        self.suite = self.F.SuiteFactory.create(
+            product=self.pv.product, status="active")
+        self.F.RunSuiteFactory.create(run=self.run, suite=self.suite)
+        self.cv = self.add_case()
+
+
+    def add_case(self):
+        """Add an active case to the run's suite; return its caseversion."""
+        cv = self.F.CaseVersionFactory.create(
+            productversion=self.pv, status="active")
+        self.F.SuiteCaseFactory.create(suite=self.suite, case=cv.case)
+        return cv
+
+
+    def test_unicode(self):
+        j = self.F.RunJobFactory(run__name="FF10")
+
+        self.assertEqual(unicode(j), u"activate of run 'FF10' (queued)")
+
+
+    def test_queue_activation(self):
+        """Queueing activation marks run activating without locking cases."""
+        job = self.run.queue_activation()
+
+        self.assertEqual(self.refresh(self.run).status, "activating")
+        self.assertEqual(job.status, "queued")
+        self.assertEqual(job.action, "activate")
+        self.assertEqual(self.run.runcaseversions.count(), 0)
+
+
+    @override_settings(RUN_JOBS_ASYNC=False)
+    def test_queue_activation_synchronous(self):
+        """If async jobs are disabled, activation happens immediately."""
+        job = self.run.queue_activation()
+
+        self.assertIsNone(job)
+        self.assertEqual(self.refresh(self.run).status, "active")
+        self.assertEqual(self.run.runcaseversions.count(), 1)
+
+
+    def test_queue_activation_disabled_run(self):
+        """A disabled run has nothing to lock and is activated immediately."""
+        self.run.deactivate()
+
+        job = self.run.queue_activation()
+
+        self.assertIsNone(job)
+        self.assertEqual(self.refresh(self.run).status, "active")
+
+
+    def test_queue_refresh_draft_run(self):
+        """Refreshing a draft run queues nothing."""
+        self.assertIsNone(self.run.queue_refresh())
+        self.assertEqual(self.model.RunJob.objects.count(), 0)
+
+
+    def test_process_activation(self):
+        """Processing an activation job locks cases and activates the run."""
+        self.run.queue_activation()
+
+        job = self.model.RunJob.claim_next()
+        job.process()
+
+        job = self.refresh(job)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.total, 1)
+        self.assertEqual(job.locked, 1)
+        self.assertIsNotNone(job.finished_on)
+        self.assertEqual(self.refresh(self.run).status, "active")
+        self.assertEqual(self.run.runcaseversions.get().caseversion, self.cv)
+
+
+    def test_activate_progress(self):
+        """Activation reports the number locked after each batch."""
+        self.add_case()
+        counts = []
+
+        with patch(
+                "moztrap.model.execution.models.BULK_UPDATE_BATCH_SIZE", 1):
+            self.run.activate(progress=counts.append)
+
+        self.assertEqual(counts, [0, 1, 2])
+
+
+    def test_process_records_progress(self):
+        """The locked count is reported while the job runs."""
+        self.run.queue_activation()
+        job = self.model.RunJob.claim_next()
+        record = job._record_progress
+        seen = []
+
+        def spy(locked):
+            record(locked)
+            seen.append(self.refresh(job).progress()["locked"])
+
+        with patch.object(job, "_record_progress", spy):
+            job.process()
+
+        self.assertEqual(seen, [0, 1])
+        self.assertEqual(self.refresh(job).progress()["locked"], 1)
+
+
+    def test_record_progress_cached(self):
+        """Progress is kept in the cache, not written to the job's row."""
+        self.run.queue_activation()
+        job = self.model.RunJob.claim_next()
+        self.addCleanup(
+            cache.delete, self.model.RunJob.progress_cache_key(job.id))
+
+        job._record_progress(1)
+
+        job = self.refresh(job)
+        self.assertEqual(job.locked, 0)
+        self.assertEqual(job.progress()["locked"], 1)
+
+
+    def test_process_refresh(self):
+        """Processing a refresh job picks up cases added to an active run."""
+        self.run.activate()
+        self.run.runcaseversions.all().delete(permanent=True)
+        job = self.run.queue_refresh()
+
+        self.model.RunJob.claim_next().process()
+
+        self.assertEqual(self.refresh(job).status, "done")
+        self.assertEqual(self.run.runcaseversions.count(), 1)
+
+
+    def test_process_activation_reset_to_draft(self):
+        """A run reset to draft before its job runs is not activated."""
+        self.run.queue_activation()
+        self.refresh(self.run).draft()
+
+        self.model.RunJob.claim_next().process()
+
+        self.assertEqual(self.refresh(self.run).status, "draft")
+        self.assertEqual(self.run.runcaseversions.count(), 0)
+
+
+    def test_process_failure(self):
+        """A failed activation is recorded and the run returned to draft."""
+        job = self.run.queue_activation()
+
+        with patch.object(self.model.Run, "update_case_versions") as ucv:
+            ucv.side_effect = RuntimeError("Surprise!")
+            with self.assertRaises(RuntimeError):
+                self.model.RunJob.claim_next().process()
+
+        job = self.refresh(job)
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.error, "Surprise!")
+        self.assertEqual(self.refresh(self.run).status, "draft")
+
+
+    def test_claim_next_oldest_first(self):
+        """Jobs are claimed oldest first, and each only once."""
+        first = self.F.RunJobFactory.create()
+        second = self.F.RunJobFactory.create()
+
+        self.assertEqual(self.model.RunJob.claim_next(), first)
+        self.assertEqual(self.model.RunJob.claim_next(), second)
+        self.assertIsNone(self.model.RunJob.claim_next())
+        self.assertEqual(self.refresh(first).status, "running")
+
+
+    def test_progress(self):
+        """Progress reports status and locked / total counts."""
+        j = self.F.RunJobFactory.create(total=10, locked=4)
+
+        self.assertEqual(
+            j.progress(),
+            {
+                "id": j.id,
+                "action": "activate",
+                "status": "queued",
+                "total": 10,
+                "locked": 4,
+                "error": "",
+                }
+            )
+
+
+    def test_latest_job(self):
+        """Run.latest_job returns the most recent job, or None."""
+        self.assertIsNone(self.run.latest_job())
+
+        self.F.RunJobFactory.create(run=self.run)
+        j = self.F.RunJobFactory.create(run=self.run)
+
+        self.assertEqual(self.run.latest_job(), j)
@@ -0,0 +1,284 @@
+"""
+Tests for bulk result submission.
+
+"""
+from datetime import datetime
+import json
+
+from mock import patch
+
+from tests import case
+
+
+
+class SubmitResultsTest(case.DBTestCase):
+    """Tests for submit_results."""
+    def setUp(self):
+        """Set up an active run with two cases in two environments."""
+        self.envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        self.pv = self.F.ProductVersionFactory.create(environments=self.envs)
+        self.run = self.F.RunFactory.create(productversion=self.pv)
+        self.cvs = []
+        self.rcvs = []
+        for name in ["One", "Two"]:
+            cv = self.F.CaseVersionFactory.create(
+                case__product=self.pv.product,
+                productversion=self.pv,
+                name=name,
+                )
+            self.cvs.append(cv)
+            self.rcvs.append(
+                self.F.RunCaseVersionFactory.create(
+                    caseversion=cv, run=self.run, environments=self.envs))
+        self.user = self.F.UserFactory.create()
+
+
+    def submit(self, *items):
+        """Submit given items as the test user."""
+        from moztrap.model.execution.bulk import submit_results
+        return submit_results(items, self.user)
+
+
+    def item(self, cv, env, status, **kwargs):
+        """Return a result item for given caseversion and environment."""
+        kwargs.update(
+            {
+                "case": cv.case.id,
+                "environment": env.id,
+                "run_id": self.run.id,
+                "status": status,
+                }
+            )
+        return kwargs
+
+
+    def test_passed(self):
+        """A passed result is recorded as the latest result."""
+        errors = self.submit(self.item(self.cvs[0], self.envs[0], "passed"))
+
+        self.assertEqual(errors, [])
+        r = self.model.Result.objects.get()
+        self.assertEqual(r.runcaseversion, self.rcvs[0])
+        self.assertEqual(r.environment, self.envs[0])
+        self.assertEqual(r.tester, self.user)
+        self.assertEqual(r.status, "passed")
+        self.assertEqual(r.created_by, self.user)
+        self.assertTrue(r.is_latest)
+
+
+    def test_supersedes_latest(self):
+        """Previous latest results of the same tester are no longer latest."""
+        self.rcvs[0].result_pass(self.envs[0], user=self.user)
+        self.rcvs[0].result_pass(self.envs[1], user=self.user)
+        self.rcvs[1].result_pass(self.envs[0], user=self.user)
+        other = self.F.UserFactory.create()
+        self.rcvs[0].result_pass(self.envs[0], user=other)
+
+        self.submit(
+            self.item(self.cvs[0], self.envs[0], "invalidated", comment="x"))
+
+        latest = self.model.Result.objects.filter(is_latest=True)
+        self.assertEqual(
+            sorted(
+                (r.runcaseversion_id, r.environment_id, r.tester_id, r.status)
+                for r in latest),
+            sorted(
+                [
+                    (self.rcvs[0].id, self.envs[0].id, self.user.id,
+                     "invalidated"),
+                    (self.rcvs[0].id, self.envs[1].id, self.user.id, "passed"),
+                    (self.rcvs[1].id, self.envs[0].id, self.user.id, "passed"),
+                    (self.rcvs[0].id, self.envs[0].id, other.id, "passed"),
+                    ]
+                )
+            )
+
+
+    def test_last_in_batch_is_latest(self):
+        """Of results for the same case and env, the last is latest."""
+        self.submit(
+            self.item(self.cvs[0], self.envs[0], "passed"),
+            self.item(self.cvs[0], self.envs[0], "blocked"),
+            )
+
+        self.assertEqual(
+            list(
+                self.model.Result.objects.order_by("id").values_list(
+                    "status", "is_latest")),
+            [("passed", False), ("blocked", True)],
+            )
+
+
+    def test_skipped_all_envs(self):
+        """A skipped result is recorded for all environments."""
+        self.submit(self.item(self.cvs[0], self.envs[0], "skipped"))
+
+        self.assertEqual(
+            set(
+                self.model.Result.objects.filter(
+                    status="skipped").values_list("environment", flat=True)),
+            set(e.id for e in self.envs),
+            )
+
+
+    def test_failed_step(self):
+        """A failed result with a step number records a failed step result."""
+        step = self.F.CaseStepFactory.create(caseversion=self.cvs[1])
+
+        self.submit(
+            self.item(self.cvs[0], self.envs[0], "failed", comment="a"),
+            self.item(
+                self.cvs[1], self.envs[1], "failed",
+                stepnumber=step.number, bug="http://example.com/1"),
+            )
+
+        sr = self.model.StepResult.objects.get()
+        self.assertEqual(sr.step, step)
+        self.assertEqual(sr.status, "failed")
+        self.assertEqual(sr.result.runcaseversion, self.rcvs[1])
+        self.assertEqual(sr.result.bug_urls(), set(["http://example.com/1"]))
+
+
+    def test_failed_step_same_second(self):
+        """Step results go to the new result, not an earlier failed one."""
+        step = self.F.CaseStepFactory.create(caseversion=self.cvs[0])
+
+        with patch("moztrap.model.execution.bulk.utcnow") as utcnow:
+            utcnow.return_value = datetime(2012, 1, 1)
+            self.submit(self.item(self.cvs[0], self.envs[0], "failed"))
+            self.submit(
+                self.item(
+                    self.cvs[0], self.envs[0], "failed",
+                    stepnumber=step.number),
+                )
+
+        sr = self.model.StepResult.objects.get()
+        self.assertEqual(
+            sr.result, self.model.Result.objects.order_by("-id")[0])
+
+
+    def test_counters(self):
+        """Run result counters reflect submitted results."""
+        self.submit(
+            self.item(self.cvs[0], self.envs[0], "passed"),
+            self.item(self.cvs[1], self.envs[0], "failed"),
+            )
+
+        self.assertEqual(self.run.completion(), 0.5)
+
+
+    def test_errors(self):
+        """Invalid items are reported by index; valid ones are recorded."""
+        other_env = self.F.EnvironmentFactory.create()
+        items = [
+            {"case": self.cvs[0].case.id},
+            self.item(self.cvs[0], self.envs[0], "started"),
+            self.item(self.cvs[0], other_env, "passed"),
+            self.item(self.cvs[0], self.envs[0], "passed", stepnumber="a"),
+            self.item(self.cvs[1], self.envs[1], "passed"),
+            ]
+        items[4]["run_id"] = "foo"
+        items.append(self.item(self.cvs[1], self.envs[1], "passed"))
+
+        errors = self.submit(*items)
+
+        self.assertEqual([i for i, e in errors], [0, 1, 2, 3, 4])
+        self.assertEqual(
+            errors[0][1], "bad result object data missing key: 'status'")
+        self.assertEqual(errors[1][1], "started is not a valid result status.")
+        self.assertEqual(
+            errors[2][1],
+            "RunCaseVersion not found for run: {0}, case: {1}, "
+            "environment: {2}".format(
+                self.run.id, self.cvs[0].case.id, other_env.id)
+            )
+        self.assertEqual(
+            self.model.Result.objects.get().runcaseversion, self.rcvs[1])
+
+
+    def test_constant_queries(self):
+        """Queries don't grow with the number of results."""
+        items = [
+            self.item(cv, env, status)
+            for cv in self.cvs
+            for env in self.envs
+            for status in ["passed", "blocked"]
+            ]
+
+        # 2 lookups, 1 update, 2 to insert, 2 to rebuild counters, 1 for runs
+        with self.assertNumQueries(8):
+            self.submit(*items[:2])
+
+        with self.assertNumQueries(8):
+            self.submit(*items)
+
+
+
+class SubmitResultStreamTest(case.DBTestCase):
+    """Tests for submit_result_stream."""
+    def setUp(self):
+        """Set up a run with one case in one environment."""
+        self.env = self.F.EnvironmentFactory.create()
+        self.cv = self.F.CaseVersionFactory.create()
+        self.rcv = self.F.RunCaseVersionFactory.create(
+            caseversion=self.cv, environments=[self.env])
+        self.user = self.F.UserFactory.create()
+
+
+    def submit(self, lines, **kwargs):
+        """Submit given lines as the test user."""
+        from moztrap.model.execution.bulk import submit_result_stream
+        return submit_result_stream(lines, self.user, **kwargs)
+
+
+    def line(self, status="passed"):
+        """Return a JSON line with a result for the case."""
+        return json.dumps(
+            {
+                "case": self.cv.case.id,
+                "environment": self.env.id,
+                "run_id": self.rcv.run.id,
+                "status": status,
+                }
+            ) + "\n"
+
+
+    def test_records(self):
+        """Each line is recorded as a result."""
+        recorded, errors = self.submit(
+            [self.line("failed"), "\n", self.line("passed")])
+
+        self.assertEqual((recorded, errors), (2, []))
+        self.assertEqual(
+            list(
+                self.model.Result.objects.order_by("id").values_list(
+                    "status", "is_latest")),
+            [("failed", False), ("passed", True)],
+            )
+
+
+    def test_errors_by_line(self):
+        """Errors are reported by line number."""
+        recorded, errors = self.submit(
+            [self.line(), "{bad\n", "\n", self.line("bogus"), self.line()],
+            chunk_size=2,
+            )
+
+        self.assertEqual(recorded, 2)
+        self.assertEqual([n for n, e in errors], [2, 4])
+        self.assertTrue(errors[0][1].startswith("Could not parse JSON: "))
+        self.assertEqual(errors[1][1], "bogus is not a valid result status.")
+
+
+    def test_chunks(self):
+        """Results are submitted a chunk of lines at a time."""
+        target = "moztrap.model.execution.bulk.submit_results"
+        with patch(target) as submit_results:
+            submit_results.return_value = []
+            recorded, errors = self.submit(
+                (self.line() for i in range(5)), chunk_size=2)
+
+        self.assertEqual(recorded, 5)
+        self.assertEqual(
+            [len(c[0][0]) for c in submit_results.call_args_list], [2, 2, 1])
@@ -312,6 +312,102 @@ class CaseVersionTest(case.DBTestCase):
         self.assertEqual(self.refresh(cv2).latest, False)
 
 
+    def test_sync_name(self):
+        """Saving a caseversion renames the other versions of its case."""
+        c = self.F.CaseFactory.create()
+        p = c.product
+        cv1 = self.F.CaseVersionFactory.create(
+            productversion__product=p, productversion__version="1", case=c,
+            name="Old")
+        cv2 = self.F.CaseVersionFactory.create(
+            productversion__product=p, productversion__version="2", case=c,
+            name="Old")
+        u = self.F.UserFactory.create()
+
+        cv2.name = "New"
+        cv2.save(user=u)
+
+        cv1 = self.refresh(cv1)
+        self.assertEqual(cv1.name, "New")
+        self.assertEqual(cv1.modified_by, u)
+        self.assertEqual(
+            set(
+                self.model.SearchTerm.objects.filter(
+                    caseversion=cv1, field="name").values_list(
+                    "term", flat=True)),
+            set(["new"]),
+            )
+
+
+    def test_save_queries(self):
+        """Number of queries to save doesn't depend on number of versions."""
+        def create(versions):
+            c = self.F.CaseFactory.create()
+            for i in range(versions):
+                cv = self.F.CaseVersionFactory.create(
+                    productversion__product=c.product,
+                    productversion__version=str(i),
+                    case=c,
+                    name="Old",
+                    )
+            cv.name = "New"
+            return cv
+
+        small = create(2)
+        large = create(5)
+
+        from django.conf import settings
+        from django.db import connection
+        debug = settings.DEBUG
+        settings.DEBUG = True
+        try:
+            start = len(connection.queries)
+            small.save()
+            expected = len(connection.queries) - start
+        finally:
+            settings.DEBUG = debug
+
+        with self.assertNumQueries(expected):
+            large.save()
+
+        self.assertEqual(
+            set(large.case.versions.values_list("name", flat=True)),
+            set(["New"]),
+            )
+
+
+    def test_bulk_save(self):
+        """bulk_save saves caseversions, setting latest and syncing names."""
+        c = self.F.CaseFactory.create()
+        p = c.product
+        old = self.F.CaseVersionFactory.create(
+            productversion__product=p, productversion__version="1", case=c,
+            name="Old")
+        pv2 = self.F.ProductVersionFactory.create(product=p, version="2")
+        cv1 = self.model.CaseVersion(case=c, productversion=pv2, name="New")
+        cv2 = self.model.CaseVersion(
+            case=self.F.CaseFactory.create(product=p),
+            productversion=pv2,
+            name="Other",
+            )
+        u = self.F.UserFactory.create()
+
+        self.model.CaseVersion.bulk_save([cv1, cv2], user=u)
+
+        self.assertEqual(
+            [(v.name, v.latest) for v in c.versions.all()],
+            [("New", False), ("New", True)],
+            )
+        self.assertTrue(cv1.latest)
+        self.assertTrue(self.refresh(cv2).latest)
+        self.assertEqual(self.refresh(cv2).created_by, u)
+        self.assertEqual(self.refresh(old).modified_by, u)
+        self.assertEqual(
+            list(self.model.SearchTerm.matching("name", "other")),
+            [{"caseversion": cv2.pk}],
+            )
+
+
     def test_latest_version(self):
         """Case.latest_version() gets latest version."""
         c = self.F.CaseFactory.create()
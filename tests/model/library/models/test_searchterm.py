@@ -0,0 +1,193 @@
+"""
+Tests for SearchTerm model.
+
+"""
+from tests import case
+
+
+
+class SearchTermTest(case.DBTestCase):
+    """Tests for the caseversion search index."""
+    def terms(self, cv, field):
+        """Return set of indexed terms of ``cv`` in ``field``."""
+        return set(
+            self.model.SearchTerm.objects.filter(
+                caseversion=cv, field=field).values_list("term", flat=True))
+
+
+    def matching(self, field, text):
+        """Return set of ids of caseversions matching ``text`` in ``field``."""
+        return set(
+            self.model.SearchTerm.matching(field, text).values_list(
+                "caseversion", flat=True))
+
+
+    def test_words(self):
+        """Words are lower-cased, distinct, and truncated."""
+        self.assertEqual(
+            self.model.SearchTerm.words(u"Log in, log OUT; caf\xe9 " + "x" * 60),
+            set([u"log", u"in", u"out", u"caf\xe9", u"x" * 50]),
+            )
+
+
+    def test_index_on_save(self):
+        """Name and description are indexed when a caseversion is saved."""
+        cv = self.F.CaseVersionFactory.create(
+            name="Log in", description="Use the form.")
+
+        self.assertEqual(self.terms(cv, "name"), set(["log", "in"]))
+        self.assertEqual(
+            self.terms(cv, "description"), set(["use", "the", "form"]))
+
+        cv.name = "Log out"
+        cv.save()
+
+        self.assertEqual(self.terms(cv, "name"), set(["log", "out"]))
+
+
+    def test_index_steps(self):
+        """Step texts are indexed when a step is saved."""
+        step = self.F.CaseStepFactory.create(
+            instruction="Click it", expected="It works")
+        self.F.CaseStepFactory.create(
+            caseversion=step.caseversion, instruction="Click again")
+
+        self.assertEqual(
+            self.terms(step.caseversion, "instruction"),
+            set(["click", "it", "again"]),
+            )
+        self.assertEqual(
+            self.terms(step.caseversion, "expected"), set(["it", "works"]))
+
+
+    def test_skip_index(self):
+        """Steps saved with skip_index are indexed along with the next."""
+        cv = self.F.CaseVersionFactory.create()
+        self.model.CaseStep(
+            caseversion=cv, number=1, instruction="Click").save(
+            skip_index=True)
+
+        self.assertEqual(self.terms(cv, "instruction"), set())
+
+        self.model.CaseStep(
+            caseversion=cv, number=2, instruction="Type").save()
+
+        self.assertEqual(
+            self.terms(cv, "instruction"), set(["click", "type"]))
+
+
+    def test_collation_equal_words(self):
+        """Words the database may collate as equal are all indexed."""
+        cv = self.F.CaseVersionFactory.create(name=u"cafe caf\xe9 CAF\xc9")
+
+        self.assertEqual(self.terms(cv, "name"), set([u"cafe", u"caf\xe9"]))
+
+
+    def test_index_cloned_steps(self):
+        """Steps of a cloned caseversion are indexed."""
+        step = self.F.CaseStepFactory.create(instruction="Click it")
+
+        clone = step.caseversion.clone()
+
+        self.assertEqual(
+            self.terms(clone, "instruction"), set(["click", "it"]))
+
+
+    def test_deleted_step(self):
+        """Deleted steps' words are removed from the index."""
+        step = self.F.CaseStepFactory.create(instruction="Click it")
+
+        step.delete()
+
+        self.assertEqual(self.terms(step.caseversion, "instruction"), set())
+
+        self.refresh(step).undelete()
+
+        self.assertEqual(
+            self.terms(step.caseversion, "instruction"), set(["click", "it"]))
+
+
+    def test_index_many_terms(self):
+        """Terms are inserted in batches the database accepts."""
+        cv = self.F.CaseVersionFactory.create(
+            description=" ".join("w%s" % i for i in range(400)))
+
+        self.assertEqual(len(self.terms(cv, "description")), 400)
+
+
+    def test_matching_prefixes(self):
+        """Every word must be a prefix of a word in the field."""
+        cv1 = self.F.CaseVersionFactory.create(name="Login form")
+        cv2 = self.F.CaseVersionFactory.create(name="Logout button")
+        self.F.CaseVersionFactory.create(name="Other")
+
+        self.assertEqual(self.matching("name", "log"), set([cv1.id, cv2.id]))
+        self.assertEqual(self.matching("name", "FORM log"), set([cv1.id]))
+        self.assertEqual(self.matching("name", "description"), set())
+
+
+    def test_matching_each_word(self):
+        """Several terms starting with one word don't match another word."""
+        self.F.CaseVersionFactory.create(name="Login logout")
+
+        self.assertEqual(self.matching("name", "log form"), set())
+
+
+    def test_matching_redundant_words(self):
+        """A word that is a prefix of another word is matched by its terms."""
+        cv = self.F.CaseVersionFactory.create(name="Login")
+        self.F.CaseVersionFactory.create(name="Log")
+
+        self.assertEqual(self.matching("name", "log login"), set([cv.id]))
+
+
+    def test_matching_steps(self):
+        """Words may be found in different steps."""
+        step = self.F.CaseStepFactory.create(instruction="Click it")
+        self.F.CaseStepFactory.create(
+            caseversion=step.caseversion, instruction="Type")
+
+        self.assertEqual(
+            self.matching("instruction", "type click"),
+            set([step.caseversion.id]),
+            )
+
+
+    def test_matching_subquery(self):
+        """Matching ids can be used in an ``__in`` lookup (as a subquery)."""
+        cv = self.F.CaseVersionFactory.create(name="Login form")
+        self.F.CaseVersionFactory.create(name="Other")
+
+        self.assertEqual(
+            list(self.model.CaseVersion.objects.filter(
+                id__in=self.model.SearchTerm.matching("name", "log"))),
+            [cv],
+            )
+
+
+    def test_matching_no_words(self):
+        """Text without words can't be matched through the index."""
+        self.assertEqual(self.model.SearchTerm.matching("name", "#!"), None)
+
+
+    def test_index(self):
+        """Index can be rebuilt for caseversions changed without saving."""
+        cv = self.F.CaseVersionFactory.create(name="One")
+        self.model.CaseVersion.objects.filter(pk=cv.pk).update(name="Two")
+
+        self.model.SearchTerm.index([cv.id])
+
+        self.assertEqual(self.terms(cv, "name"), set(["two"]))
+
+
+
+class UnmanagedSearchTermTest(case.UnmanagedTestCase):
+    """Tests for indexing outside a managed transaction."""
+    def test_index_on_save(self):
+        """Indexing on save commits, rather than requiring a transaction."""
+        cv = self.F.CaseVersionFactory.create(name="Log in")
+
+        self.assertEqual(
+            set(cv.searchterms.values_list("term", flat=True)),
+            set(["log", "in"]),
+            )
@@ -275,3 +275,27 @@ class ParseBulkTest(case.TestCase):
                     },
                 ]
             )
+
+
+    def test_iter_parse(self):
+        """Cases are yielded as soon as the next one begins."""
+        def lines():
+            yield "Test that one"
+            yield "When this"
+            yield "Then that"
+            yield "Test that two"
+            # the first case is complete before this line is read
+            self.assertEqual([c["name"] for c in parsed], ["Test that one"])
+            yield "When this"
+            yield "Then that"
+
+        parsed = []
+        for item in self.parser().iter_parse(lines()):
+            parsed.append(item)
+
+        self.assertEqual(
+            [c["name"] for c in parsed], ["Test that one", "Test that two"])
+        self.assertEqual(
+            parsed[1]["steps"],
+            [{"instruction": "When this", "expected": "Then that"}],
+            )
@@ -788,3 +788,549 @@ class ImporterTransactionTest(ImporterTestBase, case.TransactionTestCase):
             result.warnings[0]["reason"],
             ImportResult.SKIP_STEP_NO_INSTRUCTION,
             )
+
+
+
+class BulkImporterTest(ImporterTestBase, case.DBTestCase):
+    """Tests for ``Importer`` in bulk mode."""
+    def import_data(self, case_data, pv=None, bulk=True):
+        """Import ``case_data`` into ``pv`` (by default, self.pv)."""
+        from moztrap.model.library.importer import Importer
+        return Importer().import_data(pv or self.pv, case_data, bulk=bulk)
+
+
+    def _count_queries(self, func):
+        """Return number of queries made by calling ``func``."""
+        from django.db import connection
+        from django.conf import settings
+        debug = settings.DEBUG
+        settings.DEBUG = True
+        try:
+            start = len(connection.queries)
+            func()
+            return len(connection.queries) - start
+        finally:
+            settings.DEBUG = debug
+
+
+    def summary(self, pv, result):
+        """Return comparable summary of ``result`` and data in ``pv``."""
+        warnings = [
+            (
+                w["reason"],
+                w["item"].name if hasattr(w["item"], "name") else w["item"],
+                )
+            for w in result.warnings
+            ]
+        cvs = [
+            (
+                cv.name,
+                cv.description,
+                cv.case.idprefix,
+                cv.created_by_id,
+                cv.latest,
+                [
+                    (s.number, s.instruction, s.expected)
+                    for s in cv.steps.all()
+                    ],
+                sorted(t.name for t in cv.tags.all()),
+                sorted(s.name for s in cv.case.suites.all()),
+                sorted(e.id for e in cv.environments.all()),
+                )
+            for cv in pv.caseversions.order_by("id")
+            ]
+        return (result.num_cases, warnings, cvs)
+
+
+    def test_same_as_unbatched(self):
+        """Bulk import gives the same results and data as unbatched import."""
+        user = self.F.UserFactory.create(email="someone@example.com")
+        self.F.CaseVersionFactory.create(productversion=self.pv, name="Old")
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        self.pv.add_envs(*envs)
+        self.model.Tag.objects.create(name="existing", product=self.pv.product)
+        data = {
+            "cases": [
+                {"name": "One", "description": "first", "idprefix": "pre",
+                 "steps": [
+                     {"instruction": "do", "expected": "done"},
+                     {"instruction": "redo"},
+                     ],
+                 "tags": ["existing", "new"], "suites": ["S1", "S2"],
+                 "created_by": "someone@example.com"},
+                {"description": "nameless"},
+                {"name": "Old", "steps": []},
+                {"name": "Two", "created_by": "nobody@example.com",
+                 "tags": ["new"], "suites": ["S1"]},
+                {"name": "One"},
+                {"name": "Three", "created_by": "nobody@example.com",
+                 "steps": [{"instruction": "x"}]},
+                ]
+            }
+        other = self.F.ProductVersionFactory.create(
+            product__name="Other", version=self.pv.version)
+        self.F.CaseVersionFactory.create(productversion=other, name="Old")
+        other.add_envs(*envs)
+        self.model.Tag.objects.create(name="existing", product=other.product)
+
+        unbatched = self.import_data(data, pv=other, bulk=False)
+        bulk = self.import_data(data)
+
+        self.assertEqual(
+            self.summary(self.pv, bulk), self.summary(other, unbatched))
+        self.assertEqual(bulk.num_cases, 3)
+        self.assertEqual(
+            self.model.CaseVersion.objects.get(
+                name="One", productversion=self.pv).created_by,
+            user,
+            )
+
+
+    def test_constant_queries(self):
+        """The number of queries doesn't depend on the number of cases."""
+        def data(names):
+            return {
+                "cases": [
+                    {
+                        "name": name,
+                        "steps": [{"instruction": "do this"}],
+                        "tags": ["tag"],
+                        "suites": ["suite"],
+                        "created_by": "someone@example.com",
+                        }
+                    for name in names
+                    ]
+                }
+        self.F.UserFactory.create(email="someone@example.com")
+        self.pv.add_envs(self.F.EnvironmentFactory.create())
+        self.import_data(data(["Warmup"]))
+
+        few = self._count_queries(lambda: self.import_data(data(["A", "B"])))
+        with self.assertNumQueries(few):
+            self.import_data(data([str(i) for i in range(20)]))
+
+        self.assertEqual(self.model.CaseVersion.objects.count(), 23)
+
+
+    def test_batches(self):
+        """Rows are inserted in batches of at most BATCH_SIZE."""
+        from moztrap.model.library.importer import BulkCaseImporter
+        data = {
+            "cases": [
+                {
+                    "name": str(i),
+                    "steps": [{"instruction": "step %s" % i}],
+                    "tags": ["tag %s" % i],
+                    "suites": ["suite %s" % i],
+                    }
+                for i in range(5)
+                ]
+            }
+
+        with patch.object(BulkCaseImporter, "BATCH_SIZE", 2):
+            result = self.import_data(data)
+
+        self.assertEqual(result.num_cases, 5)
+        for i in range(5):
+            cv = self.model.CaseVersion.objects.get(name=str(i))
+            self.assertEqual(cv.steps.get().instruction, "step %s" % i)
+            self.assertEqual(
+                [t.name for t in cv.tags.all()], ["tag %s" % i])
+            self.assertEqual(
+                [s.name for s in cv.case.suites.all()], ["suite %s" % i])
+
+
+    def test_concurrent_inserts(self):
+        """Rows another import inserts meanwhile don't get this one's data."""
+        manager = self.model.CaseVersion._base_manager
+        bulk_create = manager.bulk_create
+
+        def insert_other_first(objs):
+            self.F.CaseVersionFactory.create(
+                productversion=self.pv, name="Other")
+            return bulk_create(objs)
+
+        with patch.object(manager, "bulk_create", insert_other_first):
+            self.import_data(
+                {"cases": [{"name": "Foo", "steps": [{"instruction": "a"}]}]})
+
+        self.assertEqual(
+            self.model.CaseVersion.objects.get(
+                name="Foo").steps.get().instruction,
+            "a",
+            )
+        self.assertEqual(
+            self.model.CaseVersion.objects.get(name="Other").steps.count(), 0)
+
+
+    def test_step_no_instruction_skip(self):
+        """A case with a step with no instruction is skipped."""
+        result = self.import_data(
+            {
+                "cases": [
+                    {"name": "Foo", "steps": [{"expected": "did this"}]},
+                    {"name": "Foo", "steps": [{"instruction": "do this"}]},
+                    ]
+                }
+            )
+
+        self.assertEqual(result.num_cases, 1)
+        self.assertEqual(
+            [w["reason"] for w in result.warnings],
+            [ImportResult.SKIP_STEP_NO_INSTRUCTION],
+            )
+        self.assertEqual(
+            self.model.CaseVersion.objects.get().steps.get().instruction,
+            "do this",
+            )
+
+
+    def test_ids(self):
+        """Warned-about caseversions have their ids."""
+        result = self.import_data({"cases": [{"name": "Foo"}]})
+
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(result.warnings[0]["item"], cv)
+        self.assertEqual(result.warnings[0]["item"].id, cv.id)
+
+
+    def test_searchable(self):
+        """Imported caseversions are indexed for search."""
+        self.import_data(
+            {"cases": [{"name": "Foo", "steps": [{"instruction": "jump"}]}]})
+
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(
+            list(self.model.SearchTerm.matching("instruction", "jump")),
+            [{"caseversion": cv.id}],
+            )
+
+
+    def test_global_tag(self):
+        """An existing global tag is used, but a product tag is preferred."""
+        global_tag = self.model.Tag.objects.create(name="global")
+        self.model.Tag.objects.create(name="both")
+        product_tag = self.model.Tag.objects.create(
+            name="both", product=self.pv.product)
+
+        self.import_data(
+            {"cases": [{"name": "Foo", "tags": ["global", "both"]}]})
+
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(
+            set(cv.tags.all()), set([global_tag, product_tag]))
+        self.assertEqual(self.model.Tag.objects.count(), 3)
+
+
+    def test_suites(self):
+        """Suites are created once, with descriptions, and counted once."""
+        existing = self.F.SuiteFactory.create(
+            name="Existing", product=self.pv.product)
+
+        result = self.import_data(
+            {
+                "suites": [
+                    {"name": "New", "description": "new suite"},
+                    {"description": "nameless"},
+                    ],
+                "cases": [
+                    {"name": "Foo", "suites": ["New", "Existing"]},
+                    {"name": "Bar", "suites": ["New", "Other"]},
+                    ],
+                }
+            )
+
+        self.assertEqual(result.num_suites, 2)
+        self.assertEqual(
+            [w["reason"] for w in result.warnings].count(
+                ImportResult.SKIP_SUITE_NO_NAME),
+            1,
+            )
+        new = self.model.Suite.objects.get(name="New")
+        self.assertEqual(new.description, "new suite")
+        self.assertEqual(
+            sorted(new.cases.values_list("versions__name", flat=True)),
+            ["Bar", "Foo"],
+            )
+        self.assertEqual(
+            list(existing.cases.values_list("versions__name", flat=True)),
+            ["Foo"],
+            )
+
+
+
+class StreamImporterTest(ImporterTestBase, case.DBTestCase):
+    """Tests for ``Importer.import_stream``."""
+    def import_stream(self, case_data, **kwargs):
+        """Import ``case_data`` as a stream of JSON; return result."""
+        from cStringIO import StringIO
+        import json
+        from moztrap.model.library.importer import Importer
+        return Importer().import_stream(
+            self.pv, StringIO(json.dumps(case_data)), **kwargs)
+
+
+    def test_same_as_bulk(self):
+        """Streamed data is imported as by the bulk importer."""
+        self.F.CaseVersionFactory.create(productversion=self.pv, name="Old")
+        cases = [
+            {"name": "One", "steps": [{"instruction": "do"}],
+             "tags": ["tag"], "suites": ["Suite"]},
+            {"description": "nameless"},
+            {"name": "Old"},
+            {"name": "Two", "steps": [{"expected": "no instruction"}]},
+            {"name": "One", "suites": ["Suite"]},
+            {"name": "Three", "tags": ["tag"], "suites": ["Other"]},
+            ]
+
+        result = self.import_stream({"cases": cases}, batch_size=2)
+
+        self.assertEqual(result.num_cases, 2)
+        self.assertEqual(result.num_suites, 2)
+        self.assertEqual(
+            [w["reason"] for w in result.warnings],
+            [
+                ImportResult.SKIP_CASE_NO_NAME,
+                ImportResult.SKIP_CASE_NAME_CONFLICT,
+                ImportResult.SKIP_STEP_NO_INSTRUCTION,
+                ImportResult.SKIP_CASE_NAME_CONFLICT,
+                ImportResult.WARN_NO_STEPS,
+                ],
+            )
+        self.assertEqual(
+            sorted(
+                (cv.name, [t.name for t in cv.tags.all()],
+                 [s.name for s in cv.case.suites.all()])
+                for cv in self.pv.caseversions.exclude(name="Old")
+                ),
+            [("One", ["tag"], ["Suite"]), ("Three", ["tag"], ["Other"])],
+            )
+        self.assertEqual(self.model.Tag.objects.count(), 1)
+
+
+    def test_progress(self):
+        """Progress is reported with the number of cases read per batch."""
+        progress = []
+
+        self.import_stream(
+            {"cases": [{"name": str(i)} for i in range(5)]},
+            batch_size=2,
+            progress=progress.append,
+            )
+
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertEqual(self.model.CaseVersion.objects.count(), 5)
+
+
+    def test_batches(self):
+        """Cases are passed to the case importer a batch at a time."""
+        target = "moztrap.model.library.importer.BulkCaseImporter.import_cases"
+        with patch(target) as import_cases:
+            import_cases.return_value = ImportResult()
+            self.import_stream(
+                {"cases": [{"name": str(i)} for i in range(5)]}, batch_size=2)
+
+        self.assertEqual(
+            [len(c[0][0]) for c in import_cases.call_args_list], [2, 2, 1])
+
+
+    def test_suites_after_cases(self):
+        """Suite descriptions apply even if suites follow the cases."""
+        from cStringIO import StringIO
+        from moztrap.model.library.importer import Importer
+        data = (
+            '{"cases": [{"name": "Foo", "suites": ["S"]},'
+            ' {"name": "Bar", "suites": ["S"]}],'
+            ' "suites": [{"name": "S", "description": "a suite"}]}'
+            )
+
+        result = Importer().import_stream(
+            self.pv, StringIO(data), batch_size=1)
+
+        suite = self.model.Suite.objects.get()
+        self.assertEqual(suite.description, "a suite")
+        self.assertEqual(suite.cases.count(), 2)
+        self.assertEqual(result.num_suites, 1)
+
+
+    def test_bad_json(self):
+        """Invalid JSON raises ValueError."""
+        from cStringIO import StringIO
+        from moztrap.model.library.importer import Importer
+
+        with self.assertRaises(ValueError):
+            Importer().import_stream(
+                self.pv, StringIO('{"cases": [{"name": "Foo"} {}]}'))
+
+
+    def test_csv(self):
+        """Cases can be imported from CSV."""
+        from cStringIO import StringIO
+        from moztrap.model.library.importer import Importer
+        data = "name,tags,instruction1,expected1\nFoo,\"a, b\",do,done\n"
+
+        result = Importer().import_stream(
+            self.pv, StringIO(data), format="csv")
+
+        self.assertEqual(result.num_cases, 1)
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(cv.name, "Foo")
+        self.assertEqual(
+            sorted(t.name for t in cv.tags.all()), ["a", "b"])
+        self.assertEqual(
+            [(s.instruction, s.expected) for s in cv.steps.all()],
+            [("do", "done")],
+            )
+
+
+    def test_text(self):
+        """Cases can be imported from bulk test case text."""
+        from cStringIO import StringIO
+        from moztrap.model.library.importer import Importer
+        data = "Test that foo\nWhen I do\nThen it is done\n"
+
+        result = Importer().import_stream(
+            self.pv, StringIO(data), format="text")
+
+        self.assertEqual(result.num_cases, 1)
+        cv = self.model.CaseVersion.objects.get()
+        self.assertEqual(cv.name, "Test that foo")
+        self.assertEqual(
+            [(s.instruction, s.expected) for s in cv.steps.all()],
+            [("When I do", "Then it is done")],
+            )
+
+
+
+class ImportFilesTest(ImporterTestBase, case.DBTestCase):
+    """Tests for ``import_files``."""
+    def setUp(self):
+        """Also keep a list of temporary files to remove."""
+        super(ImportFilesTest, self).setUp()
+        self.paths = []
+
+
+    def tearDown(self):
+        """Remove temporary files."""
+        import os
+        for path in self.paths:
+            os.remove(path)
+        super(ImportFilesTest, self).tearDown()
+
+
+    def files(self, *datas):
+        """Write each of ``datas`` as JSON to a temp file; return paths."""
+        import json
+        import os
+        from tempfile import mkstemp
+        for data in datas:
+            (fd, path) = mkstemp()
+            self.paths.append(path)
+            with os.fdopen(fd, "w") as fh:
+                fh.write(json.dumps(data))
+        return self.paths[-len(datas):]
+
+
+    def import_files(self, paths, **kwargs):
+        """Call ``import_files`` for self.pv and return result."""
+        from moztrap.model.library.importer import import_files
+        return import_files(self.pv, paths, **kwargs)
+
+
+    def test_shared_tags_suites(self):
+        """Tags and suites named in several files are created once."""
+        paths = self.files(
+            {
+                "suites": [{"name": "S", "description": "a suite"}],
+                "cases": [{"name": "One", "tags": ["t"], "suites": ["S"]}],
+                },
+            {"cases": [{"name": "Two", "tags": ["t"], "suites": ["S", "T"]}]},
+            )
+
+        result = self.import_files(paths)
+
+        self.assertEqual((result.num_cases, result.num_suites), (2, 2))
+        tag = self.model.Tag.objects.get()
+        self.assertEqual(tag.product, self.pv.product)
+        self.assertEqual(tag.caseversions.count(), 2)
+        suite = self.model.Suite.objects.get(name="S")
+        self.assertEqual(suite.description, "a suite")
+        self.assertEqual(suite.cases.count(), 2)
+
+
+    def test_first_file_wins(self):
+        """A case name imported by one file is skipped in later files."""
+        paths = self.files(
+            {
+                "cases": [
+                    {"name": "One", "description": "first"},
+                    {"name": "Bad", "steps": [{"expected": "nothing"}]},
+                    ],
+                },
+            {
+                "cases": [
+                    {"name": "One", "description": "second"},
+                    {"name": "Bad", "steps": [{"instruction": "do"}]},
+                    ],
+                },
+            )
+
+        result = self.import_files(paths)
+
+        self.assertEqual(
+            [w["reason"] for w in result.warnings],
+            [
+                ImportResult.WARN_NO_STEPS,
+                ImportResult.SKIP_STEP_NO_INSTRUCTION,
+                ImportResult.SKIP_CASE_NAME_CONFLICT,
+                ],
+            )
+        self.assertEqual(
+            sorted(self.pv.caseversions.values_list("name", "description")),
+            [("Bad", ""), ("One", "first")],
+            )
+
+
+    def test_force_dupes(self):
+        """With force_dupes, cases of the same name are all imported."""
+        paths = self.files(
+            {"cases": [{"name": "One"}]}, {"cases": [{"name": "One"}]})
+
+        result = self.import_files(paths, force_dupes=True)
+
+        self.assertEqual(result.num_cases, 2)
+
+
+    def test_bad_json(self):
+        """Nothing is imported if any file is not valid JSON."""
+        paths = self.files({"cases": [{"name": "One", "tags": ["t"]}]})
+        with open(paths[0], "a") as fh:
+            fh.write("{")
+
+        with self.assertRaises(ValueError):
+            self.import_files(paths)
+
+        self.assertEqual(self.model.CaseVersion.objects.count(), 0)
+        self.assertEqual(self.model.Tag.objects.count(), 0)
+
+
+    def test_jobs(self):
+        """With several jobs, files are imported in a process pool."""
+        paths = self.files(
+            {"cases": [{"name": "One"}]}, {"cases": [{"name": "Two"}]})
+
+        target = "moztrap.model.library.importer.multiprocessing.Pool"
+        with patch(target) as Pool:
+            Pool.return_value.map.side_effect = map
+            result = self.import_files(paths, jobs=2)
+
+        Pool.assert_called_once_with(2)
+        self.assertEqual(
+            [t[1] for t in Pool.return_value.map.call_args[0][1]], paths)
+        self.assertTrue(Pool.return_value.terminate.called)
+        self.assertEqual(result.num_cases, 2)
+        self.assertEqual(
+            sorted(self.pv.caseversions.values_list("name", flat=True)),
+            ["One", "Two"],
+            )
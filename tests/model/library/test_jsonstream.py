@@ -0,0 +1,101 @@
+"""
+Tests for incremental JSON reading.
+
+"""
+from cStringIO import StringIO
+import json
+
+from tests import case
+
+
+
+class IterArraysTest(case.TestCase):
+    """Tests for iter_arrays."""
+    def items(self, data, keys=("cases", "suites"), chunk_size=3):
+        """Return list of (key, item) read from ``data`` in small chunks."""
+        from moztrap.model.library.jsonstream import iter_arrays
+        return list(iter_arrays(StringIO(data), keys, chunk_size=chunk_size))
+
+
+    def test_items(self):
+        """Items of arrays are yielded in order, across chunk boundaries."""
+        data = {
+            "suites": [{"name": "S", "description": u"\u00e9t\u00e9"}],
+            "cases": [
+                {"name": "Foo", "steps": [{"instruction": "a, [b]"}]},
+                12345,
+                None,
+                ],
+            }
+        text = json.dumps(data, indent=4)
+
+        self.assertEqual(
+            sorted(self.items(text)),
+            sorted(
+                [("suites", data["suites"][0])] +
+                [("cases", item) for item in data["cases"]]
+                ),
+            )
+
+
+    def test_utf8_split(self):
+        """UTF-8 encoded characters split across chunks are read whole."""
+        self.assertEqual(
+            self.items('{"cases": ["\xc3\xa9t\xc3\xa9"]}', chunk_size=1),
+            [("cases", u"\u00e9t\u00e9")],
+            )
+
+
+    def test_file_order(self):
+        """Arrays are read in the order they appear in the file."""
+        self.assertEqual(
+            self.items('{"cases": [1, 2], "suites": [3]}'),
+            [("cases", 1), ("cases", 2), ("suites", 3)],
+            )
+
+
+    def test_other_keys(self):
+        """Values of other keys are skipped."""
+        self.assertEqual(
+            self.items('{"a": {"cases": [1]}, "cases": [2], "b": "c"}'),
+            [("cases", 2)],
+            )
+
+
+    def test_empty(self):
+        """Empty objects and arrays yield nothing."""
+        self.assertEqual(self.items(' { } '), [])
+        self.assertEqual(self.items('{"cases": [ ]}'), [])
+
+
+    def test_numbers_at_chunk_end(self):
+        """Numbers split across chunks are read whole."""
+        self.assertEqual(
+            self.items('{"cases":[1234567,8]}', chunk_size=1),
+            [("cases", 1234567), ("cases", 8)],
+            )
+
+
+    def test_bad_json(self):
+        """Invalid JSON raises ValueError."""
+        for data in [
+                "",
+                "[]",
+                "{",
+                '{"cases": [1 2]}',
+                '{"cases": 1}',
+                '{"cases": [1]',
+                '{1: 2}',
+                '{"cases": []} {}',
+                '{"cases": [{"name": }]}',
+                ]:
+            with self.assertRaises(ValueError):
+                self.items(data)
+
+
+    def test_position(self):
+        """Errors give the position in the whole file."""
+        with self.assertRaises(ValueError) as cm:
+            self.items('{"cases": [1, 2] "suites": []}')
+
+        self.assertEqual(str(cm.exception), "Expecting ',' or '}': char 17")
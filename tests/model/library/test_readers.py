@@ -0,0 +1,134 @@
+"""
+Tests for readers of importable file formats.
+
+"""
+from cStringIO import StringIO
+import textwrap
+
+from tests import case
+
+
+
+class ReadCsvTest(case.TestCase):
+    """Tests for read_csv."""
+    def read(self, *lines):
+        """Return list of data read from CSV of given lines."""
+        from moztrap.model.library.readers import read_csv
+        return list(read_csv(StringIO("\r\n".join(lines))))
+
+
+    def test_cases(self):
+        """Each row is a case; empty cells are left out."""
+        data = self.read(
+            "Name,Description,Tags,Suites,created_by,"
+            "instruction1,expected1,instruction 2,expected 2",
+            'Log in,"Log in, then out","a, b",S,a@example.com,click,in,,',
+            "Log out,,,,,click,,,out",
+            "Empty,,,,,,,,",
+            ",,,,,,,,",
+            )
+
+        self.assertEqual(
+            data,
+            [
+                (
+                    "cases",
+                    {
+                        "name": "Log in",
+                        "description": "Log in, then out",
+                        "tags": ["a", "b"],
+                        "suites": ["S"],
+                        "created_by": "a@example.com",
+                        "steps": [{"instruction": "click", "expected": "in"}],
+                        },
+                    ),
+                (
+                    "cases",
+                    {
+                        "name": "Log out",
+                        "steps": [
+                            {"instruction": "click"},
+                            {"expected": "out"},
+                            ],
+                        },
+                    ),
+                ("cases", {"name": "Empty"}),
+                ],
+            )
+
+
+    def test_unicode(self):
+        """Cells are decoded as UTF-8."""
+        data = self.read("name", "\xc3\xa9t\xc3\xa9")
+
+        self.assertEqual(data, [("cases", {"name": u"\u00e9t\u00e9"})])
+
+
+    def test_unknown_column(self):
+        """An unknown column is an error."""
+        with self.assertRaises(ValueError) as cm:
+            self.read("name,title", "foo,bar")
+
+        self.assertEqual(str(cm.exception), "Unknown CSV column u'title'")
+
+
+    def test_no_name_column(self):
+        """A header without a name column is an error."""
+        with self.assertRaises(ValueError):
+            self.read("description", "foo")
+
+
+    def test_bad_csv(self):
+        """Malformed CSV is an error."""
+        with self.assertRaises(ValueError) as cm:
+            self.read("name", "foo", "b\x00r")
+
+        self.assertTrue(str(cm.exception).startswith("line 3: "))
+
+
+
+class ReadTextTest(case.TestCase):
+    """Tests for read_text."""
+    def read(self, text):
+        """Return list of data read from given bulk text."""
+        from moztrap.model.library.readers import read_text
+        return list(read_text(StringIO(textwrap.dedent(text))))
+
+
+    def test_cases(self):
+        """Cases are read as parsed by BulkParser."""
+        data = self.read(
+            """
+            Test that I can log in
+            When I click the login button
+            Then I am logged in
+            Test that I can log out
+            When I click the logout button
+            Then I am logged out
+            """
+            )
+
+        self.assertEqual(
+            [c["name"] for k, c in data],
+            ["Test that I can log in", "Test that I can log out"],
+            )
+        self.assertEqual(
+            data[1][1]["steps"],
+            [
+                {
+                    "instruction": "When I click the logout button",
+                    "expected": "Then I am logged out",
+                    }
+                ],
+            )
+
+
+    def test_error(self):
+        """A parsing error is raised as ValueError."""
+        with self.assertRaises(ValueError) as cm:
+            self.read("Test that I can log in\n")
+
+        self.assertEqual(
+            str(cm.exception),
+            "Unexpected end of input, looking for 'When ' or 'And When '",
+            )
@@ -0,0 +1,165 @@
+"""
+Tests for request-scoped identity map.
+
+"""
+from tests import case
+
+
+
+class IdentityMapTest(case.DBTestCase):
+    """Tests for the identity map functions, with and without an active map."""
+    @property
+    def identity(self):
+        """The module under test."""
+        from moztrap.model import identity
+        return identity
+
+
+    def test_get(self):
+        """Instances are fetched once and shared while a map is active."""
+        pv = self.F.ProductVersionFactory.create()
+
+        with self.identity.active() as identity_map:
+            with self.assertNumQueries(1):
+                first = self.identity.get(self.model.ProductVersion, pv.id)
+                second = self.identity.get(
+                    self.model.ProductVersion, str(pv.id))
+
+        self.assertEqual(first, pv)
+        self.assertIs(first, second)
+        self.assertEqual(
+            identity_map.stats(), {"core.ProductVersion": (1, 1)})
+
+
+    def test_get_inactive(self):
+        """Without an active map, every lookup queries."""
+        pv = self.F.ProductVersionFactory.create()
+
+        with self.assertNumQueries(2):
+            first = self.identity.get(self.model.ProductVersion, pv.id)
+            second = self.identity.get(self.model.ProductVersion, pv.id)
+
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+
+    def test_get_does_not_exist(self):
+        """Missing and deleted instances raise DoesNotExist."""
+        env = self.F.EnvironmentFactory.create()
+        result = self.F.ResultFactory.create(environment=env)
+        env.delete()
+
+        with self.identity.active():
+            self.identity.related(self.refresh(result), "environment")
+            for pk in [env.id, env.id + 1, None]:
+                with self.assertRaises(self.model.Environment.DoesNotExist):
+                    self.identity.get(self.model.Environment, pk)
+
+
+    def test_get_many(self):
+        """Instances not yet in the map are fetched in one query."""
+        envs = [self.F.EnvironmentFactory.create() for i in range(3)]
+
+        with self.identity.active():
+            self.identity.get(self.model.Environment, envs[0].id)
+            with self.assertNumQueries(1):
+                found = self.identity.current().get_many(
+                    self.model.Environment,
+                    [e.id for e in envs] + [envs[2].id + 1],
+                    )
+
+        self.assertEqual(found, dict((e.id, e) for e in envs))
+
+
+    def test_related(self):
+        """Foreign keys to the same object are followed with one query."""
+        pv = self.F.ProductVersionFactory.create()
+        cvs = [
+            self.F.CaseVersionFactory.create(productversion=pv)
+            for i in range(3)
+            ]
+        cvs = list(
+            self.model.CaseVersion.objects.filter(id__in=[cv.id for cv in cvs]))
+
+        with self.identity.active() as identity_map:
+            with self.assertNumQueries(2):
+                products = [
+                    self.identity.related(
+                        self.identity.related(cv, "productversion"),
+                        "product")
+                    for cv in cvs
+                    ]
+
+        self.assertEqual(products, [pv.product] * 3)
+        self.assertIs(cvs[0].productversion, cvs[1].productversion)
+        self.assertEqual(
+            identity_map.stats(),
+            {"core.ProductVersion": (2, 1), "core.Product": (2, 1)},
+            )
+
+
+    def test_related_null(self):
+        """A null foreign key is followed to None."""
+        cv = self.F.CaseVersionFactory.create(created_by=None)
+
+        with self.identity.active():
+            self.assertIsNone(self.identity.related(cv, "created_by"))
+
+
+    def test_add(self):
+        """Added instances are shared; without an active map, kept as is."""
+        user = self.F.UserFactory.create()
+        first = self.refresh(user)
+        second = self.refresh(user)
+
+        self.assertIs(self.identity.add(first), first)
+        with self.identity.active():
+            self.assertIs(self.identity.add(first), first)
+            self.assertIs(self.identity.add(second), first)
+            with self.assertNumQueries(0):
+                self.assertIs(
+                    self.identity.get(self.model.User, user.id), first)
+
+
+    def test_memoize(self):
+        """Memoized values are computed once while a map is active."""
+        env = self.F.EnvironmentFactory.create()
+        calls = []
+
+        def func():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(self.identity.memoize(env, "x", func), 1)
+        with self.identity.active():
+            self.assertEqual(self.identity.memoize(env, "x", func), 2)
+            self.assertEqual(self.identity.memoize(env, "x", func), 2)
+            self.identity.forget(self.model.Environment, [env.id])
+            self.assertEqual(self.identity.memoize(env, "x", func), 3)
+
+
+    def test_ordered_elements(self):
+        """Environment elements are memoized, and forgotten on change."""
+        env = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X"], "Language": ["English"]})[0]
+        other = self.F.ElementFactory.create(name="Linux")
+
+        with self.identity.active():
+            list(env.ordered_elements())
+            fresh = self.refresh(env)
+            with self.assertNumQueries(0):
+                names = [e.name for e in fresh.ordered_elements()]
+            env.elements.add(other)
+            with self.assertNumQueries(1):
+                self.assertEqual(len(list(env.ordered_elements())), 3)
+
+        self.assertEqual(names, [u"English", u"OS X"])
+
+
+    def test_active_nests(self):
+        """The active context manager restores any previous map."""
+        with self.identity.active() as outer:
+            with self.identity.active() as inner:
+                self.assertIs(self.identity.current(), inner)
+            self.assertIs(self.identity.current(), outer)
+        self.assertIsNone(self.identity.current())
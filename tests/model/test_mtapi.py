@@ -0,0 +1,53 @@
+"""
+Tests for MT base API utilities.
+
+"""
+from django.http import QueryDict
+
+from tastypie.exceptions import BadRequest
+
+from tests import case
+
+
+
+class KeysetPaginatorTest(case.DBTestCase):
+    """Tests for KeysetPaginator."""
+    def paginator(self, querystring, objects):
+        """Return paginator for given querystring and objects."""
+        from moztrap.model.mtapi import KeysetPaginator
+        return KeysetPaginator(
+            QueryDict(querystring), objects, resource_uri="/api/", limit=2)
+
+
+    def test_offset(self):
+        """Without a cursor, paginates by offset."""
+        self.F.ProductFactory.create()
+
+        page = self.paginator("", self.model.Product.objects.all()).page()
+
+        self.assertEqual(page["meta"]["total_count"], 1)
+        self.assertEqual(page["meta"]["offset"], 0)
+
+
+    def test_cursor(self):
+        """With a cursor, next URL has the cursor to the following page."""
+        for name in "abc":
+            self.F.ProductFactory.create(name=name)
+
+        page = self.paginator(
+            "cursor=&offset=4", self.model.Product.objects.all()).page()
+
+        self.assertEqual([p.name for p in page["objects"]], ["a", "b"])
+        self.assertEqual(page["meta"]["previous"], None)
+        self.assertTrue(page["meta"]["next"].startswith("/api/?"))
+        self.assertIn("cursor=", page["meta"]["next"])
+        self.assertNotIn("offset", page["meta"]["next"])
+
+
+    def test_cursor_bad_order(self):
+        """Cursor pagination is refused for an order it can't key on."""
+        paginator = self.paginator(
+            "cursor=", self.model.RunCaseVersion.objects.order_by("run"))
+
+        with self.assertRaises(BadRequest):
+            paginator.page()
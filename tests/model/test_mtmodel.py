@@ -21,6 +21,20 @@ class MTModelTestCase(case.DBTestCase):
         self.user = self.F.UserFactory.create()
 
 
+    def _count_queries(self, func):
+        """Return number of queries made by calling ``func``."""
+        from django.db import connection
+        from django.conf import settings
+        debug = settings.DEBUG
+        settings.DEBUG = True
+        try:
+            start = len(connection.queries)
+            func()
+            return len(connection.queries) - start
+        finally:
+            settings.DEBUG = debug
+
+
 
 class UserDeleteTest(MTModelTestCase):
     """Tests for deleting users, and the effect on MTModels."""
@@ -433,6 +447,135 @@ class CascadeDeleteTest(MTModelTestCase):
             self.refresh(s).deleted_on, self.refresh(p).deleted_on)
 
 
+    def test_no_cascade_same_second(self):
+        """Rows deleted otherwise in the same second don't cascade."""
+        p1 = self.F.ProductFactory.create()
+        p2 = self.F.ProductFactory.create()
+        s = self.F.SuiteFactory.create(product=p2)
+        with patch("moztrap.model.mtmodel.datetime") as mock_dt:
+            mock_dt.datetime.utcnow.return_value = datetime.datetime(
+                2011, 12, 13, 10, 23, 58)
+            self.model.Product.everything.filter(pk=p2.pk).update(
+                deleted_on=datetime.datetime(2011, 12, 13, 10, 23, 58))
+            p1.delete()
+
+        self.assertEqual(self.refresh(s).deleted_on, None)
+
+
+    def test_deep_cascade(self):
+        """Deletion cascades through several levels of relations."""
+        r = self.F.ResultFactory.create()
+        step = self.F.CaseStepFactory.create(
+            caseversion=r.runcaseversion.caseversion)
+        pv = r.runcaseversion.run.productversion
+
+        pv.product.delete()
+
+        for obj in [pv, r.runcaseversion.run, r.runcaseversion, r, step]:
+            self.assertIsNot(self.refresh(obj).deleted_on, None)
+
+
+    def test_cascade_self_relation(self):
+        """Deletion cascades along a foreign key to the same model."""
+        series = self.F.RunFactory.create(is_series=True)
+        run = self.F.RunFactory.create(series=series)
+
+        series.delete()
+
+        self.assertIsNot(self.refresh(run).deleted_on, None)
+
+
+    def test_cascade_queries(self):
+        """Number of queries doesn't depend on the number of objects."""
+        def create(results):
+            rcv = self.F.RunCaseVersionFactory.create()
+            for i in range(results):
+                self.F.ResultFactory.create(runcaseversion=rcv)
+            return rcv.run
+
+        small = create(1)
+        large = create(5)
+
+        with self.assertNumQueries(self._count_queries(small.delete)):
+            large.delete()
+
+
+    def test_chunked(self):
+        """Cascades to many children are applied in ranges of pks."""
+        p = self.F.ProductFactory.create()
+        suites = [self.F.SuiteFactory.create(product=p) for i in range(3)]
+        cases = [self.F.SuiteCaseFactory.create(suite=s) for s in suites]
+
+        with patch("moztrap.model.mtmodel.SOFT_DELETE_RANGE_SIZE", 1):
+            p.delete()
+
+        for obj in suites + cases:
+            self.assertIsNot(self.refresh(obj).deleted_on, None)
+
+
+    def test_chunked_queryset(self):
+        """Many objects deleted directly are deleted in chunks."""
+        suites = [self.F.SuiteFactory.create() for i in range(3)]
+        cases = [self.F.SuiteCaseFactory.create(suite=s) for s in suites]
+
+        with patch("moztrap.model.mtmodel.SOFT_DELETE_CHUNK_SIZE", 2):
+            self.model.Suite.objects.all().delete()
+
+        for obj in suites + cases:
+            self.assertIsNot(self.refresh(obj).deleted_on, None)
+
+
+    def test_cascade_self_relation_preselect(self):
+        """Without self-select in updates, cascades to the same model work."""
+        from django.db import connection
+        series = self.F.RunFactory.create(is_series=True)
+        run = self.F.RunFactory.create(series=series)
+
+        with patch.object(
+                connection.features, "update_can_self_select", False):
+            series.delete()
+
+        self.assertIsNot(self.refresh(run).deleted_on, None)
+
+
+    def test_signal(self):
+        """post_soft_delete is sent with a queryset of deleted objects."""
+        from moztrap.model.mtmodel import post_soft_delete
+        p = self.F.ProductFactory.create()
+        s = self.F.SuiteFactory.create(product=p)
+        received = []
+
+        def receiver(sender, queryset, **kwargs):
+            received.append(list(queryset))
+        post_soft_delete.connect(receiver, sender=self.model.Suite)
+        self.addCleanup(
+            post_soft_delete.disconnect, receiver, sender=self.model.Suite)
+
+        p.delete()
+
+        self.assertEqual(received, [[s]])
+
+
+    def test_signal_once(self):
+        """post_soft_delete is sent once per model, however it's chunked."""
+        from moztrap.model.mtmodel import post_soft_delete
+        products = [self.F.ProductFactory.create() for i in range(3)]
+        suites = [self.F.SuiteFactory.create(product=p) for p in products]
+        received = []
+
+        def receiver(sender, queryset, **kwargs):
+            received.append(set(queryset))
+        post_soft_delete.connect(receiver, sender=self.model.Suite)
+        self.addCleanup(
+            post_soft_delete.disconnect, receiver, sender=self.model.Suite)
+
+        with patch("moztrap.model.mtmodel.SOFT_DELETE_CHUNK_SIZE", 2):
+            with patch("moztrap.model.mtmodel.SOFT_DELETE_RANGE_SIZE", 1):
+                self.model.Product.objects.all().delete()
+
+        self.assertEqual(received, [set(suites)])
+
+
 
 class UndeleteMixin(object):
     """Utility assertions mixin for undelete tests."""
@@ -571,6 +714,279 @@ class CloneTest(UndeleteMixin, MTModelTestCase):
 
 
 
+class CommitRawSqlTest(case.UnmanagedTestCase):
+    """Tests for commit_raw_sql, outside a managed transaction."""
+    def test_unmanaged(self):
+        """Raw writes outside a managed transaction are committed."""
+        from django.db import transaction
+        from moztrap.model.mtmodel import bulk_clone
+        s = self.F.SuiteFactory.create(name="One")
+
+        mapping = bulk_clone(self.model.Suite.objects.filter(pk=s.pk))
+
+        self.assertFalse(transaction.is_dirty())
+        self.assertEqual(
+            self.model.Suite.objects.get(pk=mapping[s.pk]).name, "One")
+
+
+    def test_managed(self):
+        """Within a managed transaction, it is marked dirty."""
+        from django.db import transaction
+        from moztrap.model.mtmodel import commit_raw_sql
+
+        with transaction.commit_manually():
+            commit_raw_sql()
+            dirty = transaction.is_dirty()
+            transaction.rollback()
+
+        self.assertTrue(dirty)
+
+
+
+class BulkCloneTest(MTModelTestCase):
+    """Tests for bulk_clone."""
+    def bulk_clone(self, *args, **kwargs):
+        from moztrap.model.mtmodel import bulk_clone
+        return bulk_clone(*args, **kwargs)
+
+
+    def test_mapping(self):
+        """Returns mapping of original to cloned pks; fields are copied."""
+        s1 = self.F.SuiteFactory.create(name="One", status="active")
+        s2 = self.F.SuiteFactory.create(name="Two")
+
+        mapping = self.bulk_clone(
+            self.model.Suite.objects.filter(pk__in=[s1.pk, s2.pk]))
+
+        self.assertEqual(set(mapping), set([s1.pk, s2.pk]))
+        clone = self.model.Suite.objects.get(pk=mapping[s1.pk])
+        self.assertEqual(clone.name, "One")
+        self.assertEqual(clone.status, "active")
+        self.assertEqual(clone.product, s1.product)
+        self.assertEqual(
+            self.model.Suite.objects.get(pk=mapping[s2.pk]).name, "Two")
+
+
+    @patch("moztrap.model.mtmodel.datetime")
+    def test_tracking(self, mock_dt):
+        """Clones get new created/modified timestamps and users."""
+        mock_dt.datetime.utcnow.return_value = datetime.datetime(2012, 1, 30)
+        s = self.F.SuiteFactory.create(user=self.F.UserFactory.create())
+
+        cloned_on = datetime.datetime(2012, 1, 31)
+        mock_dt.datetime.utcnow.return_value = cloned_on
+        mapping = self.bulk_clone(
+            self.model.Suite.objects.filter(pk=s.pk), user=self.user)
+
+        clone = self.model.Suite.objects.get(pk=mapping[s.pk])
+        self.assertEqual(clone.created_on, cloned_on)
+        self.assertEqual(clone.created_by, self.user)
+        self.assertEqual(clone.modified_on, cloned_on)
+        self.assertEqual(clone.modified_by, self.user)
+
+
+    def test_overrides(self):
+        """Overrides may be values, or maps from original values."""
+        p = self.F.ProductFactory.create()
+        s1 = self.F.SuiteFactory.create()
+        s2 = self.F.SuiteFactory.create()
+
+        mapping = self.bulk_clone(
+            self.model.Suite.objects.filter(pk__in=[s1.pk, s2.pk]),
+            overrides={"name": "New", "product": {s1.product.pk: p}},
+            )
+
+        self.assertEqual(
+            self.model.Suite.objects.get(pk=mapping[s1.pk]).product, p)
+        clone = self.model.Suite.objects.get(pk=mapping[s2.pk])
+        self.assertEqual(clone.product, s2.product)
+        self.assertEqual(clone.name, "New")
+
+
+    def test_cascade(self):
+        """Reverse foreign keys and m2m relations are cloned along."""
+        cv = self.F.CaseVersionFactory.create()
+        self.F.CaseStepFactory.create(caseversion=cv, number=1)
+        self.F.CaseStepFactory.create(caseversion=cv, number=2)
+        self.F.CaseStepFactory.create(caseversion=cv, number=3).delete()
+        t = self.F.TagFactory.create()
+        cv.tags.add(t)
+        pv = self.F.ProductVersionFactory.create(product=cv.case.product)
+
+        mapping = self.bulk_clone(
+            self.model.CaseVersion.objects.filter(pk=cv.pk),
+            cascade=["steps", "tags"],
+            overrides={"productversion": pv},
+            )
+
+        clone = self.model.CaseVersion.objects.get(pk=mapping[cv.pk])
+        self.assertEqual([s.number for s in clone.steps.all()], [1, 2])
+        self.assertEqual(list(clone.tags.all()), [t])
+        self.assertEqual([s.number for s in cv.steps.all()], [1, 2])
+
+
+    def test_cascade_filter(self):
+        """A cascade dictionary filters the related objects to clone."""
+        s = self.F.SuiteFactory.create()
+        sc1 = self.F.SuiteCaseFactory.create(suite=s, order=1)
+        self.F.SuiteCaseFactory.create(suite=s, order=2)
+
+        mapping = self.bulk_clone(
+            self.model.Suite.objects.filter(pk=s.pk),
+            cascade={"suitecases": lambda qs: qs.filter(order=1)},
+            )
+
+        self.assertEqual(
+            [sc.case for sc in self.model.SuiteCase.objects.filter(
+                suite=mapping[s.pk])],
+            [sc1.case],
+            )
+
+
+    def test_cascade_through_model(self):
+        """Cannot cascade a m2m relation with its own through model."""
+        s = self.F.SuiteFactory.create()
+
+        with self.assertRaises(ValueError):
+            self.bulk_clone(
+                self.model.Suite.objects.filter(pk=s.pk), cascade=["cases"])
+
+
+    def test_chunked(self):
+        """Many objects are copied a chunk at a time, keeping the mapping."""
+        steps = [
+            self.F.CaseStepFactory.create(number=i) for i in range(1, 6)]
+
+        with patch("moztrap.model.mtmodel.CLONE_CHUNK_SIZE", 2):
+            mapping = self.bulk_clone(
+                self.model.CaseStep.objects.filter(
+                    pk__in=[s.pk for s in steps]))
+
+        self.assertEqual(
+            [
+                self.model.CaseStep.objects.get(pk=mapping[s.pk]).number
+                for s in steps
+                ],
+            [1, 2, 3, 4, 5],
+            )
+
+
+    def test_empty(self):
+        """Cloning nothing returns an empty mapping."""
+        self.assertEqual(self.bulk_clone(self.model.Suite.objects.none()), {})
+
+
+    def test_clone_queries(self):
+        """Cascade-cloning doesn't take a query per related object."""
+        def create(cases):
+            s = self.F.SuiteFactory.create()
+            for i in range(cases):
+                self.F.SuiteCaseFactory.create(suite=s)
+            return s
+
+        small = create(1)
+        large = create(5)
+
+        with self.assertNumQueries(self._count_queries(small.clone)):
+            large.clone()
+
+
+
+class BulkCreateWithPksTest(MTModelTestCase):
+    """Tests for bulk_create_with_pks."""
+    def bulk_create_with_pks(self, *args, **kwargs):
+        from moztrap.model.mtmodel import bulk_create_with_pks
+        return bulk_create_with_pks(*args, **kwargs)
+
+
+    def test_pks(self):
+        """Inserted objects get their pks, in order."""
+        self.F.TagFactory.create(name="Old")
+        tags = [self.model.Tag(name=name) for name in ["One", "Two"]]
+
+        pks = self.bulk_create_with_pks(tags)
+
+        self.assertEqual(pks, [t.pk for t in tags])
+        self.assertEqual(
+            [self.model.Tag.objects.get(pk=t.pk).name for t in tags],
+            ["One", "Two"],
+            )
+
+
+    def test_concurrent_insert(self):
+        """Rows inserted meanwhile, even with the same values, are left out."""
+        manager = self.model.Tag._base_manager
+        bulk_create = manager.bulk_create
+
+        def insert_other_first(objs):
+            self.F.TagFactory.create(name="Other")
+            return bulk_create(objs)
+
+        tags = [self.model.Tag(name=name) for name in ["One", "Two"]]
+        with patch.object(manager, "bulk_create", insert_other_first):
+            self.bulk_create_with_pks(tags)
+
+        self.assertEqual(
+            [self.model.Tag.objects.get(pk=t.pk).name for t in tags],
+            ["One", "Two"],
+            )
+
+
+    def test_not_deleted(self):
+        """Inserted rows aren't left marked deleted."""
+        tags = [self.model.Tag(name=name) for name in ["One", "Two"]]
+
+        self.bulk_create_with_pks(tags)
+
+        self.assertEqual(self.model.Tag.objects.count(), 2)
+        self.assertEqual([t.deleted_on for t in tags], [None, None])
+
+
+    def test_batches(self):
+        """Objects are inserted in batches of at most ``batch_size``."""
+        tags = [self.model.Tag(name=str(i)) for i in range(3)]
+
+        with self.assertNumQueries(4):
+            pks = self.bulk_create_with_pks(tags, batch_size=2)
+
+        self.assertEqual(
+            [self.model.Tag.objects.get(pk=pk).name for pk in pks],
+            ["0", "1", "2"],
+            )
+
+
+    def test_empty(self):
+        """Nothing to insert makes no queries."""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.bulk_create_with_pks([]), [])
+
+
+
+class BulkBatchesTest(MTModelTestCase):
+    """Tests for bulk_batches."""
+    def bulk_batches(self, *args, **kwargs):
+        from moztrap.model.mtmodel import bulk_batches
+        return bulk_batches(*args, **kwargs)
+
+
+    def test_batch_size(self):
+        """Objects are split into lists of at most ``batch_size``."""
+        tags = [self.model.Tag(name=str(i)) for i in range(5)]
+
+        self.assertEqual(
+            [len(b) for b in self.bulk_batches(tags, batch_size=2)], [2, 2, 1])
+
+
+    def test_query_params(self):
+        """Batches stay within SQLite's limit of 999 query parameters."""
+        tags = [self.model.Tag(name=str(i)) for i in range(1000)]
+        fields = len(self.model.Tag._meta.local_fields) - 1
+
+        for batch in self.bulk_batches(tags, batch_size=1000):
+            self.assertLessEqual(len(batch) * fields, 999)
+
+
+
 class MTManagerTest(MTModelTestCase):
     """Tests for MTManager."""
     def test_objects_doesnt_include_deleted(self):
@@ -622,18 +1038,86 @@ class TeamModelTest(case.DBTestCase):
         self.assertIsNone(t.parent)
 
 
+    def test_team_owner(self):
+        """team_owner is the nearest object (or ancestor) with a team."""
+        r = self.F.RunFactory.create()
+
+        self.assertEqual(r.team_owner, r.productversion.product)
+        r.productversion.has_team = True
+        self.assertEqual(r.team_owner, r.productversion)
+        r.has_team = True
+        self.assertEqual(r.team_owner, r)
+
+
+    def test_team_members_cached(self):
+        """Team members are queried once, and again when the team changes."""
+        r = self.F.RunFactory.create(team=["One"])
+
+        self.assertEqual([u.username for u in r.team_members()], ["One"])
+        with self.assertNumQueries(0):
+            r.team_members()
+
+        r.add_to_team(self.F.UserFactory.create(username="Two"))
+
+        self.assertEqual(
+            [u.username for u in r.team_members()], ["One", "Two"])
+
+
+    def test_team_members_inherited(self):
+        """Inherited team members are cached on the team owner."""
+        pv = self.F.ProductVersionFactory.create(team=["One"])
+        r1 = self.F.RunFactory.create(productversion=pv)
+        r2 = self.F.RunFactory.create(productversion=pv)
+
+        self.assertEqual([u.username for u in r1.team_members()], ["One"])
+        with self.assertNumQueries(0):
+            self.assertEqual(r2.team_members(), r1.team_members())
+
+        r1.has_team = True
+
+        self.assertEqual(r1.team_members(), [])
+
+
+    def test_resolve_teams(self):
+        """Teams of many objects are resolved in a fixed number of queries."""
+        pv = self.F.ProductVersionFactory.create(
+            product__team=["ProductUser"])
+        pv2 = self.F.ProductVersionFactory.create(
+            product=pv.product, team=["VersionUser"])
+        runs = [
+            self.F.RunFactory.create(productversion=pv),
+            self.F.RunFactory.create(productversion=pv),
+            self.F.RunFactory.create(productversion=pv2),
+            self.F.RunFactory.create(productversion=pv2, team=["RunUser"]),
+            ]
+        runs = list(
+            self.model.Run.objects.filter(
+                id__in=[r.id for r in runs]).order_by("id"))
+
+        # runs' versions, their products, and the three levels of teams
+        with self.assertNumQueries(5):
+            teams = self.model.Run.resolve_teams(runs)
+            for r in runs:
+                r.team_members()
+
+        self.assertEqual(
+            [[u.username for u in teams[r.id]] for r in runs],
+            [["ProductUser"], ["ProductUser"], ["VersionUser"], ["RunUser"]],
+            )
+
+
 
 class DraftStatusModelTest(case.DBTestCase):
     """
     Tests for DraftStatusModel base class.
 
-    The tests use Run, a DraftStatusModel subclass, to avoid the need for a
+    The tests use Suite, a DraftStatusModel subclass, to avoid the need for a
     test-only model.
 
     """
     def test_activate(self):
         """Test the activate method."""
-        r = self.F.RunFactory.create(status="draft")
+        r = self.F.SuiteFactory.create(status="draft")
 
         r.activate()
 
@@ -642,7 +1126,7 @@ class DraftStatusModelTest(case.DBTestCase):
 
     def test_draft(self):
         """Test the draft method."""
-        r = self.F.RunFactory.create(status="active")
+        r = self.F.SuiteFactory.create(status="active")
 
         r.draft()
 
@@ -651,7 +1135,7 @@ class DraftStatusModelTest(case.DBTestCase):
 
     def test_deactivate(self):
         """Test the deactivate method."""
-        r = self.F.RunFactory.create(status="active")
+        r = self.F.SuiteFactory.create(status="active")
 
         r.deactivate()
 
@@ -660,7 +1144,7 @@ class DraftStatusModelTest(case.DBTestCase):
 
     def test_activate_by_user(self):
         """Test the activate method with a user."""
-        r = self.F.RunFactory.create(status="draft")
+        r = self.F.SuiteFactory.create(status="draft")
         u = self.F.UserFactory.create()
 
         r.activate(user=u)
@@ -670,7 +1154,7 @@ class DraftStatusModelTest(case.DBTestCase):
 
     def test_draft_by_user(self):
         """Test the draft method with a user."""
-        r = self.F.RunFactory.create(status="active")
+        r = self.F.SuiteFactory.create(status="active")
         u = self.F.UserFactory.create()
 
         r.draft(user=u)
@@ -680,7 +1164,7 @@ class DraftStatusModelTest(case.DBTestCase):
 
     def test_deactivate_by_user(self):
         """Test the deactivate method with a user."""
-        r = self.F.RunFactory.create(status="active")
+        r = self.F.SuiteFactory.create(status="active")
         u = self.F.UserFactory.create()
 
         r.deactivate(user=u)
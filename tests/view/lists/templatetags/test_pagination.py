@@ -33,6 +33,46 @@ class PaginateTest(case.DBTestCase):
         self.assertEqual(output, "4 5 6 ")
 
 
+    def test_paginate_keyset(self):
+        """With keyset flag, places KeysetPager in context using cursor."""
+        from moztrap.model.tags.models import Tag
+        from moztrap.view.lists.pagination import KeysetPager
+
+        tpl = template.Template(
+            "{% load pagination %}{% paginate queryset as pager keyset %}"
+            "{% for obj in pager.objects %}{{ obj }} {% endfor %}")
+
+        for i in range(1, 7):
+            self.F.TagFactory.create(name=str(i))
+        qs = Tag.objects.all()
+        cursor = KeysetPager(qs, 3).next_cursor
+
+        request = Mock()
+        request.GET = {"pagesize": 3, "cursor": cursor}
+        output = tpl.render(
+            template.Context({"request": request, "queryset": qs}))
+
+        self.assertEqual(output, "4 5 6 ")
+
+
+    def test_paginate_keyset_fallback(self):
+        """With keyset flag, falls back to Pager if order can't be keyed."""
+        from moztrap.model.tags.models import Tag
+
+        tpl = template.Template(
+            "{% load pagination %}{% paginate queryset as pager keyset %}"
+            "{{ pager.total }}")
+
+        self.F.TagFactory.create()
+        request = Mock()
+        request.GET = {}
+        output = tpl.render(
+            template.Context(
+                {"request": request, "queryset": Tag.objects.order_by("?")}))
+
+        self.assertEqual(output, "1")
+
+
 class FilterTest(case.TestCase):
     """Tests for template filters."""
     def test_pagenumber_url(self):
@@ -46,6 +86,15 @@ class FilterTest(case.TestCase):
             "http://localhost/?pagenumber=1&pagesize=10")
 
 
+    def test_cursor_url(self):
+        """``cursor_url`` filter updates cursor in URL."""
+        from moztrap.view.lists.templatetags.pagination import cursor_url
+        request = Mock()
+        request.get_full_path.return_value = "http://localhost/?pagenumber=2"
+        self.assertEqual(
+            cursor_url(request, "abc"), "http://localhost/?cursor=abc")
+
+
     def test_pagesize_url(self):
         """``pagesize_url`` updates pagesize in URL (and jumps to page 1)."""
         from moztrap.view.lists.templatetags.pagination import pagesize_url
@@ -2,6 +2,8 @@
 Tests for test case queryset-filtering by ID and with optional ID prefix.
 
 """
+from django.test.utils import override_settings
+
 from tests import case
 from moztrap.view.lists.cases import PrefixIDFilter
 
@@ -106,3 +108,72 @@ class PrefixIDFilterTest(case.DBTestCase):
             set([x.name for x in res.all()]),
             set(["CV 3", "CV 4"]),
             )
+
+
+
+class SearchFilterTest(case.DBTestCase):
+    """Tests for SearchFilter"""
+    def filter(self, values, **kwargs):
+        """Return caseversions filtered by instruction with given values."""
+        from moztrap.view.lists.cases import SearchFilter
+        f = SearchFilter(
+            "instruction",
+            lookup="steps__instruction",
+            field="instruction",
+            **kwargs)
+        return f.filter(self.model.CaseVersion.objects.all(), values)
+
+
+    @override_settings(KEYWORD_SEARCH_INDEX=True)
+    def test_indexed(self):
+        """Values are ANDed and matched via the index."""
+        s1 = self.F.CaseStepFactory.create(instruction="Open the menu")
+        self.F.CaseStepFactory.create(
+            caseversion=s1.caseversion, instruction="Close it")
+        self.F.CaseStepFactory.create(instruction="Open the door")
+
+        self.assertEqual(
+            list(self.filter([u"open", u"clos"])), [s1.caseversion])
+
+
+    @override_settings(KEYWORD_SEARCH_INDEX=True)
+    def test_word_prefixes(self):
+        """Through the index, values match the start of words only."""
+        self.F.CaseStepFactory.create(instruction="Relogin")
+
+        self.assertEqual(list(self.filter([u"login"])), [])
+
+
+    def test_substrings(self):
+        """By default (without the index), values match any substring."""
+        s1 = self.F.CaseStepFactory.create(instruction="Relogin")
+
+        self.assertEqual(list(self.filter([u"login"])), [s1.caseversion])
+
+
+    @override_settings(KEYWORD_SEARCH_INDEX=True)
+    def test_no_words(self):
+        """A value without words falls back to a contains search."""
+        s1 = self.F.CaseStepFactory.create(instruction="Type ++")
+        self.F.CaseStepFactory.create(instruction="Type --")
+
+        self.assertEqual(list(self.filter([u"++"])), [s1.caseversion])
+
+
+    @override_settings(KEYWORD_SEARCH_INDEX=True)
+    def test_caseversion_lookup(self):
+        """Filters other models by the lookup of their caseversion."""
+        from moztrap.view.lists.cases import SearchFilter
+        rcv = self.F.RunCaseVersionFactory.create(caseversion__name="Find me")
+        self.F.RunCaseVersionFactory.create(caseversion__name="Not this")
+        f = SearchFilter(
+            "name",
+            lookup="caseversion__name",
+            field="name",
+            caseversion_lookup="caseversion",
+            )
+
+        self.assertEqual(
+            list(f.filter(self.model.RunCaseVersion.objects.all(), [u"find"])),
+            [rcv],
+            )
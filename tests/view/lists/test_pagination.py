@@ -2,7 +2,10 @@
 Tests for pagination utilities.
 
 """
-from mock import Mock
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from mock import Mock, patch
 
 from tests import case
 
@@ -47,6 +50,60 @@ class TestFromRequest(case.DBTestCase):
 
 
 
+class TestCountCacheKey(case.DBTestCase):
+    """Tests for ``count_cache_key`` function."""
+    def key(self, queryset):
+        """Return count cache key for given queryset."""
+        from moztrap.view.lists.pagination import count_cache_key
+        return count_cache_key(queryset)
+
+
+    def test_ordering(self):
+        """Sort order doesn't change the key."""
+        qs = self.model.Product.objects.filter(name="a")
+
+        self.assertEqual(
+            self.key(qs.order_by("name")), self.key(qs.order_by("-id")))
+
+
+    def test_filters(self):
+        """Different filters give different keys."""
+        qs = self.model.Product.objects.all()
+
+        self.assertNotEqual(
+            self.key(qs.filter(name="a")), self.key(qs.filter(name="b")))
+
+
+    def test_pinned_filters(self):
+        """Filters pinned in cookies give different keys."""
+        from moztrap.view.lists import filters
+        fs = filters.FilterSet([filters.KeywordFilter("name")])
+        qs = self.model.Product.objects.all()
+
+        keys = [
+            self.key(
+                fs.bind(None, {"moztrap-filter-name": value}).filter(qs))
+            for value in ['["a"]', '["b"]']
+            ]
+
+        self.assertNotEqual(keys[0], keys[1])
+
+
+    def test_model(self):
+        """Different lists give different keys."""
+        self.assertNotEqual(
+            self.key(self.model.Product.objects.all()),
+            self.key(self.model.Suite.objects.all()),
+            )
+
+
+    def test_empty(self):
+        """A queryset that can't match has no key."""
+        self.assertIsNone(
+            self.key(self.model.Product.objects.filter(pk__in=[])))
+
+
+
 class TestPagesizeUrl(case.TestCase):
     """Tests for ``pagesize_url`` function."""
     @property
@@ -70,6 +127,13 @@ class TestPagesizeUrl(case.TestCase):
             Url("http://fake.base/?pagenumber=1&pagesize=10"))
 
 
+    def test_drops_cursor(self):
+        """Drops any pagination cursor, jumping back to the first page."""
+        self.assertEqual(
+            Url(self.func("http://fake.base/?pagesize=40&cursor=abc", 10)),
+            Url("http://fake.base/?pagenumber=1&pagesize=10"))
+
+
 
 class TestPagenumberUrl(case.TestCase):
     """Tests for ``pagenumber_url`` function."""
@@ -95,6 +159,31 @@ class TestPagenumberUrl(case.TestCase):
 
 
 
+class TestCursorUrl(case.TestCase):
+    """Tests for ``cursor_url`` function."""
+    @property
+    def func(self):
+        """The function under test."""
+        from moztrap.view.lists.pagination import cursor_url
+        return cursor_url
+
+
+    def test_simple(self):
+        """Adds cursor to a URL without it in querystring."""
+        self.assertEqual(
+            Url(self.func("http://fake.base/", "abc")),
+            Url("http://fake.base/?cursor=abc"))
+
+
+    def test_override(self):
+        """Overrides existing cursor and drops page number."""
+        self.assertEqual(
+            Url(self.func(
+                "http://fake.base/?pagesize=40&pagenumber=3&cursor=a", "b")),
+            Url("http://fake.base/?cursor=b&pagesize=40"))
+
+
+
 class TestPager(case.DBTestCase):
     """Tests for ``Pager`` class."""
     @property
@@ -222,6 +311,70 @@ class TestPager(case.DBTestCase):
         self.assertEqual(qs.count.call_count, 1)
 
 
+    def test_total_exact(self):
+        """By default, total is not approximate."""
+        p = self.pager(self.qs(10), 20, 1)
+        self.assertFalse(p.approximate)
+
+
+    @override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=60)
+    def test_total_cached_by_key(self):
+        """With a count key, total is cached across pagers."""
+        cache.delete("count-key")
+        self.addCleanup(cache.delete, "count-key")
+        qs = self.qs(10)
+
+        self.pager(qs, 20, 1, "count-key").total
+        p = self.pager(self.qs(12), 20, 2, "count-key")
+
+        self.assertEqual(p.total, 10)
+        self.assertEqual(qs.count.call_count, 1)
+
+
+    def test_total_not_cached_by_key_by_default(self):
+        """With no count cache timeout set, total is not cached."""
+        self.pager(self.qs(10), 20, 1, "count-key").total
+
+        self.assertEqual(self.pager(self.qs(12), 20, 1, "count-key").total, 12)
+
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=100)
+    def test_total_estimated(self):
+        """Above the estimate threshold, total is the planner's estimate."""
+        qs = self.qs(10)
+        target = "moztrap.view.lists.pagination.estimate_count"
+        with patch(target) as estimate_count:
+            estimate_count.return_value = 1000
+            p = self.pager(qs, 20, 1)
+
+            self.assertEqual(p.total, 1000)
+            self.assertTrue(p.approximate)
+            self.assertEqual(qs.count.call_count, 0)
+            self.assertEqual(p.num_pages, 50)
+
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=100)
+    def test_total_estimated_below_threshold(self):
+        """Below the estimate threshold, total is counted exactly."""
+        target = "moztrap.view.lists.pagination.estimate_count"
+        with patch(target) as estimate_count:
+            estimate_count.return_value = 50
+            p = self.pager(self.qs(10), 20, 1)
+
+            self.assertEqual(p.total, 10)
+            self.assertFalse(p.approximate)
+
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=0)
+    def test_total_no_estimate(self):
+        """If the database can't estimate, total is counted exactly."""
+        self.F.ProductFactory.create()
+        p = self.pager(self.model.Product.objects.all(), 20, 1)
+
+        self.assertEqual(p.total, 1)
+        self.assertFalse(p.approximate)
+
+
     def test_objects(self):
         """.objects is list of objects on current page."""
         products = [
@@ -342,6 +495,51 @@ class TestPager(case.DBTestCase):
 
 
 
+class TestEstimateCount(case.DBTestCase):
+    """Tests for ``estimate_count`` function."""
+    def estimate(self, vendor, description, rows):
+        """Return estimate for a product list given EXPLAIN output."""
+        from moztrap.view.lists.pagination import estimate_count
+        connection = Mock()
+        connection.vendor = vendor
+        cursor = connection.cursor.return_value
+        cursor.description = [(name,) for name in description]
+        cursor.fetchall.return_value = rows
+        target = "moztrap.view.lists.pagination.connections"
+        with patch(target, {"default": connection}):
+            return estimate_count(self.model.Product.objects.all())
+
+
+    def test_mysql_driving_table(self):
+        """MySQL estimates the rows of the driving table, ignoring joins."""
+        self.assertEqual(
+            self.estimate(
+                "mysql",
+                ["id", "table", "rows"],
+                [(1, "a", 1000), (1, "b", 30)],
+                ),
+            1000,
+            )
+
+
+    def test_postgresql(self):
+        """PostgreSQL estimates the rows of the whole plan."""
+        self.assertEqual(
+            self.estimate(
+                "postgresql",
+                ["QUERY PLAN"],
+                [("Hash Join  (cost=1.00..2.00 rows=42 width=8)",)],
+                ),
+            42,
+            )
+
+
+    def test_other(self):
+        """Other databases don't estimate."""
+        self.assertIsNone(self.estimate("sqlite", [], []))
+
+
+
 class TestPositiveInteger(case.TestCase):
     """Tests for ``positive_integer`` function."""
     @property
@@ -374,3 +572,186 @@ class TestPositiveInteger(case.TestCase):
     def test_string(self):
         """Non-numbers are coerced to the given default."""
         self.assertEqual(self.func("blah", 5), 5)
+
+
+
+class TestKeysetOrdering(case.DBTestCase):
+    """Tests for ``keyset_ordering`` function."""
+    @property
+    def func(self):
+        """The function under test."""
+        from moztrap.view.lists.pagination import keyset_ordering
+        return keyset_ordering
+
+
+    def test_default(self):
+        """Uses model default ordering, with the pk as tie-breaker."""
+        self.assertEqual(
+            self.func(self.model.Product.objects.all()),
+            [("name", False), ("id", False)])
+
+
+    def test_order_by(self):
+        """Uses queryset ordering; the pk breaks ties in the same direction."""
+        qs = self.model.RunCaseVersion.objects.order_by(
+            "caseversion__name", "-created_on")
+        self.assertEqual(
+            self.func(qs),
+            [
+                ("caseversion__name", False),
+                ("created_on", True),
+                ("id", True),
+                ]
+            )
+
+
+    def test_pk(self):
+        """Ordering by pk needs no tie-breaker."""
+        self.assertEqual(
+            self.func(self.model.Product.objects.order_by("-pk")),
+            [("id", True)])
+
+
+    def test_unordered(self):
+        """An unordered queryset is keyed on the pk."""
+        self.assertEqual(
+            self.func(self.model.Product.objects.order_by()), [("id", False)])
+
+
+    def test_relation(self):
+        """Ordering by a relation can't be keyed on."""
+        self.assertEqual(
+            self.func(self.model.RunCaseVersion.objects.order_by("run")), None)
+
+
+    def test_nullable(self):
+        """Ordering by a nullable field can't be keyed on."""
+        self.assertEqual(
+            self.func(self.model.Tag.objects.order_by("product__name")), None)
+
+
+    def test_random(self):
+        """Random ordering can't be keyed on."""
+        self.assertEqual(
+            self.func(self.model.Product.objects.order_by("?")), None)
+
+
+
+class TestKeysetPager(case.DBTestCase):
+    """Tests for ``KeysetPager`` class."""
+    @property
+    def pager(self):
+        """The class under test."""
+        from moztrap.view.lists.pagination import KeysetPager
+        return KeysetPager
+
+
+    def products(self, *names):
+        """Create products with given names, return queryset of all."""
+        for name in names:
+            self.F.ProductFactory.create(name=name)
+        return self.model.Product.objects.all()
+
+
+    def names(self, pager):
+        """Return names of objects on page of given pager."""
+        return [p.name for p in pager.objects]
+
+
+    def test_sizes(self):
+        """Has built-in standard set of page-size options."""
+        p = self.pager(self.products(), 15)
+        self.assertEqual(p.sizes(), [10, 15, 20, 50, 100])
+
+
+    def test_first_page(self):
+        """Without a cursor, the first page is shown."""
+        p = self.pager(self.products("c", "a", "d", "b"), 2)
+
+        self.assertEqual(self.names(p), ["a", "b"])
+        self.assertEqual(p.prev_cursor, None)
+        self.assertNotEqual(p.next_cursor, None)
+
+
+    def test_next_page(self):
+        """The next cursor leads to the following page."""
+        qs = self.products("c", "a", "e", "d", "b")
+        p = self.pager(qs, 2)
+
+        p2 = self.pager(qs, 2, p.next_cursor)
+        p3 = self.pager(qs, 2, p2.next_cursor)
+
+        self.assertEqual(self.names(p2), ["c", "d"])
+        self.assertEqual(self.names(p3), ["e"])
+        self.assertEqual(p3.next_cursor, None)
+
+
+    def test_prev_page(self):
+        """The previous cursor leads back to the preceding page."""
+        qs = self.products("c", "a", "e", "d", "b")
+        p = self.pager(qs, 2)
+        p2 = self.pager(qs, 2, p.next_cursor)
+
+        p1 = self.pager(qs, 2, p2.prev_cursor)
+
+        self.assertEqual(self.names(p1), ["a", "b"])
+        self.assertEqual(p1.prev_cursor, None)
+        self.assertEqual(
+            self.names(self.pager(qs, 2, p1.next_cursor)), ["c", "d"])
+
+
+    def test_ties_descending(self):
+        """Objects with equal sort values are paged through in pk order."""
+        self.products("a", "a", "a", "b")
+        qs = self.model.Product.objects.order_by("-name")
+
+        seen = []
+        cursor = None
+        while True:
+            p = self.pager(qs, 1, cursor)
+            seen.extend(p.objects)
+            cursor = p.next_cursor
+            if cursor is None:
+                break
+
+        self.assertEqual([o.name for o in seen], ["b", "a", "a", "a"])
+        ids = [o.id for o in seen[1:]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+
+    def test_datetime(self):
+        """Datetime sort values survive the round-trip through a cursor."""
+        qs = self.products("a", "b", "c").order_by("created_on")
+        p = self.pager(qs, 1)
+
+        p2 = self.pager(qs, 1, p.next_cursor)
+
+        self.assertEqual(self.names(p2), ["b"])
+
+
+    def test_invalid_cursor(self):
+        """An invalid cursor gives the first page."""
+        p = self.pager(self.products("b", "a"), 1, "not a cursor")
+
+        self.assertEqual(self.names(p), ["a"])
+
+
+    def test_stale_cursor(self):
+        """A cursor for a different ordering gives the first page."""
+        qs = self.products("b", "a", "c")
+        cursor = self.pager(qs, 1).next_cursor
+
+        p = self.pager(qs.order_by("-name"), 1, cursor)
+
+        self.assertEqual(self.names(p), ["c"])
+
+
+    def test_constant_queries(self):
+        """A deep page costs one query, like the first."""
+        qs = self.products(*"abcdefg")
+        p = self.pager(qs, 2)
+        for i in range(3):
+            p = self.pager(qs, 2, p.next_cursor)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names(p), ["g"])
@@ -6,6 +6,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
 from django.utils.datastructures import MultiValueDict
 
+from mock import Mock, patch
+
 from moztrap import model
 from tests import case
 
@@ -73,6 +75,27 @@ class AddCaseFormTest(case.DBTestCase):
         self.assertEqual(cv.name, "Can register.")
 
 
+
+    def test_index_once(self):
+        """Each new version is indexed once, after its steps are saved."""
+        data = self.get_form_data()
+        data.setlist("steps-TOTAL_FORMS", [2])
+        data.setlist("steps-1-instruction", ["Log"])
+        form = self.form(data=data)
+
+        index = Mock(side_effect=model.SearchTerm.index)
+        with patch.object(model.SearchTerm, "index", index):
+            cv = form.save().versions.get()
+
+        index.assert_called_once_with([cv.id])
+        self.assertEqual(
+            set(
+                cv.searchterms.filter(field="instruction").values_list(
+                    "term", flat=True)),
+            set(["fill", "in", "form", "and", "submit", "log"]),
+            )
+
+
     def test_created_by(self):
         """If user is provided, created objects have created_by set."""
         form = self.form(data=self.get_form_data(), user=self.user)
@@ -510,6 +533,138 @@ class AddBulkCasesFormTest(case.DBTestCase):
             )
 
 
+    def cases_text(self, *names):
+        """Return bulk text for cases with given names (and two steps)."""
+        return "".join(
+            "Test that {0}\n"
+            "When I do this\nThen this happens\n"
+            "When I do that\nThen that happens\n".format(name)
+            for name in names
+            )
+
+
+    def test_many_cases(self):
+        """Each case gets its versions, steps, tags and suite order."""
+        self.user.user_permissions.add(
+            model.Permission.objects.get(codename="manage_suite_cases"))
+        newer_version = self.F.ProductVersionFactory.create(
+            product=self.product, version="1.1")
+        envs = self.F.EnvironmentFactory.create_full_set(
+            {"OS": ["OS X", "Linux"]})
+        self.productversion.add_envs(*envs)
+        newer_version.add_envs(envs[0])
+        suite = self.F.SuiteFactory.create(product=self.product)
+        self.F.SuiteCaseFactory.create(suite=suite, order=3)
+        tag = self.F.TagFactory.create(name="foo")
+        data = self.get_form_data()
+        data["cases"] = self.cases_text("one", "two", "three")
+        data["and_later_versions"] = 1
+        data["suite"] = suite.id
+        data.setlist("tag-tag", [tag.id])
+
+        cases = self.form(data=data, user=self.user).save()
+
+        self.assertEqual(
+            [c.versions.get(productversion=newer_version).name for c in cases],
+            ["Test that one", "Test that two", "Test that three"],
+            )
+        self.assertEqual(
+            [sc.case for sc in suite.suitecases.filter(order__gt=3)], cases)
+        self.assertEqual(
+            [sc.order for sc in suite.suitecases.filter(order__gt=3)],
+            [4, 5, 6],
+            )
+        for case in cases:
+            old, new = case.versions.all()
+            self.assertEqual(
+                (old.productversion, old.latest, new.latest),
+                (self.productversion, False, True),
+                )
+            self.assertEqual(set(old.environments.all()), set(envs))
+            self.assertEqual(list(new.environments.all()), [envs[0]])
+            self.assertEqual(list(new.tags.all()), [tag])
+            self.assertEqual(
+                [(s.number, s.instruction) for s in new.steps.all()],
+                [(1, "When I do this"), (2, "When I do that")],
+                )
+            self.assertEqual(new.created_by, self.user)
+        self.assertEqual(
+            list(model.SearchTerm.matching("name", "three")),
+            [
+                {"caseversion": cv.id}
+                for cv in cases[2].versions.order_by("id")
+                ],
+            )
+
+
+    def test_concurrent_inserts(self):
+        """A version added meanwhile to another case doesn't get the steps."""
+        manager = model.CaseVersion._base_manager
+        bulk_create = manager.bulk_create
+
+        def insert_other_first(objs):
+            self.F.CaseVersionFactory.create(name="Other")
+            return bulk_create(objs)
+
+        data = self.get_form_data()
+        data["cases"] = self.cases_text("one")
+        form = self.form(data=data)
+        form.is_valid()
+        with patch.object(manager, "bulk_create", insert_other_first):
+            cases = form.save()
+
+        self.assertEqual(cases[0].versions.get().steps.count(), 2)
+        self.assertEqual(
+            model.CaseVersion.objects.get(name="Other").steps.count(), 0)
+
+
+    def test_many_steps(self):
+        """Steps are inserted in batches the database accepts."""
+        data = self.get_form_data()
+        data["cases"] = self.cases_text(*[str(i) for i in range(120)])
+        form = self.form(data=data)
+        form.is_valid()
+
+        form.save()
+
+        self.assertEqual(model.CaseStep.objects.count(), 240)
+
+
+    def test_constant_queries(self):
+        """The number of queries doesn't depend on the number of cases."""
+        self.F.ProductVersionFactory.create(
+            product=self.product, version="1.1")
+        data = self.get_form_data()
+        data["and_later_versions"] = 1
+
+        data["cases"] = self.cases_text("one")
+        form = self.form(data=data)
+        form.is_valid()
+        few = self._count_queries(form.save)
+
+        data["cases"] = self.cases_text(*[str(i) for i in range(5)])
+        form = self.form(data=data)
+        form.is_valid()
+        with self.assertNumQueries(few):
+            form.save()
+
+        self.assertEqual(model.CaseVersion.objects.count(), 12)
+
+
+    def _count_queries(self, func):
+        """Return number of queries made by calling ``func``."""
+        from django.db import connection
+        from django.conf import settings
+        debug = settings.DEBUG
+        settings.DEBUG = True
+        try:
+            start = len(connection.queries)
+            func()
+            return len(connection.queries) - start
+        finally:
+            settings.DEBUG = debug
+
+
 
 class EditCaseVersionFormTest(case.DBTestCase):
     """Tests for EditCaseVersionForm."""
@@ -600,6 +755,52 @@ class EditCaseVersionFormTest(case.DBTestCase):
             ["new step", "do this instead"])
 
 
+    def test_index_once(self):
+        """The caseversion is indexed once, after its steps are saved."""
+        cv = self.F.CaseVersionFactory.create(name="a name")
+        step = self.F.CaseStepFactory.create(
+            caseversion=cv, instruction="do this")
+
+        form = self.form(
+            instance=cv,
+            data=MultiValueDict(
+                {
+                    "name": ["new name"],
+                    "description": [""],
+                    "idprefix": [""],
+                    "status": ["active"],
+                    "cc_version": str(cv.cc_version),
+                    "steps-TOTAL_FORMS": ["2"],
+                    "steps-INITIAL_FORMS": ["1"],
+                    "steps-0-id": [str(step.id)],
+                    "steps-0-instruction": ["do that"],
+                    "steps-0-expected": [""],
+                    "steps-1-id": [""],
+                    "steps-1-instruction": ["then this"],
+                    "steps-1-expected": [""],
+                    }
+                )
+            )
+
+        index = Mock(side_effect=model.SearchTerm.index)
+        with patch.object(model.SearchTerm, "index", index):
+            form.save()
+
+        index.assert_called_once_with([cv.id])
+        self.assertEqual(
+            set(
+                cv.searchterms.filter(field="name").values_list(
+                    "term", flat=True)),
+            set(["new", "name"]),
+            )
+        self.assertEqual(
+            set(
+                cv.searchterms.filter(field="instruction").values_list(
+                    "term", flat=True)),
+            set(["do", "that", "then", "this"]),
+            )
+
+
     def test_save_tags(self):
         """Can add/remove tags."""
         self.user.user_permissions.add(
@@ -5,6 +5,7 @@ Tests for case management views.
 """
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 
 from tests import case
 
@@ -97,6 +98,18 @@ class CasesTest(case.view.manage.ListViewTestCase,
         self.assertNotInList(res, u"Case 2 ùê")
 
 
+    @override_settings(KEYWORD_SEARCH_INDEX=True)
+    def test_filter_by_name_indexed(self):
+        """Can filter by name through the search index."""
+        self.F.CaseVersionFactory.create(name=u"Login ùê")
+        self.F.CaseVersionFactory.create(name=u"Relogin ùê")
+
+        res = self.get(params={"filter-name": "log"})
+
+        self.assertInList(res, u"Login ùê")
+        self.assertNotInList(res, u"Relogin ùê")
+
+
     def test_filter_by_tag(self):
         """Can filter by tag."""
         t = self.F.TagFactory.create()
@@ -133,7 +133,8 @@ class AddProfileTest(case.view.FormViewTestCase,
 
         self.assertRedirects(res, reverse("manage_profiles"))
 
-        res.follow().mustcontain(u"Profile 'Foo Profile ùê' added.")
+        res.follow().mustcontain(
+            u"Profile 'Foo Profile ùê' added with 1 environment.")
 
         p = self.model.Profile.objects.get()
         self.assertEqual(p.name, u"Foo Profile ùê")
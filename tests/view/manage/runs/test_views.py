@@ -6,6 +6,7 @@ Tests for run management views.
 from datetime import date
 
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 
 from tests import case
 
@@ -37,6 +38,87 @@ class RunsTest(case.view.manage.ListViewTestCase,
         return reverse("manage_runs")
 
 
+    @override_settings(RUN_JOBS_ASYNC=True)
+    def test_activate_queues_job(self):
+        """With async jobs, activating a run queues a job."""
+        self.add_perm(self.perm)
+        r = self.factory.create(status="draft")
+
+        self.get_form().submit(
+            name="action-activate",
+            index=0,
+            headers={"X-Requested-With": "XMLHttpRequest"},
+            )
+
+        self.assertEqual(self.refresh(r).status, "activating")
+        self.assertEqual(r.jobs.get().action, "activate")
+
+
+    @override_settings(RUN_JOBS_ASYNC=True)
+    def test_refresh_queues_job(self):
+        """With async jobs, refreshing an active run queues a job."""
+        self.add_perm(self.perm)
+        r = self.factory.create(status="active")
+
+        self.get_form().submit(
+            name="action-refresh",
+            index=0,
+            headers={"X-Requested-With": "XMLHttpRequest"},
+            )
+
+        self.assertEqual(r.jobs.get().action, "refresh")
+
+
+
+class RunProgressTest(case.view.AuthenticatedViewTestCase,
+                      case.view.NoCacheTest,
+                      ):
+    """Test for run activation progress ajax view."""
+    def setUp(self):
+        """Setup for progress tests; create a run."""
+        super(RunProgressTest, self).setUp()
+        self.testrun = self.F.RunFactory.create()
+        self.add_perm("manage_runs")
+
+
+    @property
+    def url(self):
+        """Shortcut for run progress url."""
+        return reverse(
+            "manage_run_progress",
+            kwargs=dict(run_id=self.testrun.id)
+            )
+
+
+    def test_no_job(self):
+        """Run with no jobs reports its status and a null job."""
+        res = self.get()
+
+        self.assertEqual(
+            res.json, {"run": self.testrun.id, "status": "draft", "job": None})
+
+
+    def test_job_progress(self):
+        """Reports progress of the latest job."""
+        j = self.F.RunJobFactory.create(
+            run=self.testrun, status="running", total=20, locked=5)
+
+        res = self.get()
+
+        self.assertEqual(res.json["job"]["id"], j.id)
+        self.assertEqual(res.json["job"]["status"], "running")
+        self.assertEqual(res.json["job"]["total"], 20)
+        self.assertEqual(res.json["job"]["locked"], 5)
+
+
+    def test_requires_manage_runs_permission(self):
+        """Requires manage-runs permission."""
+        res = self.app.get(
+            self.url, user=self.F.UserFactory.create(), status=302)
+
+        self.assertRedirects(res, "/")
+
+
 
 class RunDetailTest(case.view.AuthenticatedViewTestCase,
                     case.view.NoCacheTest,
@@ -43,3 +43,32 @@ class PercentageFilterTest(case.TestCase):
     def test_round_down(self):
         """Above 0.5, rounds down."""
         self.assertEqual(self.filter(0.55987), 55)
+
+
+
+class WithResultSummariesFilterTest(case.DBTestCase):
+    """Tests for with_result_summaries filter."""
+    @property
+    def filter(self):
+        """The template filter under test."""
+        from moztrap.view.results.templatetags.results import (
+            with_result_summaries)
+        return with_result_summaries
+
+
+    def test_empty(self):
+        """Empty page returns empty list without querying."""
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.filter(self.model.Run.objects.none()), [])
+
+
+    def test_prefetches(self):
+        """Objects are returned with result summaries prefetched."""
+        rcv = self.F.RunCaseVersionFactory.create()
+        self.F.ResultFactory.create(runcaseversion=rcv, status="passed")
+
+        objects = self.filter(self.model.RunCaseVersion.objects.all())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(objects[0].result_summary()["passed"], 1)
@@ -181,6 +181,197 @@ class StepResultForTest(case.DBTestCase):
             )
 
 
+class PrefetchResultsForTest(case.DBTestCase):
+    """Tests for the prefetch_results_for template tag."""
+    def setUp(self):
+        """Set up two runcaseversions, a tester and an environment."""
+        self.env = self.F.EnvironmentFactory.create()
+        self.rcvs = [
+            self.F.RunCaseVersionFactory.create(),
+            self.F.RunCaseVersionFactory.create(),
+            ]
+        self.user = self.F.UserFactory.create()
+
+
+    def render(self, render, runcaseversions=None):
+        """Prefetch results for runcaseversions and render given string."""
+        t = Template(
+            "{% load execution %}"
+            "{% prefetch_results_for rcvs user env %}"
+            "{% for rcv in rcvs %}" + render + "{% endfor %}")
+        return t.render(
+            Context(
+                {
+                    "rcvs": runcaseversions or self.rcvs,
+                    "user": self.user,
+                    "env": self.env,
+                    }
+                )
+            )
+
+
+    def test_constant_queries(self):
+        """Prefetching takes three queries; the tags then need none."""
+        r = self.F.ResultFactory.create(
+            runcaseversion=self.rcvs[0],
+            environment=self.env,
+            tester=self.user,
+            status="failed",
+            )
+        step = self.F.CaseStepFactory.create(
+            caseversion=self.rcvs[0].caseversion)
+        sr = self.F.StepResultFactory.create(result=r, step=step)
+        other = self.F.ResultFactory.create(
+            runcaseversion=self.rcvs[1],
+            environment=self.env,
+            status="passed",
+            )
+        template = (
+            "{% result_for rcv user env as result %}"
+            "{% other_result_for rcv user env as other_result %}"
+            "{% stepresult_for result step as stepresult %}"
+            "{{ result.id }}/{{ other_result.id }}/{{ stepresult.id }} "
+            )
+        t = Template(
+            "{% load execution %}"
+            "{% prefetch_results_for rcvs user env %}"
+            "{% for rcv in rcvs %}" + template + "{% endfor %}")
+        context = Context(
+            {
+                "rcvs": self.rcvs,
+                "user": self.user,
+                "env": self.env,
+                "step": step,
+                }
+            )
+
+        with self.assertNumQueries(3):
+            rendered = t.render(context)
+
+        self.assertEqual(
+            rendered,
+            "{0}//{1} None/{2}/None ".format(r.id, sr.id, other.id),
+            )
+
+
+    def test_other_result_testers_shared(self):
+        """Other results of one tester share its instance via identity map."""
+        from moztrap.model import identity
+        from moztrap.view.runtests.templatetags.execution import (
+            PrefetchedResults)
+        tester = self.F.UserFactory.create()
+        for rcv in self.rcvs:
+            self.F.ResultFactory.create(
+                runcaseversion=rcv,
+                environment=self.env,
+                tester=tester,
+                status="passed",
+                )
+
+        with identity.active():
+            prefetched = PrefetchedResults(self.rcvs, self.user, self.env)
+
+        first, second = prefetched.other_results.values()
+        self.assertIs(first.tester, second.tester)
+
+
+    def test_no_results(self):
+        """Without any results, an unsaved result is placed in context."""
+        self.assertEqual(
+            self.render(
+                "{% result_for rcv user env as result %}"
+                "{{ result.id }}-{{ result.runcaseversion.id }} "),
+            "None-{0} None-{1} ".format(self.rcvs[0].id, self.rcvs[1].id),
+            )
+
+
+    def test_other_result_latest(self):
+        """The last-modified completed result of another tester is used."""
+        with mock.patch("moztrap.model.mtmodel.utcnow") as mock_utcnow:
+            mock_utcnow.return_value = datetime.datetime(2012, 3, 24)
+            self.F.ResultFactory.create(
+                runcaseversion=self.rcvs[0],
+                environment=self.env,
+                status="passed",
+                )
+            mock_utcnow.return_value = datetime.datetime(2012, 3, 25)
+            r2 = self.F.ResultFactory.create(
+                runcaseversion=self.rcvs[0],
+                environment=self.env,
+                status="failed",
+                )
+            self.F.ResultFactory.create(
+                runcaseversion=self.rcvs[0],
+                environment=self.env,
+                status="started",
+                )
+
+        self.assertEqual(
+            self.render(
+                "{% other_result_for rcv user env as other_result %}"
+                "{{ other_result.id }} ",
+                [self.rcvs[0]],
+                ),
+            "{0} ".format(r2.id),
+            )
+
+
+    def test_dupe_latest_results_repaired(self):
+        """Of duplicate latest results, the last-modified is kept latest."""
+        with mock.patch("moztrap.model.mtmodel.utcnow") as mock_utcnow:
+            mock_utcnow.return_value = datetime.datetime(2012, 3, 24)
+            res1 = self.F.ResultFactory.create(
+                runcaseversion=self.rcvs[0],
+                environment=self.env,
+                tester=self.user,
+                status="passed",
+                )
+            mock_utcnow.return_value = datetime.datetime(2012, 3, 25)
+            res2 = self.F.ResultFactory.create(
+                runcaseversion=self.rcvs[0],
+                environment=self.env,
+                tester=self.user,
+                status="failed",
+                )
+            mock_utcnow.return_value = datetime.datetime(2012, 3, 24)
+            self.model.Result.objects.filter(pk=res1.pk).update(
+                is_latest=True)
+
+        self.assertEqual(
+            self.render(
+                "{% result_for rcv user env as result %}{{ result.id }}",
+                [self.rcvs[0]],
+                ),
+            str(res2.id),
+            )
+        self.assertEqual(
+            self.model.Result.objects.get(is_latest=True).pk, res2.pk)
+
+
+    def test_not_prefetched(self):
+        """Runcaseversions not prefetched are still looked up."""
+        r = self.F.ResultFactory.create(tester=self.user, environment=self.env)
+        t = Template(
+            "{% load execution %}"
+            "{% prefetch_results_for rcvs user env %}"
+            "{% result_for rcv user env as result %}{{ result.id }}")
+
+        self.assertEqual(
+            t.render(
+                Context(
+                    {
+                        "rcvs": self.rcvs,
+                        "rcv": r.runcaseversion,
+                        "user": self.user,
+                        "env": self.env,
+                        }
+                    )
+                ),
+            str(r.id),
+            )
+
+
+
 class SuitesForTest(case.DBTestCase):
     """Tests for the suites_for template tag."""
 
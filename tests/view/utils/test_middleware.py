@@ -0,0 +1,49 @@
+"""
+Tests for identity map middleware.
+
+"""
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from mock import patch
+
+from tests import case
+
+
+
+class IdentityMapMiddlewareTest(case.DBTestCase):
+    """Tests for IdentityMapMiddleware."""
+    @property
+    def middleware(self):
+        """An instance of the middleware under test."""
+        from moztrap.view.utils.middleware import IdentityMapMiddleware
+        return IdentityMapMiddleware()
+
+
+    def test_request_scoped(self):
+        """A fresh map is active for the request, and ended after it."""
+        from moztrap.model import identity
+        request = RequestFactory().get("/foo/")
+        middleware = self.middleware
+        env = self.F.EnvironmentFactory.create()
+
+        middleware.process_request(request)
+        identity.get(self.model.Environment, env.id)
+        identity.get(self.model.Environment, env.id)
+        target = "moztrap.view.utils.middleware.logger"
+        with patch(target) as logger:
+            response = middleware.process_response(request, HttpResponse())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(identity.current())
+        logger.debug.assert_called_once_with(
+            "%s %s: %s hits, %s misses",
+            "/foo/", "environments.Environment", 1, 1)
+
+
+    def test_no_map(self):
+        """Responses pass through if no map was started."""
+        response = self.middleware.process_response(
+            RequestFactory().get("/"), HttpResponse())
+
+        self.assertEqual(response.status_code, 200)